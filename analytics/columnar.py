@@ -0,0 +1,235 @@
+"""Compact columnar record storage for long-running loggers.
+
+:class:`ColumnBuffer` keeps records as one NumPy array per column.  It
+either grows without bound or, with ``retain``, keeps only the most recent
+rows in a ring buffer.  Ring rows are stored twice (at ``i`` and
+``i + retain``) so the retained window is always one contiguous slice and can
+be exported without copying.
+
+:class:`ColumnLog` is the on-disk counterpart: an append-only directory with
+one raw little-endian ``.bin`` file per column (the layout of
+:class:`~rl.data_store.MarketDataStore`) that can be memory-mapped back.
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+COLUMNS_FILE = "columns.json"
+
+
+class ColumnBuffer:
+    """Growable or ring-buffered columnar record store.
+
+    Parameters
+    ----------
+    dtypes: Mapping
+        Column names and NumPy dtypes, in record order.
+    retain: int, optional
+        Keep only the last ``retain`` rows.  ``None`` keeps every row.
+    capacity: int
+        Initial number of rows allocated when growing without bound.
+    """
+
+    #: Records staged before they are written to the arrays.
+    CHUNK = 256
+
+    def __init__(self, dtypes: Mapping[str, Union[str, np.dtype]],
+                 retain: Optional[int] = None, capacity: int = 1024):
+        if retain is not None and retain < 1:
+            raise ValueError("retain must be positive")
+        self.names: List[str] = list(dtypes)
+        self.dtypes = {name: np.dtype(dtype) for name, dtype in dtypes.items()}
+        self.retain = retain
+        size = 2 * retain if retain is not None else max(capacity, 1)
+        self._columns = [np.zeros(size, dtype=self.dtypes[name])
+                         for name in self.names]
+        self._pending: List[tuple] = []
+        #: Number of rows ever appended.
+        self.total = 0
+
+    def __len__(self) -> int:
+        if self.retain is None:
+            return self.total
+        return min(self.total, self.retain)
+
+    @property
+    def first_row(self) -> int:
+        """Absolute number of the oldest row still held."""
+        return self.total - len(self)
+
+    def append(self, *values) -> None:
+        """Append one record, given as values in column order."""
+        # Setting NumPy scalars one by one costs more than the whole record
+        # is worth; records are staged as tuples and written in chunks.
+        self._pending.append(values)
+        self.total += 1
+        if len(self._pending) >= self.CHUNK:
+            self._commit()
+
+    def _commit(self) -> None:
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = []
+        self._store([np.array(values, dtype=col.dtype)
+                     for col, values in zip(self._columns, zip(*pending))])
+
+    def _store(self, columns: List[np.ndarray]) -> None:
+        """Write column blocks holding the rows that end at :attr:`total`."""
+        k = len(columns[0])
+        start = self.total - k
+        if self.retain is None:
+            size = len(self._columns[0])
+            if self.total > size:
+                while size < self.total:
+                    size *= 2
+                grown = []
+                for col in self._columns:
+                    new = np.zeros(size, dtype=col.dtype)
+                    new[:start] = col[:start]
+                    grown.append(new)
+                self._columns = grown
+            for col, values in zip(self._columns, columns):
+                col[start:self.total] = values
+        else:
+            r = self.retain
+            if k > r:
+                columns = [values[-r:] for values in columns]
+                start, k = self.total - r, r
+            slots = (start + np.arange(k)) % r
+            for col, values in zip(self._columns, columns):
+                col[slots] = values
+                col[slots + r] = values
+
+    def arrays(self, since: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Return views of the held rows in append order.
+
+        Parameters
+        ----------
+        since: int, optional
+            Only return rows with absolute number ``>= since`` (see
+            :attr:`total`); they must still be held.
+
+        The views share memory with the buffer: growing reallocates and
+        leaves them intact, but once a ring buffer wraps, later appends
+        overwrite them.  Copy the arrays to keep them.
+        """
+        self._commit()
+        n = len(self)
+        if self.retain is None or self.total <= self.retain:
+            lo = 0
+        else:
+            lo = self.total % self.retain
+        if since is not None:
+            if since < self.first_row:
+                raise ValueError(f"row {since} is no longer held")
+            lo += since - self.first_row
+            n -= since - self.first_row
+        hi = lo + max(n, 0)
+        return {name: col[lo:hi] for name, col in zip(self.names, self._columns)}
+
+    def clear(self) -> None:
+        self._pending = []
+        self.total = 0
+
+    def restore(self, arrays: Mapping[str, np.ndarray], total: int) -> None:
+        """Replace the contents with ``arrays``, the last rows of ``total``
+        rows ever appended (e.g. as saved from :meth:`arrays`)."""
+        columns = [np.asarray(arrays[name], dtype=self.dtypes[name])
+                   for name in self.names]
+        if self.retain is None and len(columns[0]) != total:
+            raise ValueError("an unbounded buffer needs every row")
+        self.clear()
+        self.total = int(total)
+        if len(columns[0]):
+            self._store(columns)
+
+
+class ColumnLog:
+    """Append-only columnar log in a directory.
+
+    Rows are appended to one ``<column>.bin`` file per column.  The column
+    dtypes are recorded in ``columns.json`` when the log is created and
+    checked when it is reopened.  The row count is derived from the file
+    sizes; a torn write from a crash is truncated away when the log is next
+    opened for appending.
+    """
+
+    def __init__(self, path: Union[str, Path],
+                 dtypes: Mapping[str, Union[str, np.dtype]]):
+        self.path = Path(path)
+        self.dtypes = {name: np.dtype(dtype).newbyteorder("<")
+                       for name, dtype in dtypes.items()}
+        self.path.mkdir(parents=True, exist_ok=True)
+        spec = {name: dtype.str for name, dtype in self.dtypes.items()}
+        columns_file = self.path / COLUMNS_FILE
+        if columns_file.exists():
+            with open(columns_file) as fh:
+                stored = json.load(fh)
+            if stored != spec:
+                raise ValueError(f"{self.path} holds columns {stored}")
+        else:
+            tmp = columns_file.with_suffix(".tmp")
+            with open(tmp, "w") as fh:
+                json.dump(spec, fh, indent=2)
+            os.replace(tmp, columns_file)
+
+        self.rows = self.count_rows(self.path, self.dtypes)
+        self._files = {}
+        for name, dtype in self.dtypes.items():
+            fh = open(self._column_path(self.path, name), "ab")
+            fh.truncate(self.rows * dtype.itemsize)
+            self._files[name] = fh
+
+    @staticmethod
+    def _column_path(path: Path, name: str) -> Path:
+        return path / f"{name}.bin"
+
+    @classmethod
+    def count_rows(cls, path: Path, dtypes: Mapping[str, np.dtype]) -> int:
+        sizes = []
+        for name, dtype in dtypes.items():
+            file = cls._column_path(path, name)
+            sizes.append(file.stat().st_size // dtype.itemsize
+                         if file.exists() else 0)
+        return min(sizes) if sizes else 0
+
+    def append(self, arrays: Mapping[str, np.ndarray]) -> None:
+        """Append equally long column arrays and flush them to the OS."""
+        lengths = {len(arrays[name]) for name in self.dtypes}
+        if len(lengths) != 1:
+            raise ValueError("columns must have the same length")
+        for name, dtype in self.dtypes.items():
+            fh = self._files[name]
+            fh.write(np.ascontiguousarray(arrays[name], dtype=dtype).data)
+            fh.flush()
+        self.rows += lengths.pop()
+
+    def close(self) -> None:
+        for fh in self._files.values():
+            fh.close()
+        self._files = {}
+
+    @classmethod
+    def read(cls, path: Union[str, Path],
+             columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """Return read-only memory maps of the complete rows in ``path``."""
+        path = Path(path)
+        with open(path / COLUMNS_FILE) as fh:
+            dtypes = {name: np.dtype(d) for name, d in json.load(fh).items()}
+        rows = cls.count_rows(path, dtypes)
+        names = list(columns) if columns is not None else list(dtypes)
+        out = {}
+        for name in names:
+            if rows == 0:
+                out[name] = np.empty(0, dtype=dtypes[name])
+            else:
+                out[name] = np.memmap(cls._column_path(path, name),
+                                      dtype=dtypes[name], mode="r",
+                                      shape=(rows,))
+        return out
@@ -1,11 +1,74 @@
+"""Portfolio and trade logging for analysis.
+
+Snapshots and trades are stored column-wise in NumPy arrays (timestamps as
+``int64`` UTC epoch nanoseconds, values as ``float64``, trading pairs and
+sides as integer codes into small category lists), so logging every tick of
+a long-running bot costs a few dozen bytes per record.  With ``retain`` only
+the most recent records are kept in memory; with ``log_dir`` every record is
+also spilled to an append-only columnar log on disk, which
+:meth:`PortfolioTracker.read_log` memory-maps back.
+
+With ``wal_dir`` every record is also appended to a write-ahead log
+(:mod:`analytics.wal`, 33-38 bytes per record, fsynced in groups by a
+background thread) and the retained records are checkpointed every
+``checkpoint_every`` records, so a restarted tracker comes back with its
+history from the latest checkpoint plus a bounded log tail.  ``retain`` is
+required with ``wal_dir``, as it bounds the checkpoints; the full history
+belongs in ``log_dir``.
+
+With ``performance`` every record also updates a streaming
+:class:`~analytics.performance.PerformanceMetrics` engine (returns,
+volatility, Sharpe/Sortino, drawdown, win rate, turnover, fees);
+:meth:`PortfolioTracker.performance_summary` computes the same statistics
+over the stored records in one vectorized pass.
+
+Example
+-------
+>>> tracker = PortfolioTracker(retain=100_000, log_dir="logs/portfolio")
+>>> tracker.log_snapshot(1000.0, 0.0)
+>>> frame = tracker.snapshot_frame()      # zero-copy view of the records
+>>> tracker.close()
+"""
 from __future__ import annotations
 
+import io
+import json
+import os
+import struct
+import sys
+import time
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from . import metrics
+from .columnar import ColumnBuffer, ColumnLog
+from .performance import PerformanceMetrics
+from .wal import WriteAheadLog
+from .downsample import lttb_indices, minmax_indices
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SNAPSHOT_COLUMNS = {"timestamp": np.int64, "balance": np.float64,
+                    "pnl": np.float64}
+TRADE_COLUMNS = {"timestamp": np.int64, "pair": np.int32,
+                 "quantity": np.float64, "price": np.float64,
+                 "side": np.int8, "fee": np.float64}
+CATEGORIES_FILE = "categories.json"
+# Write-ahead log record kinds and layouts.
+WAL_SNAPSHOT, WAL_TRADE, WAL_PAIR, WAL_SIDE = 1, 2, 3, 4
+SNAPSHOT_RECORD = struct.Struct("<qdd")
+TRADE_RECORD = struct.Struct("<qiddbd")
+DOWNSAMPLE_METHODS = ("minmax", "lttb", "none")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAIVE_EPOCH = datetime(1970, 1, 1)
 
-import matplotlib.pyplot as plt
+TimestampLike = Union[datetime, np.datetime64, int, None]
 
 
 @dataclass
@@ -24,65 +87,491 @@ class TradeRecord:
     quantity: float
     price: float
     side: str
+    fee: float = 0.0
+
+
+def to_epoch_ns(timestamp: TimestampLike) -> int:
+    """Convert ``timestamp`` to UTC epoch nanoseconds.
+
+    ``None`` means now; naive datetimes are taken to be UTC and integers are
+    already nanoseconds.
+    """
+    if timestamp is None:
+        return time.time_ns()
+    # pandas is only imported by callers that already use it.
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(timestamp, pd.Timestamp):
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert(None)
+        return int(timestamp.value)
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        delta = timestamp - _EPOCH
+        return ((delta.days * 86_400 + delta.seconds) * 1_000_000
+                + delta.microseconds) * 1_000
+    if isinstance(timestamp, np.datetime64):
+        return int(timestamp.astype("datetime64[ns]").view(np.int64))
+    return int(timestamp)
+
+
+def _to_datetime(ns: int) -> datetime:
+    return _NAIVE_EPOCH + timedelta(microseconds=ns // 1_000)
+
+
+class _Codes:
+    """Category list with a reverse index."""
+
+    def __init__(self, categories: Optional[List[str]] = None):
+        self.categories: List[str] = list(categories or [])
+        self._index = {c: i for i, c in enumerate(self.categories)}
+
+    def code(self, value: str) -> int:
+        i = self._index.get(value)
+        if i is None:
+            i = self._index[value] = len(self.categories)
+            self.categories.append(value)
+        return i
 
 
 class PortfolioTracker:
-    """Tracks balances, PnL, and trades for analysis."""
+    """Tracks balances, PnL, and trades for analysis.
+
+    Parameters
+    ----------
+    retain: int, optional
+        Number of most recent snapshots and trades kept in memory.  ``None``
+        keeps everything.
+    log_dir: str or Path, optional
+        Directory of an append-only on-disk log receiving every record.
+        Records are written in batches of ``flush_every`` (and on
+        :meth:`flush`/:meth:`close`); an existing log is appended to.
+    flush_every: int
+        Records buffered per table before they are written to ``log_dir``.
+    wal_dir: str or Path, optional
+        Directory of a write-ahead log receiving every record.  If it
+        already holds one, the tracker's records are recovered from it.
+        Requires ``retain``, which bounds the checkpointed records and with
+        them the cost of every checkpoint and recovery.  Records evicted by
+        ``retain`` are only kept if ``log_dir`` is also set.
+    checkpoint_every: int
+        Records logged to ``wal_dir`` between checkpoints of the retained
+        records.
+    performance: PerformanceMetrics, optional
+        Streaming metrics engine to feed every snapshot and trade.  After a
+        recovery from ``wal_dir`` it restarts from the recovered records.
+    """
 
-    def __init__(self) -> None:
-        self.history: List[PortfolioSnapshot] = []
-        self.trades: List[TradeRecord] = []
+    def __init__(self, retain: Optional[int] = None,
+                 log_dir: Optional[Union[str, Path]] = None,
+                 flush_every: int = 1024,
+                 wal_dir: Optional[Union[str, Path]] = None,
+                 checkpoint_every: int = 100_000,
+                 performance: Optional[PerformanceMetrics] = None) -> None:
+        if wal_dir is not None and retain is None:
+            raise ValueError("wal_dir requires retain; keep the full history "
+                             "with log_dir")
+        if retain is not None:
+            flush_every = min(flush_every, retain)
+        self.flush_every = max(flush_every, 1)
+        self._snapshots = ColumnBuffer(SNAPSHOT_COLUMNS, retain=retain)
+        self._trades = ColumnBuffer(TRADE_COLUMNS, retain=retain)
+        self._pairs = _Codes()
+        self._sides = _Codes(["buy", "sell"])
+        self.log_dir = Path(log_dir) if log_dir is not None else None
+        self._logs: Dict[str, ColumnLog] = {}
+        self._flushed = {"snapshots": 0, "trades": 0}
+        self._logged_categories: Tuple[int, int] = (0, 0)
+        if self.log_dir is not None:
+            categories = self._read_categories(self.log_dir)
+            self._pairs = _Codes(categories["pair"])
+            self._sides = _Codes(categories["side"] or ["buy", "sell"])
+            self._logged_categories = (len(self._pairs.categories),
+                                       len(self._sides.categories))
+            self._logs = {
+                "snapshots": ColumnLog(self.log_dir / "snapshots",
+                                       SNAPSHOT_COLUMNS),
+                "trades": ColumnLog(self.log_dir / "trades", TRADE_COLUMNS),
+            }
+        self.checkpoint_every = max(int(checkpoint_every), 1)
+        self.performance = performance
+        self._wal: Optional[WriteAheadLog] = None
+        if wal_dir is not None:
+            wal = WriteAheadLog(wal_dir)
+            self._recover(wal)
+            self._wal = wal
+            if performance is not None:
+                performance.load(self.snapshot_arrays()["balance"],
+                                 self._named_trades(self.trade_arrays()))
 
+    # ------------------------------------------------------------------ logging
+    @metrics.instrumented("tracker.log_snapshot")
     def log_snapshot(
-        self, balance: float, pnl: float, timestamp: Optional[datetime] = None
+        self, balance: float, pnl: float, timestamp: TimestampLike = None
     ) -> None:
         """Append a snapshot of the portfolio."""
-        ts = timestamp or datetime.utcnow()
-        self.history.append(PortfolioSnapshot(ts, balance, pnl))
+        ts = to_epoch_ns(timestamp)
+        self._snapshots.append(ts, balance, pnl)
+        if self.performance is not None:
+            self.performance.update(balance)
+        self._after_append("snapshots", self._snapshots)
+        if self._wal is not None:
+            self._wal.append(WAL_SNAPSHOT,
+                             SNAPSHOT_RECORD.pack(ts, balance, pnl))
+            self._after_wal_append()
 
+    @metrics.instrumented("tracker.log_trade")
     def log_trade(
         self,
         pair: str,
         quantity: float,
         price: float,
         side: str,
-        timestamp: Optional[datetime] = None,
+        timestamp: TimestampLike = None,
+        fee: float = 0.0,
     ) -> None:
         """Append a trade to the log."""
-        ts = timestamp or datetime.utcnow()
-        self.trades.append(TradeRecord(ts, pair, quantity, price, side))
+        ts = to_epoch_ns(timestamp)
+        if self.performance is not None:
+            self.performance.update_trade(pair, quantity, price, side, fee)
+        if self._wal is None:
+            self._trades.append(ts, self._pairs.code(pair), quantity, price,
+                                self._sides.code(side), fee)
+            self._after_append("trades", self._trades)
+            return
+        pair_code = self._wal_code(self._pairs, WAL_PAIR, pair)
+        side_code = self._wal_code(self._sides, WAL_SIDE, side)
+        self._trades.append(ts, pair_code, quantity, price, side_code, fee)
+        self._after_append("trades", self._trades)
+        self._wal.append(WAL_TRADE, TRADE_RECORD.pack(ts, pair_code, quantity,
+                                                      price, side_code, fee))
+        self._after_wal_append()
+
+    def _after_append(self, table: str, buffer: ColumnBuffer) -> None:
+        if self._logs and buffer.total - self._flushed[table] >= self.flush_every:
+            self._flush_table(table, buffer)
+
+    # ------------------------------------------------------------ write-ahead log
+    def _wal_code(self, codes: _Codes, kind: int, value: str) -> int:
+        n = len(codes.categories)
+        code = codes.code(value)
+        if code == n:
+            # New categories are logged before the records using them.
+            self._wal.append(kind, value.encode())
+        return code
+
+    def _after_wal_append(self) -> None:
+        if self._wal.since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Checkpoint the retained records to the write-ahead log now.
+
+        Only copies of the (at most ``retain``) records are taken here; the
+        flusher thread serializes and writes the checkpoint, and the log
+        before it is then dropped.
+        """
+        if self._wal is None:
+            return
+        arrays = {f"snapshots.{k}": v.copy()
+                  for k, v in self.snapshot_arrays().items()}
+        arrays.update({f"trades.{k}": v.copy()
+                       for k, v in self.trade_arrays().items()})
+        arrays["totals"] = np.array([self._snapshots.total,
+                                     self._trades.total])
+        arrays["pairs"] = np.array(self._pairs.categories, dtype=str)
+        arrays["sides"] = np.array(self._sides.categories, dtype=str)
+
+        def serialize() -> bytes:
+            buffer = io.BytesIO()
+            np.savez(buffer, **arrays)
+            return buffer.getvalue()
+
+        self._wal.checkpoint(serialize)
+
+    def _recover(self, wal: WriteAheadLog) -> None:
+        if wal.checkpoint_state is not None:
+            with np.load(io.BytesIO(wal.checkpoint_state)) as data:
+                snapshots, trades = data["totals"].tolist()
+                self._snapshots.restore(
+                    {k: data[f"snapshots.{k}"] for k in SNAPSHOT_COLUMNS},
+                    snapshots)
+                self._trades.restore(
+                    {k: data[f"trades.{k}"] for k in TRADE_COLUMNS}, trades)
+                self._pairs = _Codes(data["pairs"].tolist())
+                self._sides = _Codes(data["sides"].tolist())
+        for _, kind, payload in wal.records():
+            if kind == WAL_SNAPSHOT:
+                self._snapshots.append(*SNAPSHOT_RECORD.unpack(payload))
+            elif kind == WAL_TRADE:
+                self._trades.append(*TRADE_RECORD.unpack(payload))
+            elif kind == WAL_PAIR:
+                self._pairs.code(payload.decode())
+            elif kind == WAL_SIDE:
+                self._sides.code(payload.decode())
+        # Records already spilled to ``log_dir`` must not be written again.
+        for table, buffer in (("snapshots", self._snapshots),
+                              ("trades", self._trades)):
+            if table in self._logs:
+                self._flushed[table] = max(
+                    buffer.first_row, min(buffer.total,
+                                          self._logs[table].rows))
+
+    # ------------------------------------------------------------------ disk log
+    @staticmethod
+    def _read_categories(log_dir: Path) -> Dict[str, List[str]]:
+        path = log_dir / CATEGORIES_FILE
+        if not path.exists():
+            return {"pair": [], "side": []}
+        with open(path) as fh:
+            return json.load(fh)
+
+    def _write_categories(self) -> None:
+        sizes = (len(self._pairs.categories), len(self._sides.categories))
+        if sizes == self._logged_categories:
+            return
+        # Categories only grow, and are written before any codes that use
+        # them, so the log always decodes.
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        path = self.log_dir / CATEGORIES_FILE
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as fh:
+            json.dump({"pair": self._pairs.categories,
+                       "side": self._sides.categories}, fh)
+        os.replace(tmp, path)
+        self._logged_categories = sizes
+
+    def _flush_table(self, table: str, buffer: ColumnBuffer) -> None:
+        if buffer.total == self._flushed[table]:
+            return
+        if table == "trades":
+            self._write_categories()
+        self._logs[table].append(buffer.arrays(since=self._flushed[table]))
+        self._flushed[table] = buffer.total
+
+    def flush(self) -> None:
+        """Write buffered records to the on-disk log and sync the
+        write-ahead log."""
+        if self._logs:
+            self._flush_table("snapshots", self._snapshots)
+            self._flush_table("trades", self._trades)
+        if self._wal is not None:
+            self._wal.sync()
+
+    def close(self) -> None:
+        """Flush and close the on-disk and write-ahead logs."""
+        self.flush()
+        for log in self._logs.values():
+            log.close()
+        self._logs = {}
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    def __enter__(self) -> "PortfolioTracker":
+        return self
 
-    def plot_portfolio_history(self, output_path: Optional[str] = None) -> None:
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------ export
+    @property
+    def pairs(self) -> List[str]:
+        """Trading pairs indexed by the ``pair`` codes of the trade arrays."""
+        return list(self._pairs.categories)
+
+    @property
+    def sides(self) -> List[str]:
+        """Sides indexed by the ``side`` codes of the trade arrays."""
+        return list(self._sides.categories)
+
+    def snapshot_arrays(self) -> Dict[str, np.ndarray]:
+        """Return the in-memory snapshots as column views (no copy)."""
+        return self._snapshots.arrays()
+
+    def trade_arrays(self) -> Dict[str, np.ndarray]:
+        """Return the in-memory trades as column views (no copy).
+
+        ``pair`` and ``side`` are codes into :attr:`pairs` and :attr:`sides`.
+        """
+        return self._trades.arrays()
+
+    def _named_trades(self, arrays: Dict[str, np.ndarray]
+                      ) -> Dict[str, np.ndarray]:
+        named = dict(arrays)
+        named["pair"] = np.array(self._pairs.categories,
+                                 dtype=object)[arrays["pair"]]
+        named["side"] = np.array(self._sides.categories,
+                                 dtype=object)[arrays["side"]]
+        return named
+
+    def performance_summary(self, window: int = 1000,
+                            periods_per_year: Optional[float] = None
+                            ) -> Dict[str, float]:
+        """Performance statistics of the in-memory records, computed in one
+        vectorized pass.
+
+        Matches the summary of a :class:`PerformanceMetrics` engine with the
+        same settings fed the same records; use
+        :meth:`PerformanceMetrics.from_history` on :meth:`read_log` frames
+        for a full on-disk history.
+        """
+        return PerformanceMetrics.from_history(
+            self.snapshot_arrays()["balance"],
+            self._named_trades(self.trade_arrays()), window=window,
+            periods_per_year=periods_per_year).summary()
+
+    @staticmethod
+    def _snapshot_frame(arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+        import pandas as pd
+
+        data = dict(arrays)
+        data["timestamp"] = data["timestamp"].view("datetime64[ns]")
+        return pd.DataFrame(data, copy=False)
+
+    @staticmethod
+    def _trade_frame(arrays: Dict[str, np.ndarray], pairs: List[str],
+                     sides: List[str]) -> pd.DataFrame:
+        import pandas as pd
+
+        data = dict(arrays)
+        data["timestamp"] = data["timestamp"].view("datetime64[ns]")
+        data["pair"] = pd.Categorical.from_codes(data["pair"], pairs)
+        data["side"] = pd.Categorical.from_codes(data["side"], sides)
+        return pd.DataFrame(data, copy=False)
+
+    def snapshot_frame(self) -> pd.DataFrame:
+        """Return the in-memory snapshots as a DataFrame.
+
+        Numeric columns share memory with the tracker, see
+        :meth:`ColumnBuffer.arrays`.
+        """
+        return self._snapshot_frame(self.snapshot_arrays())
+
+    def trade_frame(self) -> pd.DataFrame:
+        """Return the in-memory trades as a DataFrame with categorical
+        ``pair`` and ``side`` columns."""
+        return self._trade_frame(self.trade_arrays(), self._pairs.categories,
+                                 self._sides.categories)
+
+    @classmethod
+    def read_log(cls, log_dir: Union[str, Path]
+                 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Return ``(snapshots, trades)`` frames memory-mapped from a log."""
+        log_dir = Path(log_dir)
+        categories = cls._read_categories(log_dir)
+        snapshots = cls._snapshot_frame(ColumnLog.read(log_dir / "snapshots"))
+        trades = cls._trade_frame(ColumnLog.read(log_dir / "trades"),
+                                  categories["pair"], categories["side"])
+        return snapshots, trades
+
+    @property
+    def history(self) -> List[PortfolioSnapshot]:
+        """In-memory snapshots as :class:`PortfolioSnapshot` objects.
+
+        Builds one object per record; prefer :meth:`snapshot_arrays` for
+        large histories.
+        """
+        arrays = self.snapshot_arrays()
+        return [PortfolioSnapshot(_to_datetime(ts), balance, pnl)
+                for ts, balance, pnl in zip(arrays["timestamp"].tolist(),
+                                            arrays["balance"].tolist(),
+                                            arrays["pnl"].tolist())]
+
+    @property
+    def trades(self) -> List[TradeRecord]:
+        """In-memory trades as :class:`TradeRecord` objects."""
+        arrays = self.trade_arrays()
+        pairs, sides = self._pairs.categories, self._sides.categories
+        return [TradeRecord(_to_datetime(ts), pairs[pair], quantity, price,
+                            sides[side], fee)
+                for ts, pair, quantity, price, side, fee in zip(
+                    arrays["timestamp"].tolist(), arrays["pair"].tolist(),
+                    arrays["quantity"].tolist(), arrays["price"].tolist(),
+                    arrays["side"].tolist(), arrays["fee"].tolist())]
+
+    # ------------------------------------------------------------------ plotting
+    def plot_portfolio_history(self, output_path: Optional[str] = None,
+                               start: TimestampLike = None,
+                               end: TimestampLike = None,
+                               max_points: int = 2000,
+                               method: str = "minmax") -> None:
         """Plot balance and PnL over time.
 
         Parameters
         ----------
         output_path:
             File to save the figure to. If ``None`` the plot is displayed instead.
+        start, end:
+            Only plot snapshots with ``start <= timestamp < end``.
+        max_points:
+            Upper bound on the points drawn per line.
+        method:
+            ``"minmax"`` keeps the extremes of every pixel-wide time bucket,
+            ``"lttb"`` uses Largest-Triangle-Three-Buckets and ``"none"``
+            draws every snapshot.
         """
-        if not self.history:
-            raise ValueError("No portfolio history to plot.")
-
-        times = [snap.timestamp for snap in self.history]
-        balances = [snap.balance for snap in self.history]
-        pnls = [snap.pnl for snap in self.history]
-
-        fig, ax1 = plt.subplots()
-        ax1.set_xlabel("Time")
-        ax1.set_ylabel("Balance", color="tab:blue")
-        ax1.plot(times, balances, color="tab:blue", label="Balance")
-        ax1.tick_params(axis="y", labelcolor="tab:blue")
-
-        ax2 = ax1.twinx()
-        ax2.set_ylabel("PnL", color="tab:green")
-        ax2.plot(times, pnls, color="tab:green", label="PnL")
-        ax2.tick_params(axis="y", labelcolor="tab:green")
-
-        fig.tight_layout()
-        if output_path:
-            out = Path(output_path)
-            out.parent.mkdir(parents=True, exist_ok=True)
-            fig.savefig(out)
-        else:
-            plt.show()
-        plt.close(fig)
+        plot_history(self.snapshot_arrays(), output_path, start=start,
+                     end=end, max_points=max_points, method=method)
+
+
+def plot_history(snapshots: Union[Dict[str, np.ndarray], pd.DataFrame],
+                 output_path: Optional[str] = None,
+                 start: TimestampLike = None, end: TimestampLike = None,
+                 max_points: int = 2000, method: str = "minmax") -> None:
+    """Plot ``timestamp``/``balance``/``pnl`` columns, e.g. from
+    :meth:`PortfolioTracker.read_log`.
+
+    See :meth:`PortfolioTracker.plot_portfolio_history` for the parameters.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"method must be one of {DOWNSAMPLE_METHODS}")
+    times = np.asarray(snapshots["timestamp"])
+    if times.dtype.kind == "M":
+        times = times.astype("datetime64[ns]").view(np.int64)
+    balances = np.asarray(snapshots["balance"])
+    pnls = np.asarray(snapshots["pnl"])
+
+    if len(times) and np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind="stable")
+        times, balances, pnls = times[order], balances[order], pnls[order]
+    lo = 0 if start is None else np.searchsorted(times, to_epoch_ns(start))
+    hi = len(times) if end is None else np.searchsorted(times,
+                                                        to_epoch_ns(end))
+    times, balances, pnls = times[lo:hi], balances[lo:hi], pnls[lo:hi]
+    if not len(times):
+        raise ValueError("No portfolio history to plot.")
+
+    def reduce(values: np.ndarray) -> np.ndarray:
+        if method == "minmax":
+            return minmax_indices(times, values, max(max_points // 2, 1))
+        if method == "lttb":
+            return lttb_indices(times, values, max_points)
+        return np.arange(len(values))
+
+    # Imported here so headless processes never pay for matplotlib.
+    import matplotlib.pyplot as plt
+
+    fig, ax1 = plt.subplots()
+    ax1.set_xlabel("Time")
+    ax1.set_ylabel("Balance", color="tab:blue")
+    idx = reduce(balances)
+    ax1.plot(times[idx].view("datetime64[ns]"), balances[idx],
+             color="tab:blue", label="Balance")
+    ax1.tick_params(axis="y", labelcolor="tab:blue")
+
+    ax2 = ax1.twinx()
+    ax2.set_ylabel("PnL", color="tab:green")
+    idx = reduce(pnls)
+    ax2.plot(times[idx].view("datetime64[ns]"), pnls[idx], color="tab:green",
+             label="PnL")
+    ax2.tick_params(axis="y", labelcolor="tab:green")
+
+    fig.tight_layout()
+    if output_path:
+        out = Path(output_path)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        fig.savefig(out)
+    else:
+        plt.show()
+    plt.close(fig)
@@ -0,0 +1,107 @@
+"""Throughput of :class:`exchange.bars.BarAggregator`.
+
+Feeds synthetic ticks of ``--symbols`` symbols spread over ``--seconds``
+seconds into 1s/1m/5m/1h bars.  A fraction of ticks (``--disorder``) arrives
+up to ``--delay`` seconds late, so some still fall into open bars and some
+are late and dropped.  The ticks go in one per :meth:`update` call and in
+``--batch``-sized arrays through :meth:`update_array`.  Reports ticks per
+second for each path and checks that both produce the same bars.
+
+Usage::
+
+    python benchmarks/bar_aggregator.py
+    python benchmarks/bar_aggregator.py --symbols 500 --ticks 2000000 --lateness 2
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from exchange.bars import BAR_DTYPE, BarAggregator  # noqa: E402
+
+START_NS = 1_700_000_000_000_000_000
+
+
+def make_ticks(symbols: int, ticks: int, seconds: float, disorder: float,
+               delay: float, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ts = START_NS + np.sort(rng.integers(0, int(seconds * 1e9), ticks))
+    late = rng.random(ticks) < disorder
+    ts[late] -= rng.integers(0, int(delay * 1e9) + 1, int(late.sum()))
+    sym = rng.integers(0, symbols, ticks)
+    price = 100.0 * np.exp(np.cumsum(rng.normal(scale=1e-4, size=ticks)))
+    qty = rng.lognormal(size=ticks)
+    return sym, ts, price, qty
+
+
+def same_bars(a: BarAggregator, b: BarAggregator) -> bool:
+    for interval in a.intervals:
+        for s in range(len(a.symbols)):
+            x, y = a.history(s, interval), b.history(s, interval)
+            if len(x) != len(y):
+                return False
+            for field in BAR_DTYPE.names:
+                if field in ("volume", "vwap"):
+                    if not np.allclose(x[field], y[field], rtol=1e-9):
+                        return False
+                elif not np.array_equal(x[field], y[field]):
+                    return False
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure tick-to-bar aggregation throughput")
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--ticks", type=int, default=1_000_000)
+    parser.add_argument("--seconds", type=float, default=600.0)
+    parser.add_argument("--disorder", type=float, default=0.02,
+                        help="Fraction of ticks arriving late")
+    parser.add_argument("--delay", type=float, default=3.0,
+                        help="Maximum delay of late ticks in seconds")
+    parser.add_argument("--lateness", type=float, default=1.0,
+                        help="Seconds bars stay open for late ticks")
+    parser.add_argument("--batch", type=int, default=10_000)
+    args = parser.parse_args()
+
+    sym, ts, price, qty = make_ticks(args.symbols, args.ticks, args.seconds,
+                                     args.disorder, args.delay)
+    names = [f"SYM{i}USDT" for i in range(args.symbols)]
+    history = int(args.seconds) + 2
+
+    scalar = BarAggregator(names, lateness=args.lateness, history=history)
+    update = scalar.update
+    ticks = zip(sym.tolist(), ts.tolist(), price.tolist(), qty.tolist())
+    began = time.perf_counter()
+    for s, t, p, q in ticks:
+        update(s, t, p, q)
+    scalar_s = time.perf_counter() - began
+
+    batched = BarAggregator(names, lateness=args.lateness, history=history)
+    began = time.perf_counter()
+    for i in range(0, args.ticks, args.batch):
+        j = i + args.batch
+        batched.update_array(sym[i:j], ts[i:j], price[i:j], qty[i:j])
+    batch_s = time.perf_counter() - began
+
+    stats = scalar.stats()
+    print(f"ticks {args.ticks:,d}  late {stats['late']:,d}  " + "  ".join(
+        f"{k[5:]} bars {v:,d}" for k, v in stats.items()
+        if k.startswith("bars_")))
+    print(f"update        {args.ticks / scalar_s:12,.0f} ticks/s")
+    print(f"update_array  {args.ticks / batch_s:12,.0f} ticks/s "
+          f"(batches of {args.batch:,d})")
+    same = batched.stats() == stats and same_bars(scalar, batched)
+    print(f"same bars     {same}")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
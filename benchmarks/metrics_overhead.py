@@ -0,0 +1,194 @@
+"""Overhead of :mod:`analytics.metrics` instrumentation.
+
+Runs each workload alternately with instrumentation disabled and enabled
+(:func:`analytics.metrics.enable` swaps the timing wrappers in place) and
+reports the best time of each and the relative overhead, the median of the
+enabled/disabled ratios of back-to-back runs so that drift of the machine
+speed between repeats cancels out:
+
+* ``env rollout``: :class:`rl.env.TradingEnv` stepped by an exported
+  NumPy policy, one observation at a time,
+* ``backtest``: :func:`rl.evaluate.evaluate` over many slices,
+* ``paper pipeline``: :class:`trading.pipeline.TradingPipeline` with a
+  paper executor and portfolio tracking,
+* ``order loop``: bare ``PaperTrader.execute_order`` and
+  ``PortfolioTracker.log_snapshot`` calls, the worst case, where the fixed
+  cost of the sampling wrapper is compared with functions that take about
+  a microsecond themselves.  It is reported and gated as the time added
+  per instrumented call, as no wrapper can be free next to calls that
+  short.
+
+The script exits with status 1 if a workload's overhead exceeds
+``--max-overhead`` or the order loop adds more than ``--max-call-ns`` per
+call.
+
+Usage::
+
+    python benchmarks/metrics_overhead.py --repeat 15 --max-overhead 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Callable, Dict
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import metrics  # noqa: E402
+
+
+def _engine(obs_size: int):
+    from rl.policy_engine import PolicyEngine
+
+    rng = np.random.default_rng(0)
+    layers = [(rng.standard_normal((obs_size, 64)) * 0.1, np.zeros(64)),
+              (rng.standard_normal((64, 64)) * 0.1, np.zeros(64))]
+    head = (rng.standard_normal((64, 3)), np.zeros(3))
+    return PolicyEngine(layers, ["tanh", "tanh"], head, (obs_size,), seed=0)
+
+
+def env_rollout(steps: int) -> Callable[[], None]:
+    import pandas as pd
+
+    from rl.env import TradingEnv
+
+    prices = pd.DataFrame({"price": 100 + np.cumsum(
+        np.random.default_rng(0).standard_normal(steps + 1))})
+    env = TradingEnv(prices)
+    engine = _engine(3)
+
+    def run() -> None:
+        obs = env.reset()
+        done = False
+        while not done:
+            obs, _, done, _ = env.step(engine.act(obs))
+
+    return run
+
+
+def backtest(rows: int) -> Callable[[], None]:
+    import pandas as pd
+
+    from rl.evaluate import evaluate, time_slices
+
+    prices = pd.DataFrame({"price": 100 + np.cumsum(
+        np.random.default_rng(1).standard_normal(rows))})
+    slices = time_slices(prices, 1000, 250)
+    engine = _engine(3)
+    return lambda: evaluate(engine, slices, deterministic=True)
+
+
+def paper_pipeline(ticks: int) -> Callable[[], None]:
+    from analytics.portfolio_tracker import PortfolioTracker
+    from trading.paper_trader import PaperTrader
+    from trading.pipeline import (PaperExecutor, TradingPipeline,
+                                  random_policy, random_walk)
+
+    def run() -> None:
+        pipeline = TradingPipeline(random_walk("BTCUSDT", ticks, seed=0),
+                                   PaperExecutor(PaperTrader(1000.0)),
+                                   random_policy(0),
+                                   tracker=PortfolioTracker(retain=10_000))
+        asyncio.run(pipeline.run())
+
+    return run
+
+
+def order_loop(n: int) -> Callable[[], None]:
+    from analytics.portfolio_tracker import PortfolioTracker
+    from trading.paper_trader import PaperTrader
+
+    def run() -> None:
+        trader = PaperTrader(1e12)
+        trader.update_price("BTCUSDT", 100.0)
+        tracker = PortfolioTracker(retain=10_000)
+        for i in range(n):
+            trader.execute_order("BTCUSDT", "buy", 0.01)
+            tracker.log_snapshot(1.0, 0.0, i)
+
+    return run
+
+
+def measure(run: Callable[[], None], repeat: int) -> Dict[str, float]:
+    best = {"disabled": float("inf"), "enabled": float("inf")}
+    ratios = []
+    added = []
+    for i in range(repeat):
+        # Alternate which mode goes first so neither gets a warmer cache.
+        modes = ("disabled", "enabled") if i % 2 else ("enabled", "disabled")
+        times = {}
+        for mode in modes:
+            if mode == "enabled":
+                metrics.enable()
+            began = time.perf_counter()
+            run()
+            times[mode] = time.perf_counter() - began
+            metrics.disable()
+            best[mode] = min(best[mode], times[mode])
+        ratios.append(times["enabled"] / times["disabled"])
+        added.append(times["enabled"] - times["disabled"])
+    best["overhead"] = float(np.median(ratios)) - 1
+    best["added"] = float(np.median(added))
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure the cost of hot-path instrumentation")
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--max-overhead", type=float, default=0.05,
+                        help="Fail above this relative overhead "
+                             "(default: %(default)s)")
+    parser.add_argument("--max-call-ns", type=float, default=300.0,
+                        help="Fail if the order loop adds more than this "
+                             "per call (default: %(default)s)")
+    parser.add_argument("--show", action="store_true",
+                        help="Print the recorded metrics afterwards")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    orders = 50_000
+    workloads = {
+        "env rollout": env_rollout(20_000),
+        "backtest": backtest(50_000),
+        "paper pipeline": paper_pipeline(20_000),
+        "order loop": order_loop(orders),
+    }
+    # Instrumented calls per run of the workloads gated per call.
+    calls = {"order loop": 2 * orders}
+    print(f"{'workload':16} {'disabled s':>11} {'enabled s':>10} "
+          f"{'overhead':>9} {'ns/call':>8}")
+    failed = []
+    for name, run in workloads.items():
+        r = measure(run, args.repeat)
+        if name in calls:
+            per_call = r["added"] / calls[name] * 1e9
+            slow = per_call > args.max_call_ns
+            cost = f"{per_call:8.0f}"
+        else:
+            slow = r["overhead"] > args.max_overhead
+            cost = f"{'':8}"
+        if slow:
+            failed.append(name)
+        print(f"{name:16} {r['disabled']:11.4f} {r['enabled']:10.4f} "
+              f"{r['overhead']:9.1%} {cost}{'  too slow' if slow else ''}")
+    if args.show:
+        metrics.enable()
+        metrics.REGISTRY.reset()
+        for run in workloads.values():
+            run()
+        print(metrics.format_text())
+    if failed:
+        print(f"instrumentation too slow: {', '.join(failed)}",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
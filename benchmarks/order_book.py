@@ -0,0 +1,130 @@
+"""Per-tick cost of resting-order matching in :class:`PaperTrader`.
+
+Replays a mean-reverting price walk through ``update_price`` with ``N``
+resting limit and stop orders far from the price, which never cross, plus
+100 orders close to it that are re-placed whenever they fill, so the fill
+rate is the same for every ``N``.  Reports the time per tick, which should
+stay flat as ``N`` grows.  A bulk case spreads the orders over 100 symbols
+updated by one ``update_prices`` call per step.
+
+Usage::
+
+    python benchmarks/order_book.py
+    python benchmarks/order_book.py --ticks 1000000 --orders 0 1000 50000
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from trading.paper_trader import PaperTrader  # noqa: E402
+
+
+NEAR = 100
+
+
+def walk(rng: np.random.Generator, shape) -> np.ndarray:
+    """Mean-reverting log-price walk around 100 that stays within ~3%."""
+    noise = rng.normal(scale=3e-4, size=shape)
+    x = np.empty(shape)
+    level = np.zeros(shape[1:])
+    for k in range(shape[0]):
+        level = 0.999 * level + noise[k]
+        x[k] = level
+    return 100.0 * np.exp(x)
+
+
+def _seed_orders(trader: PaperTrader, symbol: str, far: int, near: int,
+                 rng: np.random.Generator) -> None:
+    for offset in rng.uniform(0.05, 0.2, far).tolist():
+        place(trader, symbol, int(rng.integers(0, 4)), offset)
+    for offset in rng.uniform(0.001, 0.005, near).tolist():
+        place(trader, symbol, int(rng.integers(0, 4)), offset)
+
+
+def place(trader: PaperTrader, symbol: str, kind: int, offset: float) -> None:
+    last = trader.last_price(symbol)
+    if kind == 0:
+        trader.place_order(symbol, "buy", 0.01, price=last * (1 - offset))
+    elif kind == 1:
+        trader.place_order(symbol, "sell", 0.01, price=last * (1 + offset))
+    elif kind == 2:
+        trader.place_order(symbol, "buy", 0.01, stop_price=last * (1 + offset))
+    else:
+        trader.place_order(symbol, "sell", 0.01,
+                           stop_price=last * (1 - offset))
+
+
+def single(n_orders: int, ticks: int) -> dict:
+    rng = np.random.default_rng(0)
+    fills = []
+    trader = PaperTrader(1e12, maker_fee=0.001, taker_fee=0.001,
+                         on_fill=fills.append)
+    trader.update_price("BTCUSDT", 100.0)
+    trader.execute_order("BTCUSDT", "buy", 1e6)
+    _seed_orders(trader, "BTCUSDT", n_orders, NEAR, rng)
+    prices = walk(rng, (ticks, 1))[:, 0].tolist()
+    refill = rng.integers(0, 4, ticks).tolist()
+    offsets = rng.uniform(0.001, 0.005, ticks).tolist()
+    update = trader.update_price
+    seen = 0
+    began = time.perf_counter()
+    for k, price in enumerate(prices):
+        update("BTCUSDT", price)
+        if len(fills) != seen:
+            # Keep the book at its size; placing is not part of the tick.
+            paused = time.perf_counter()
+            for _ in range(len(fills) - seen):
+                place(trader, "BTCUSDT", refill[k], offsets[k])
+            seen = len(fills)
+            began += time.perf_counter() - paused
+    elapsed = time.perf_counter() - began
+    return {"ns_per_tick": elapsed / ticks * 1e9, "fills": len(fills),
+            "open": len(trader.open_orders())}
+
+
+def bulk(n_orders: int, ticks: int, symbols: int = 100) -> dict:
+    rng = np.random.default_rng(1)
+    fills = []
+    trader = PaperTrader(1e12, on_fill=fills.append)
+    names = [f"S{i}USDT" for i in range(symbols)]
+    idx = trader.symbol_index(names)
+    trader.update_prices(idx, np.full(symbols, 100.0))
+    for name in names:
+        trader.execute_order(name, "buy", 1e6)
+        _seed_orders(trader, name, n_orders // symbols, NEAR // symbols, rng)
+    steps = ticks // symbols
+    paths = walk(rng, (steps, symbols))
+    began = time.perf_counter()
+    for row in paths:
+        trader.update_prices(idx, row)
+    elapsed = time.perf_counter() - began
+    return {"ns_per_tick": elapsed / (steps * symbols) * 1e9,
+            "fills": len(fills), "open": len(trader.open_orders())}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure paper-trader matching cost per tick")
+    parser.add_argument("--ticks", type=int, default=300_000)
+    parser.add_argument("--orders", type=int, nargs="+",
+                        default=[0, 1_000, 10_000, 50_000])
+    args = parser.parse_args()
+
+    print(f"{'case':22} {'orders':>8} {'ns/tick':>9} {'fills':>8} "
+          f"{'open':>8}")
+    for name, run in (("update_price", single), ("update_prices x100", bulk)):
+        for n in args.orders:
+            r = run(n, args.ticks)
+            print(f"{name:22} {n:8,d} {r['ns_per_tick']:9.0f} "
+                  f"{r['fills']:8,d} {r['open']:8,d}")
+
+
+if __name__ == "__main__":
+    main()
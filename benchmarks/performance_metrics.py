@@ -0,0 +1,90 @@
+"""Cost of streaming performance metrics and agreement with the batch path.
+
+Feeds ``N`` portfolio values (and one trade every 10 snapshots) through
+:class:`PerformanceMetrics` one event at a time, then computes the same
+statistics with :meth:`PerformanceMetrics.from_history`.  Reports the time
+per streamed event, which should not grow with ``N``, the batch time and the
+largest relative difference between the two summaries.
+
+Usage::
+
+    python benchmarks/performance_metrics.py
+    python benchmarks/performance_metrics.py --snapshots 1000000 --window 5000
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics.performance import PerformanceMetrics  # noqa: E402
+
+
+def history(n: int, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    values = 1000.0 * np.exp(np.cumsum(rng.normal(1e-6, 1e-3, n)))
+    n_trades = n // 10
+    pairs = rng.choice(["BTCUSDT", "ETHUSDT", "BNBUSDT"], n_trades)
+    sides = np.where(np.arange(n_trades) % 6 < 3, "buy", "sell")
+    prices = rng.uniform(90.0, 110.0, n_trades)
+    trades = {"pair": pairs, "quantity": np.ones(n_trades), "price": prices,
+              "side": sides, "fee": prices * 0.001}
+    return values, trades
+
+
+def largest_difference(a: dict, b: dict) -> float:
+    worst = 0.0
+    for key, x in a.items():
+        y = b[key]
+        if math.isnan(x) and math.isnan(y) or x == y:
+            continue
+        worst = max(worst, abs(x - y) / max(abs(x), abs(y)))
+    return worst
+
+
+def run(n: int, window: int) -> dict:
+    values, trades = history(n)
+    engine = PerformanceMetrics(window=window)
+    update, update_trade = engine.update, engine.update_trade
+    rows = zip(trades["pair"].tolist(), trades["quantity"].tolist(),
+               trades["price"].tolist(), trades["side"].tolist(),
+               trades["fee"].tolist())
+    began = time.perf_counter()
+    for k, value in enumerate(values.tolist()):
+        update(value)
+        if k % 10 == 9:
+            update_trade(*next(rows))
+    streamed = time.perf_counter() - began
+    began = time.perf_counter()
+    batch = PerformanceMetrics.from_history(values, trades, window=window)
+    batch_time = time.perf_counter() - began
+    return {"ns_per_event": streamed / (n + n // 10) * 1e9,
+            "batch_ms": batch_time * 1e3,
+            "difference": largest_difference(engine.summary(),
+                                             batch.summary())}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure streaming and batch performance metrics")
+    parser.add_argument("--snapshots", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--window", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'snapshots':>10} {'ns/event':>9} {'batch ms':>9} "
+          f"{'max rel diff':>13}")
+    for n in args.snapshots:
+        r = run(n, args.window)
+        print(f"{n:10,d} {r['ns_per_event']:9.0f} {r['batch_ms']:9.1f} "
+              f"{r['difference']:13.1e}")
+
+
+if __name__ == "__main__":
+    main()
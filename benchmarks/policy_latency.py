@@ -0,0 +1,96 @@
+"""Decision latency of the NumPy policy engine against Stable-Baselines3.
+
+Times ``model.predict(obs, deterministic=True)`` and the equivalent
+:class:`rl.policy_engine.PolicyEngine` calls, for one observation and for a
+batch with one observation per symbol, and reports p50/p99 latencies.  It
+also checks that both paths choose the same actions.  Without ``--model`` a
+freshly initialised ``MlpPolicy`` of the default architecture is used, which
+has the same cost as a trained one.
+
+Usage::
+
+    python benchmarks/policy_latency.py
+    python benchmarks/policy_latency.py --model ppo_trading --symbols 200
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _model(path: Optional[str] = None):
+    from stable_baselines3 import PPO
+
+    if path is not None:
+        return PPO.load(path)
+    import pandas as pd
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    from rl.env import TradingEnv
+
+    prices = pd.DataFrame({"price": np.linspace(100.0, 110.0, 100)})
+    return PPO("MlpPolicy", DummyVecEnv([lambda: TradingEnv(prices)]),
+               seed=0)
+
+
+def percentiles(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    for _ in range(min(repeat, 100)):
+        fn()
+    times = np.empty(repeat)
+    for i in range(repeat):
+        began = time.perf_counter_ns()
+        fn()
+        times[i] = time.perf_counter_ns() - began
+    p50, p99 = np.percentile(times, [50, 99]) / 1e3
+    return {"p50_us": p50, "p99_us": p99}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare policy decision latency of SB3 and NumPy")
+    parser.add_argument("--model", default=None,
+                        help="Saved PPO model (default: untrained policy)")
+    parser.add_argument("--symbols", type=int, default=100,
+                        help="Observations per batched decision")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    from rl.policy_engine import PolicyEngine
+
+    model = _model(args.model)
+    engine = PolicyEngine.from_model(model, max_batch=args.symbols)
+    rng = np.random.default_rng(0)
+    shape = (args.symbols,) + engine.obs_shape
+    batch = (rng.standard_normal(shape) * 10).astype(np.float32)
+    single = batch[0]
+
+    expected, _ = model.predict(batch, deterministic=True)
+    agree = float(np.mean(expected == engine.act_batch(batch)))
+
+    cases = {
+        "sb3 predict (1 obs)":
+            lambda: model.predict(single, deterministic=True),
+        "engine act (1 obs)": lambda: engine.act(single),
+        f"sb3 predict ({args.symbols} obs)":
+            lambda: model.predict(batch, deterministic=True),
+        f"engine act_batch ({args.symbols} obs)":
+            lambda: engine.act_batch(batch),
+    }
+    print(f"{'case':32} {'p50 us':>10} {'p99 us':>10}")
+    for name, fn in cases.items():
+        result = percentiles(fn, args.repeat)
+        print(f"{name:32} {result['p50_us']:10.1f} {result['p99_us']:10.1f}")
+    print(f"action agreement: {agree:.4f}")
+
+
+if __name__ == "__main__":
+    main()
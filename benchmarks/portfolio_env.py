@@ -0,0 +1,93 @@
+"""Step and reset cost of :class:`PortfolioEnv` as the symbol universe grows.
+
+Builds symbol banks of ``S`` synthetic random-walk symbols (some listed late)
+in a temporary directory and runs episodes of ``--assets`` symbols sampled
+from each.  Reports the time per step and per reset, both of which should
+stay flat as ``S`` grows, since an episode only copies its own price block
+out of the memory-mapped bank.  The first mode run on a bank also pays for
+mapping each column the first time an episode samples it.
+
+Usage::
+
+    python benchmarks/portfolio_env.py
+    python benchmarks/portfolio_env.py --universe 10 100 1000 5000 --rows 20000
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+warnings.filterwarnings("ignore", module="gym")
+
+from rl.portfolio_env import PortfolioEnv  # noqa: E402
+from rl.symbol_bank import SymbolBank  # noqa: E402
+
+
+def make_bank(path: Path, symbols: int, rows: int, seed: int = 0
+              ) -> SymbolBank:
+    rng = np.random.default_rng(seed)
+    times = np.arange(rows, dtype=np.int64) * 60_000
+    frames = {}
+    for s in range(symbols):
+        # A quarter of the symbols list within the first tenth of the rows.
+        listed = int(rng.integers(0, rows // 10)) if s % 4 == 0 else 0
+        steps = rng.normal(scale=1e-3, size=rows - listed)
+        frames[f"S{s}"] = pd.DataFrame({
+            "timestamp": times[listed:],
+            "price": 100.0 * np.exp(np.cumsum(steps)),
+        })
+    return SymbolBank.build(path, frames)
+
+
+def run(bank: SymbolBank, assets: int, steps: int, mode: str) -> dict:
+    env = PortfolioEnv(bank, n_assets=assets, episode_length=256,
+                       action_mode=mode, seed=0)
+    actions = np.random.default_rng(1).uniform(
+        0.0, 1.0, (steps,) + env.action_space.shape).astype(np.float32)
+    env.reset()
+    step_time = reset_time = 0.0
+    resets = 0
+    for action in actions:
+        began = time.perf_counter()
+        _, _, done, _ = env.step(action)
+        step_time += time.perf_counter() - began
+        if done:
+            began = time.perf_counter()
+            env.reset()
+            reset_time += time.perf_counter() - began
+            resets += 1
+    return {"us_per_step": step_time / steps * 1e6,
+            "us_per_reset": reset_time / max(resets, 1) * 1e6}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure portfolio environment cost per universe size")
+    parser.add_argument("--universe", type=int, nargs="+",
+                        default=[10, 100, 1000])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--assets", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print(f"{'symbols':>8} {'mode':8} {'us/step':>8} {'us/reset':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.universe:
+            bank = make_bank(Path(tmp) / f"bank{n}", n, args.rows)
+            for mode in ("weights", "orders"):
+                r = run(bank, args.assets, args.steps, mode)
+                print(f"{n:8,d} {mode:8} {r['us_per_step']:8.1f} "
+                      f"{r['us_per_reset']:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
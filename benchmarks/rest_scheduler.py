@@ -0,0 +1,134 @@
+"""REST request scheduling under a bulk download with concurrent orders.
+
+Runs the same workload twice against a local
+:class:`exchange.rest_server.RateLimitedServer` with a reduced weight limit:
+``--pages`` kline requests (weight 2 each) issued at once while a market
+order is placed every ``--order-interval`` seconds.
+
+* ``naive``: a thread pool of urllib requests, one connection per request,
+  backing off only after a ``429``/``418`` -- what
+  :class:`exchange.klines.KlineDownloader` and a separate order thread do on
+  their own.
+* ``scheduler``: everything through one
+  :class:`exchange.rest.RestScheduler`, downloads at bulk priority and orders
+  urgent.
+
+Reports the wall time of the download, ``429``/``418`` responses, the
+connections opened and the order latency percentiles.  The scheduler should
+finish without a single limit response and keep orders at the server's own
+latency while the download runs.
+
+Usage::
+
+    python benchmarks/rest_scheduler.py
+    python benchmarks/rest_scheduler.py --pages 2000 --limit 600 --window 2
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from exchange.rest import BULK, RestScheduler, ScheduledRestClient  # noqa: E402
+from exchange.rest_server import RateLimitedServer  # noqa: E402
+
+SYMBOL = "BTCUSDT"
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q / 100), len(ordered) - 1)]
+
+
+def naive_request(url: str, method: str = "GET", retries: int = 8):
+    for attempt in range(retries):
+        request = urllib.request.Request(url, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as exc:
+            if exc.code not in (418, 429) or attempt == retries - 1:
+                raise
+            time.sleep(float(exc.headers.get("Retry-After") or 1.0))
+    return None
+
+
+def run_naive(server: RateLimitedServer, args) -> list:
+    pages = [f"{server.url}/api/v3/klines?"
+             + urllib.parse.urlencode({"symbol": SYMBOL, "startTime": i})
+             for i in range(args.pages)]
+    order = (f"{server.url}/api/v3/order?"
+             + urllib.parse.urlencode({"symbol": SYMBOL, "side": "BUY",
+                                       "type": "MARKET", "quantity": 0.001,
+                                       "signature": "-"}))
+    with ThreadPoolExecutor(args.workers) as pool:
+        download = [pool.submit(naive_request, url) for url in pages]
+        return place_orders(lambda: naive_request(order, "POST"),
+                            lambda: all(f.done() for f in download), args)
+
+
+def run_scheduler(server: RateLimitedServer, args) -> list:
+    with RestScheduler(server.url, "key", "secret",
+                       weight_limit=args.limit, window=args.window,
+                       workers=args.workers) as rest:
+        client = ScheduledRestClient(rest)
+        download = [rest.submit("GET", "/api/v3/klines",
+                                {"symbol": SYMBOL, "startTime": i},
+                                weight=2, priority=BULK)
+                    for i in range(args.pages)]
+        return place_orders(lambda: client.order_market_buy(SYMBOL, 0.001),
+                            lambda: all(f.done() for f in download), args)
+
+
+def place_orders(order, finished, args) -> list:
+    latencies = []
+    while not finished():
+        began = time.perf_counter()
+        order()
+        latencies.append(time.perf_counter() - began)
+        time.sleep(args.order_interval)
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare naive and scheduled REST requests under limits")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=600,
+                        help="Server request weight limit per window")
+    parser.add_argument("--window", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.002,
+                        help="Server latency per request in seconds")
+    parser.add_argument("--order-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"{'mode':10} {'seconds':>8} {'429':>5} {'418':>5} {'conns':>6} "
+          f"{'orders':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, run in (("naive", run_naive), ("scheduler", run_scheduler)):
+        with RateLimitedServer({SYMBOL: 30_000.0}, weight_limit=args.limit,
+                               window=args.window, ban_after=5,
+                               ban_seconds=2 * args.window,
+                               latency=args.latency) as server:
+            began = time.perf_counter()
+            latencies = run(server, args)
+            elapsed = time.perf_counter() - began
+            stats = server.stats()
+        statuses = stats["statuses"]
+        print(f"{name:10} {elapsed:8.2f} {statuses.get(429, 0):5d} "
+              f"{statuses.get(418, 0):5d} {stats['connections']:6d} "
+              f"{len(latencies):7d} {percentile(latencies, 50) * 1e3:8.1f} "
+              f"{percentile(latencies, 99) * 1e3:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Startup benchmark for the command line entry points.
+
+Every case is run in a fresh interpreter from the repository root: once
+under ``python -X importtime`` to record which modules get imported and how
+long imports take, then ``--repeat`` times to measure wall-clock time.  A case
+fails when its median wall time exceeds the budget or when it imports one of
+the heavy packages that its code path does not need, so an accidental
+module-level ``import pandas`` is caught even on a fast machine.
+
+Usage::
+
+    python benchmarks/startup.py              # table, exit status 1 on failure
+    python benchmarks/startup.py --json       # machine readable results
+    python benchmarks/startup.py --budget-ms 150 --repeat 10
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+#: Packages no ``--help`` or argument check should need.
+HEAVY = ("numpy", "pandas", "torch", "stable_baselines3", "gym", "gymnasium",
+         "binance", "dotenv", "matplotlib")
+
+#: ``(name, interpreter arguments, expected exit status)``.
+CASES: Tuple[Tuple[str, Tuple[str, ...], int], ...] = (
+    ("cli --help", ("cli.py", "--help"), 0),
+    ("cli missing symbol", ("cli.py", "--train"), 2),
+    ("rl.train --help", ("-m", "rl.train", "--help"), 0),
+    ("rl.train bad args", ("-m", "rl.train", "missing.csv"), 2),
+    ("rl.infer --help", ("-m", "rl.infer", "--help"), 0),
+    ("rl.infer bad args", ("-m", "rl.infer", "missing.csv"), 2),
+    ("rl.sweep --help", ("-m", "rl.sweep", "--help"), 0),
+    ("import config", ("-c", "import config"), 0),
+    ("import binance_client", ("-c", "import exchange.binance_client"), 0),
+)
+
+
+@dataclass
+class Result:
+    name: str
+    wall_ms: float
+    import_ms: float
+    modules: int
+    heavy: List[str] = field(default_factory=list)
+    exit_status: int = 0
+    ok: bool = True
+
+
+def _run(args: Sequence[str], importtime: bool = False
+         ) -> subprocess.CompletedProcess:
+    flags = ["-X", "importtime"] if importtime else []
+    env = dict(os.environ, PYTHONHASHSEED="0")
+    return subprocess.run([sys.executable, *flags, *args], cwd=ROOT, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          text=True)
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Return ``{module: cumulative microseconds}`` from ``-X importtime``."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level after the
+        # single separating space.
+        modules[name[1:].rstrip()] = int(cumulative)
+    return modules
+
+
+def measure(name: str, args: Sequence[str], status: int, repeat: int,
+            budget_ms: float) -> Result:
+    _run(args)  # warm the bytecode and filesystem caches
+    traced = _run(args, importtime=True)
+    modules = parse_importtime(traced.stderr)
+    # Only top level entries (no indentation) sum to the total.
+    top_level = sum(us for mod, us in modules.items()
+                    if not mod.startswith(" "))
+    heavy = sorted({mod.strip().split(".")[0] for mod in modules}
+                   & set(HEAVY))
+
+    times = []
+    exit_status = 0
+    for _ in range(repeat):
+        began = time.perf_counter()
+        exit_status = _run(args).returncode
+        times.append((time.perf_counter() - began) * 1e3)
+    wall = statistics.median(times)
+    ok = not heavy and wall <= budget_ms and exit_status == status
+    return Result(name, wall, top_level / 1e3, len(modules), heavy,
+                  exit_status, ok)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure start-up time of the command line entry points")
+    parser.add_argument("--budget-ms", type=float, default=200.0,
+                        help="Maximum median wall time per case")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Timed runs per case")
+    parser.add_argument("--json", action="store_true",
+                        help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = [measure(name, case, status, args.repeat, args.budget_ms)
+               for name, case, status in CASES]
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2))
+    else:
+        print(f"{'case':24} {'wall ms':>8} {'import ms':>10} {'modules':>8}"
+              "  result")
+        for r in results:
+            verdict = "ok" if r.ok else "FAIL"
+            if r.heavy:
+                verdict += f" (imports {', '.join(r.heavy)})"
+            print(f"{r.name:24} {r.wall_ms:8.1f} {r.import_ms:10.1f} "
+                  f"{r.modules:8d}  {verdict}")
+    sys.exit(0 if all(r.ok for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
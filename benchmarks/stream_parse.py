@@ -0,0 +1,107 @@
+"""Throughput benchmark for market data stream decoding.
+
+Measures two things on synthetic Binance 24hr ticker messages:
+
+* decode rate of :class:`exchange.streams.TickDecoder` (regex fast path)
+  against plain ``json.loads`` of the same messages, and
+* end-to-end messages per second through :class:`exchange.streams.MarketStream`
+  connected to a local :class:`exchange.stream_server.StreamReplayServer`,
+  with the symbols split over several combined-stream connections.
+
+Usage::
+
+    python benchmarks/stream_parse.py
+    python benchmarks/stream_parse.py --symbols 500 --messages 200000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from exchange.stream_server import (StreamReplayServer,  # noqa: E402
+                                    synthetic_ticker_messages)
+from exchange.streams import MarketStream, TickDecoder  # noqa: E402
+
+
+def symbols_for(n: int):
+    return [f"SYM{i:04d}USDT" for i in range(n)]
+
+
+def bench_decode(messages, symbols) -> dict:
+    decoder = TickDecoder(symbols)
+    began = time.perf_counter()
+    for message in messages:
+        decoder.decode(message)
+    regex = len(messages) / (time.perf_counter() - began)
+
+    began = time.perf_counter()
+    for message in messages:
+        data = json.loads(message)["data"]
+        (data["s"], int(data["E"]), float(data["b"]), float(data["a"]),
+         float(data["c"]), float(data["v"]))
+    plain = len(messages) / (time.perf_counter() - began)
+    return {"regex_msgs_per_s": regex, "json_msgs_per_s": plain,
+            "fallbacks": decoder.fallbacks}
+
+
+async def _consume(url: str, symbols, expected: int, batch_size: int,
+                   timeout: float) -> MarketStream:
+    done = asyncio.Event()
+    stream: MarketStream
+
+    def on_tick(tick) -> None:
+        if stream.ticks >= expected:
+            done.set()
+
+    stream = MarketStream(symbols, on_tick, url=url, batch_size=batch_size)
+    task = asyncio.create_task(stream.run())
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    return stream
+
+
+def bench_stream(messages, symbols, batch_size: int,
+                 timeout: float = 120.0) -> dict:
+    with StreamReplayServer(messages) as server:
+        began = time.perf_counter()
+        stream = asyncio.run(_consume(server.url, symbols, len(messages),
+                                      batch_size, timeout))
+        elapsed = time.perf_counter() - began
+    return {"connections": len(stream.batches), "ticks": stream.ticks,
+            "msgs_per_s": stream.messages / elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark ticker decoding and stream throughput")
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=50,
+                        help="Symbols per connection")
+    args = parser.parse_args()
+
+    symbols = symbols_for(args.symbols)
+    messages = synthetic_ticker_messages(symbols, args.messages)
+
+    decode = bench_decode(messages, symbols)
+    print(f"decode  regex {decode['regex_msgs_per_s']:12,.0f} msgs/s")
+    print(f"decode  json  {decode['json_msgs_per_s']:12,.0f} msgs/s "
+          f"({decode['regex_msgs_per_s'] / decode['json_msgs_per_s']:.2f}x)")
+
+    stream = bench_stream(messages, symbols, args.batch_size)
+    print(f"stream        {stream['msgs_per_s']:12,.0f} msgs/s "
+          f"over {stream['connections']} connections "
+          f"({stream['ticks']:,} ticks)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,607 @@
+"""Performance regression suite for the core hot paths.
+
+Measures throughput, latency percentiles and peak memory of
+
+* ``load_data.cold`` / ``load_data.warm``: :func:`rl.baseline.load_data` of a
+  price CSV, converting it into the columnar cache and memory-mapping it,
+* ``env.step``: :meth:`rl.env.TradingEnv.step` over the whole data set,
+* ``paper_trader.execute_order`` and ``paper_trader.portfolio_value`` (a
+  price update followed by ``portfolio_value()``) of a
+  :class:`~trading.paper_trader.PaperTrader` holding 1 to 1000 symbols,
+* ``tracker.log_snapshot`` / ``tracker.log_trade``
+  (:class:`analytics.portfolio_tracker.PortfolioTracker`),
+* ``binance.get_price_rules``: the exchange info cache behind
+  :meth:`BinanceClient.get_price_rules`, fed through the REST scheduler from
+  the local stand-in (:mod:`exchange.rest_server`), cold (exchange info
+  download) and warm (cache lookups),
+
+on synthetic data at one of several scales.  Every case runs ``--repeat``
+times, each in a fresh interpreter so that its peak memory (maximum resident
+set size) is its own; the median of every measure is reported and the
+values of all runs are kept with it.
+
+Results are JSON files.  ``compare`` flags a measure as a regression when
+its median got worse than the baseline's by more than its own threshold,
+``--threshold`` times the measure's tolerance (twice the threshold for p99
+latencies, one-off timings and peak memory, which are noisier), *and* lies
+beyond the baseline runs' noise band, 1.5 interquartile ranges outside their
+middle half on a log scale (timing noise is a factor, not an offset), so
+run-to-run noise of the machine widens the band instead of failing the
+comparison.  Every measure is gated; exits with status 1 on any regression.
+
+Baselines of the small and medium scales are kept in the repository as
+``benchmarks/baselines/<scale>.json``, recorded from ``--baseline-repeat``
+runs per case, enough for a noise band that holds up over time, together
+with the machine they were recorded on (CPU model and count, Python, NumPy
+and pandas versions).  ``compare`` lists what differs when it runs on
+another machine, where the comparison is only indicative.  ``run
+--save-baseline`` re-records the scale's baseline; commit it along with a
+change that is expected to move the numbers.  ``compare`` records a
+missing baseline first.
+
+Usage::
+
+    python benchmarks/suite.py list
+    python benchmarks/suite.py run --scale small --out results.json
+    python benchmarks/suite.py run --scale small --save-baseline
+    python benchmarks/suite.py compare                  # run small, compare
+                                                        # (records the
+                                                        # baseline first)
+    python benchmarks/suite.py compare --current results.json --threshold 0.1
+    python benchmarks/suite.py run --scale large --data-dir /data/bench
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINES = Path(__file__).resolve().parent / "baselines"
+#: Tolerance of measures taken from a single event, or from a process as a
+#: whole, which vary more between runs than per-call medians.
+NOISY = 2.0
+
+sys.path.insert(0, str(ROOT))
+
+
+@dataclass(frozen=True)
+class Scale:
+    """Data sizes of a suite run."""
+
+    rows: int                   # rows of the price data
+    symbols: Tuple[int, ...]    # symbol counts of the multi-symbol cases
+    events: int                 # calls per latency measurement
+
+
+SCALES = {
+    "small": Scale(10_000, (1, 10), 50_000),
+    "medium": Scale(1_000_000, (1, 100), 100_000),
+    "large": Scale(10_000_000, (1, 1000), 1_000_000),
+    "huge": Scale(100_000_000, (1, 1000), 1_000_000),
+}
+
+
+@dataclass
+class Measure:
+    value: float
+    unit: str
+    better: str                 # "higher" or "lower"
+    tolerance: float = 1.0      # multiplies the regression threshold
+    runs: Optional[List[float]] = None  # values of every run, sorted
+
+
+Measures = Dict[str, Measure]
+CASES: Dict[str, Callable[[Scale, Path], Measures]] = {}
+
+
+def case(name: str):
+    def register(fn: Callable[[Scale, Path], Measures]):
+        CASES[name] = fn
+        return fn
+    return register
+
+
+# ---------------------------------------------------------------------- data
+def price_csv(data_dir: Path, rows: int) -> Path:
+    """Return a CSV of ``rows`` minute prices, writing it on first use."""
+    path = data_dir / f"prices-{rows}.csv"
+    if path.exists():
+        return path
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    partial = path.with_suffix(".partial")
+    chunk = 1_000_000
+    level = 100.0
+    with open(partial, "w") as fh:
+        for start in range(0, rows, chunk):
+            n = min(chunk, rows - start)
+            steps = rng.normal(scale=1e-3, size=n)
+            prices = level * np.exp(np.cumsum(steps))
+            level = float(prices[-1])
+            stamps = pd.Timestamp("2020-01-01") + pd.to_timedelta(
+                np.arange(start, start + n), unit="min")
+            pd.DataFrame({"timestamp": stamps, "price": prices}).to_csv(
+                fh, header=start == 0, index=False)
+    partial.rename(path)
+    return path
+
+
+def symbol_names(n: int):
+    return [f"SYM{i}USDT" for i in range(n)]
+
+
+# ---------------------------------------------------------------------- timing
+def latencies(name: str, fn: Callable[[int], None], events: int,
+              unit: str = "calls") -> Measures:
+    """Call ``fn(i)`` ``events`` times; throughput and p50/p99 latency.
+
+    A tenth as many calls warm up caches and the interpreter first.  The
+    p99 latency gets the wider :data:`NOISY` tolerance.
+    """
+    from analytics.metrics import Histogram
+
+    for i in range(events // 10):
+        fn(i)
+    hist = Histogram(name)
+    record = hist.record
+    clock = time.perf_counter_ns
+    began = clock()
+    for i in range(events):
+        start = clock()
+        fn(i)
+        record(clock() - start)
+    elapsed = (clock() - began) / 1e9
+    return {
+        f"{unit}_per_s": Measure(events / elapsed, "1/s", "higher"),
+        "p50_us": Measure(hist.percentile(50) / 1e3, "us", "lower"),
+        "p99_us": Measure(hist.percentile(99) / 1e3, "us", "lower", NOISY),
+    }
+
+
+# ---------------------------------------------------------------------- cases
+@case("load_data.cold")
+def load_cold(scale: Scale, data_dir: Path) -> Measures:
+    import shutil
+
+    from rl import data_store
+    from rl.baseline import load_data
+
+    path = price_csv(data_dir, scale.rows)
+    shutil.rmtree(data_store.default_cache_dir(path), ignore_errors=True)
+    began = time.perf_counter()
+    frame = load_data(str(path))
+    elapsed = time.perf_counter() - began
+    return {"rows_per_s": Measure(len(frame) / elapsed, "1/s", "higher",
+                                  NOISY),
+            "seconds": Measure(elapsed, "s", "lower", NOISY)}
+
+
+@case("load_data.warm")
+def load_warm(scale: Scale, data_dir: Path) -> Measures:
+    from rl.baseline import load_data
+
+    path = str(price_csv(data_dir, scale.rows))
+    load_data(path)             # make sure the cache exists
+    times = []
+    for _ in range(5):
+        began = time.perf_counter()
+        load_data(path)
+        times.append(time.perf_counter() - began)
+    elapsed = statistics.median(times)
+    return {"rows_per_s": Measure(scale.rows / elapsed, "1/s", "higher"),
+            "ms": Measure(elapsed * 1e3, "ms", "lower")}
+
+
+@case("env.step")
+def env_step(scale: Scale, data_dir: Path) -> Measures:
+    from rl.baseline import load_data
+    from rl.env import TradingEnv
+
+    frame = load_data(str(price_csv(data_dir, scale.rows)))
+    began = time.perf_counter()
+    env = TradingEnv(frame)
+    build = time.perf_counter() - began
+    rng = random.Random(0)
+    actions = [rng.randrange(3) for _ in range(1024)]
+    step, reset = env.step, env.reset
+
+    def one(i: int) -> None:
+        if step(actions[i & 1023])[2]:
+            reset()
+
+    measures = latencies("env.step", one, min(scale.rows, 10 * scale.events),
+                         "steps")
+    measures["build_ms"] = Measure(build * 1e3, "ms", "lower", NOISY)
+    return measures
+
+
+def _trader(symbols: int):
+    from trading.paper_trader import PaperTrader
+
+    trader = PaperTrader(1e12, taker_fee=0.001)
+    names = symbol_names(symbols)
+    for name in names:
+        trader.update_price(name, 100.0)
+        trader.execute_order(name, "buy", 1000.0)
+    return trader, names
+
+
+def _by_symbols(scale: Scale, measure: Callable[[int], Measures]
+                ) -> Measures:
+    out: Measures = {}
+    for n in scale.symbols:
+        for key, value in measure(n).items():
+            out[f"{n}sym.{key}"] = value
+    return out
+
+
+@case("paper_trader.execute_order")
+def trader_orders(scale: Scale, data_dir: Path) -> Measures:
+    def measure(symbols: int) -> Measures:
+        trader, names = _trader(symbols)
+        rng = random.Random(0)
+        plan = [(names[rng.randrange(symbols)], rng.choice(("buy", "sell")))
+                for _ in range(1024)]
+        execute = trader.execute_order
+
+        def one(i: int) -> None:
+            symbol, side = plan[i & 1023]
+            execute(symbol, side, 0.01)
+
+        return latencies("execute_order", one, scale.events, "orders")
+    return _by_symbols(scale, measure)
+
+
+@case("paper_trader.portfolio_value")
+def trader_value(scale: Scale, data_dir: Path) -> Measures:
+    def measure(symbols: int) -> Measures:
+        trader, names = _trader(symbols)
+        rng = random.Random(0)
+        plan = [(names[rng.randrange(symbols)], 100.0 + rng.random())
+                for _ in range(1024)]
+        update, value = trader.update_price, trader.portfolio_value
+
+        def one(i: int) -> None:
+            symbol, price = plan[i & 1023]
+            update(symbol, price)
+            value()
+
+        return latencies("portfolio_value", one, scale.events, "updates")
+    return _by_symbols(scale, measure)
+
+
+@case("tracker.log_snapshot")
+def tracker_snapshot(scale: Scale, data_dir: Path) -> Measures:
+    from analytics.portfolio_tracker import PortfolioTracker
+
+    tracker = PortfolioTracker()
+    log = tracker.log_snapshot
+    start = 1_700_000_000_000_000_000
+    return latencies("log_snapshot",
+                     lambda i: log(1000.0 + i, float(i), start + i),
+                     scale.events, "snapshots")
+
+
+@case("tracker.log_trade")
+def tracker_trade(scale: Scale, data_dir: Path) -> Measures:
+    from analytics.portfolio_tracker import PortfolioTracker
+
+    tracker = PortfolioTracker()
+    log = tracker.log_trade
+    pairs = symbol_names(max(scale.symbols))
+    sides = ("buy", "sell")
+    start = 1_700_000_000_000_000_000
+    return latencies(
+        "log_trade",
+        lambda i: log(pairs[i % len(pairs)], 0.01, 100.0, sides[i & 1],
+                      start + i, 0.001),
+        scale.events, "trades")
+
+
+@case("binance.get_price_rules")
+def price_rules(scale: Scale, data_dir: Path) -> Measures:
+    from exchange.exchange_info import ExchangeInfoCache
+    from exchange.rest import RestScheduler, ScheduledRestClient
+    from exchange.rest_server import RateLimitedServer
+
+    def measure(symbols: int) -> Measures:
+        names = symbol_names(symbols)
+        with RateLimitedServer(dict.fromkeys(names, 100.0)) as server, \
+                RestScheduler(server.url) as rest:
+            # What BinanceClient.get_price_rules does, without python-binance.
+            cache = ExchangeInfoCache(
+                ScheduledRestClient(rest).get_exchange_info)
+            began = time.perf_counter()
+            cache.rules(names[0])
+            cold = time.perf_counter() - began
+            rng = random.Random(0)
+            plan = [names[rng.randrange(symbols)] for _ in range(1024)]
+            rules = cache.rules
+            out = latencies("get_price_rules",
+                            lambda i: rules(plan[i & 1023]),
+                            scale.events, "lookups")
+        out["cold_ms"] = Measure(cold * 1e3, "ms", "lower", NOISY)
+        return out
+    return _by_symbols(scale, measure)
+
+
+# ---------------------------------------------------------------------- runner
+def peak_rss_mb() -> Optional[float]:
+    # On Linux ru_maxrss survives exec and so can report the peak of the
+    # process that spawned the case; the high water mark of the current
+    # address space does not.
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:     # pragma: no cover - not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(name: str, scale: str, data_dir: Path) -> Measures:
+    """Run one case in this process (the ``_case`` subcommand)."""
+    warnings.filterwarnings("ignore")
+    measures = CASES[name](SCALES[scale], data_dir)
+    peak = peak_rss_mb()
+    if peak is not None:
+        measures["peak_rss_mb"] = Measure(peak, "MB", "lower", NOISY)
+    return measures
+
+
+def spawn_case(name: str, scale: str, data_dir: Path) -> Measures:
+    proc = subprocess.run(
+        [sys.executable, __file__, "_case", name, "--scale", scale,
+         "--data-dir", str(data_dir)],
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"{name} failed:\n{proc.stderr}")
+    raw = json.loads(proc.stdout.splitlines()[-1])
+    return {key: Measure(**value) for key, value in raw.items()}
+
+
+def median_measures(runs) -> Measures:
+    out: Measures = {}
+    for key, first in runs[0].items():
+        values = sorted(run[key].value for run in runs)
+        out[key] = Measure(statistics.median(values), first.unit,
+                           first.better, first.tolerance, values)
+    return out
+
+
+def quartiles(values: List[float]) -> Tuple[float, float]:
+    """Return the first and third quartile of ``values``."""
+    if len(values) < 2:
+        return values[0], values[0]
+    q1, _, q3 = statistics.quantiles(values, n=4, method="inclusive")
+    return q1, q3
+
+
+def cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as fh:
+            for line in fh:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def machine() -> Dict[str, object]:
+    """Describe what the numbers were measured on."""
+    import numpy as np
+    import pandas as pd
+
+    return {"cpu": cpu_model(), "cpus": os.cpu_count(),
+            "machine": platform.machine(), "platform": platform.platform(),
+            "python": f"{platform.python_implementation()} "
+                      f"{platform.python_version()}",
+            "numpy": np.__version__, "pandas": pd.__version__}
+
+
+def run_suite(scale: str, names, repeat: int, data_dir: Path,
+              verbose: bool = True) -> Dict[str, object]:
+    if "load_data.cold" in names or "load_data.warm" in names \
+            or "env.step" in names:
+        price_csv(data_dir, SCALES[scale].rows)
+    results = {}
+    for name in names:
+        began = time.perf_counter()
+        runs = [spawn_case(name, scale, data_dir) for _ in range(repeat)]
+        results[name] = median_measures(runs)
+        if verbose:
+            print(f"{name:32} {time.perf_counter() - began:7.1f} s",
+                  file=sys.stderr)
+    return {
+        "scale": scale, "repeat": repeat,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(
+            timespec="seconds"),
+        "machine": machine(),
+        "results": {name: {key: asdict(m) for key, m in measures.items()}
+                    for name, measures in results.items()},
+    }
+
+
+def format_results(report: Dict[str, object]) -> str:
+    lines = [f"{'case':32} {'measure':26} {'value':>14} unit"]
+    for name, measures in report["results"].items():
+        for key, m in measures.items():
+            lines.append(f"{name:32} {key:26} {m['value']:14,.3f} "
+                         f"{m['unit']}")
+    return "\n".join(lines)
+
+
+def compare(baseline: Dict[str, object], current: Dict[str, object],
+            threshold: float) -> Tuple[str, int]:
+    """Return a comparison table and the number of regressions.
+
+    A measure regresses when its median is worse than the baseline's
+    by more than ``threshold`` times its tolerance and lies more than 1.5
+    interquartile ranges of the baseline runs outside their middle half,
+    measured as ratios.
+    """
+    lines = [f"{'case':32} {'measure':26} {'baseline':>12} {'current':>12} "
+             f"{'change':>8}  status"]
+    regressions = 0
+    for name, measures in baseline["results"].items():
+        now = current["results"].get(name)
+        if now is None:
+            lines.append(f"{name:32} {'':26} {'':>12} {'':>12} {'':>8}  "
+                         "missing")
+            continue
+        for key, base in measures.items():
+            if key not in now:
+                continue
+            old, new = base["value"], now[key]["value"]
+            change = (new - old) / old if old else 0.0
+            lower = base["better"] == "lower"
+            worse = change if lower else -change
+            limit = threshold * base.get("tolerance", 1.0)
+            q1, q3 = quartiles(base.get("runs") or [old])
+            band = (q3 / q1) ** 1.5 if q1 > 0 else 1.0
+            above, below = new > q3 * band, new < q1 / band
+            if worse > limit and (above if lower else below):
+                status = "REGRESSION"
+                regressions += 1
+            elif worse < -limit and (below if lower else above):
+                status = "improved"
+            else:
+                status = "ok"
+            lines.append(f"{name:32} {key:26} {old:12,.3f} {new:12,.3f} "
+                         f"{change:+8.1%}  {status}")
+    old_machine = baseline.get("machine") or {}
+    new_machine = current.get("machine") or {}
+    differs = [f"{key} {old_machine.get(key)} -> {new_machine.get(key)}"
+               for key in sorted(set(old_machine) | set(new_machine))
+               if old_machine.get(key) != new_machine.get(key)]
+    if differs:
+        lines.append("note: baseline was recorded on a different machine "
+                     f"({'; '.join(differs)})")
+    return "\n".join(lines), regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Performance regression suite for the core hot paths")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List cases and scales")
+
+    def common(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--scale", choices=SCALES, default="small")
+        p.add_argument("--cases", nargs="+", choices=sorted(CASES),
+                       default=None, help="Cases to run (default: all)")
+        p.add_argument("--repeat", type=int, default=5,
+                       help="Runs per case; the median is kept")
+        p.add_argument("--baseline-repeat", type=int, default=15,
+                       help="Runs per case when recording a baseline")
+        p.add_argument("--data-dir", default=None,
+                       help="Directory for generated data, reused across "
+                            "runs (default: a temporary directory)")
+
+    run = sub.add_parser("run", help="Run the suite")
+    common(run)
+    run.add_argument("--out", default=None, help="Write results JSON here")
+    run.add_argument("--save-baseline", action="store_true",
+                     help="Store the results as the scale's baseline, "
+                          "from --baseline-repeat runs per case")
+
+    cmp = sub.add_parser("compare", help="Compare results with a baseline")
+    common(cmp)
+    cmp.add_argument("--baseline", default=None,
+                     help="Baseline JSON (default: the scale's baseline)")
+    cmp.add_argument("--current", default=None,
+                     help="Results JSON to compare (default: run the suite)")
+    cmp.add_argument("--threshold", type=float, default=0.2,
+                     help="Relative slowdown counted as a regression")
+
+    one = sub.add_parser("_case")
+    one.add_argument("name", choices=sorted(CASES))
+    one.add_argument("--scale", choices=SCALES, default="small")
+    one.add_argument("--data-dir", required=True)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name in CASES:
+            print(name)
+        for name, scale in SCALES.items():
+            print(f"scale {name}: {scale.rows:,d} rows, symbols "
+                  f"{', '.join(map(str, scale.symbols))}, "
+                  f"{scale.events:,d} events")
+        return
+    if args.command == "_case":
+        measures = run_case(args.name, args.scale, Path(args.data_dir))
+        print(json.dumps({k: asdict(m) for k, m in measures.items()}))
+        return
+
+    def run(repeat: int) -> Dict[str, object]:
+        names = args.cases or list(CASES)
+        if args.data_dir:
+            Path(args.data_dir).mkdir(parents=True, exist_ok=True)
+            return run_suite(args.scale, names, repeat, Path(args.data_dir))
+        with tempfile.TemporaryDirectory() as tmp:
+            return run_suite(args.scale, names, repeat, Path(tmp))
+
+    baseline = None
+    if args.command == "compare":
+        path = Path(args.baseline or BASELINES / f"{args.scale}.json")
+        if not path.exists():
+            if args.baseline:
+                parser.error(f"baseline {path} does not exist")
+            print(f"recording baseline {path} "
+                  f"({args.baseline_repeat} runs per case)", file=sys.stderr)
+            baseline = run(args.baseline_repeat)
+            BASELINES.mkdir(exist_ok=True)
+            path.write_text(json.dumps(baseline, indent=2) + "\n")
+            if not args.current:
+                print(format_results(baseline))
+                print("baseline recorded; run compare again to check a "
+                      "change against it", file=sys.stderr)
+                return
+        baseline = json.loads(path.read_text())
+        args.scale = baseline["scale"]
+        if args.current:
+            current = json.loads(Path(args.current).read_text())
+            report, regressions = compare(baseline, current, args.threshold)
+            print(report)
+            sys.exit(1 if regressions else 0)
+
+    current = run(args.baseline_repeat if getattr(args, "save_baseline", False)
+                  else args.repeat)
+    if baseline is not None:
+        report, regressions = compare(baseline, current, args.threshold)
+        print(report)
+        sys.exit(1 if regressions else 0)
+    print(format_results(current))
+    text = json.dumps(current, indent=2) + "\n"
+    if args.out:
+        Path(args.out).write_text(text)
+    if args.save_baseline:
+        BASELINES.mkdir(exist_ok=True)
+        (BASELINES / f"{args.scale}.json").write_text(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Cost and recovery time of the write-ahead logs.
+
+Logs ``N`` records through a :class:`PaperTrader` (market orders) and a
+:class:`PortfolioTracker` (snapshots) with ``wal_dir`` set, then reopens
+both from their logs.  Reports the logging cost per record against the same
+loop without a log and the time to recover, which should stay flat as ``N``
+grows because only the latest checkpoint and the tail after it are read.
+
+Usage::
+
+    python benchmarks/wal_recovery.py
+    python benchmarks/wal_recovery.py --records 100000 1000000 --every 50000
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics.portfolio_tracker import PortfolioTracker  # noqa: E402
+from trading.paper_trader import PaperTrader  # noqa: E402
+
+
+def trader_run(n: int, wal_dir, every: int) -> float:
+    trader = PaperTrader(1e12, wal_dir=wal_dir, checkpoint_every=every)
+    trader.update_price("BTCUSDT", 100.0)
+    began = time.perf_counter()
+    for _ in range(n):
+        trader.execute_order("BTCUSDT", "buy", 0.01)
+    elapsed = time.perf_counter() - began
+    trader.close()
+    return elapsed
+
+
+def tracker_run(n: int, wal_dir, every: int) -> float:
+    tracker = PortfolioTracker(retain=100_000, wal_dir=wal_dir,
+                               checkpoint_every=every)
+    began = time.perf_counter()
+    for i in range(n):
+        tracker.log_snapshot(1000.0, 0.0, i)
+    elapsed = time.perf_counter() - began
+    tracker.close()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure write-ahead logging cost and recovery time")
+    parser.add_argument("--records", type=int, nargs="+",
+                        default=[100_000, 300_000, 1_000_000])
+    parser.add_argument("--every", type=int, default=100_000,
+                        help="Records between checkpoints")
+    args = parser.parse_args()
+
+    print(f"{'case':9} {'records':>10} {'plain ns':>9} {'wal ns':>8} "
+          f"{'recover ms':>11}")
+    for name, run in (("trader", trader_run), ("tracker", tracker_run)):
+        for n in args.records:
+            plain = run(n, None, args.every)
+            with tempfile.TemporaryDirectory() as tmp:
+                logged = run(n, tmp, args.every)
+                began = time.perf_counter()
+                if name == "trader":
+                    PaperTrader(wal_dir=tmp).close()
+                else:
+                    PortfolioTracker(retain=100_000, wal_dir=tmp).close()
+                recover = time.perf_counter() - began
+            print(f"{name:9} {n:10,d} {plain / n * 1e9:9.0f} "
+                  f"{logged / n * 1e9:8.0f} {recover * 1e3:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
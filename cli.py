@@ -15,6 +15,15 @@ def parse_args():
         action="store_true",
         help="Run in paper trading mode instead of live trading",
     )
+    parser.add_argument(
+        "--metrics",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="PATH",
+        help="Record hot-path timings and write them to PATH "
+        "(.json or text; default: stderr) at exit",
+    )
     action_group = parser.add_mutually_exclusive_group(required=True)
     action_group.add_argument(
         "--train",
@@ -32,6 +41,10 @@ def parse_args():
 
 def main():
     parser, args = parse_args()
+    if args.metrics:
+        from analytics import metrics
+
+        metrics.enable(args.metrics)
 
     if args.train:
         if not args.symbol:
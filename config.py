@@ -1,10 +1,28 @@
-"""Configuration loader for environment variables."""
+"""Configuration loader for environment variables.
+
+The ``.env`` file is read the first time a setting is accessed rather than
+at import time, so importing this module costs nothing for code paths that
+never need credentials.
+"""
 import os
-from dotenv import load_dotenv
 
-# Load environment variables from a .env file if present
-load_dotenv()
+_SETTINGS = ("BINANCE_API_KEY", "BINANCE_API_SECRET")
+_loaded = False
+
+
+def load() -> None:
+    """Load environment variables from a ``.env`` file if present."""
+    global _loaded
+    if not _loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _loaded = True
+
 
-# Expose API keys
-BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
-BINANCE_API_SECRET = os.getenv("BINANCE_API_SECRET")
+def __getattr__(name: str):
+    # Expose API keys as module attributes, e.g. ``config.BINANCE_API_KEY``.
+    if name in _SETTINGS:
+        load()
+        return os.getenv(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
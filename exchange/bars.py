@@ -0,0 +1,408 @@
+"""Streaming aggregation of ticks into OHLCV bars of several intervals.
+
+:class:`BarAggregator` turns the ticks of a fixed symbol universe (e.g. from
+:class:`~exchange.streams.TickDecoder` or the trading pipeline's sources)
+into open/high/low/close, volume, VWAP and trade-count bars of several
+intervals at once, such as ``("1s", "1m", "5m", "1h")``:
+
+* Only bars of the smallest interval are updated per tick, in place in a
+  small per-symbol ring of preallocated slots.  Longer intervals are rolled
+  up from those bars as they close, so a tick costs the same however many
+  intervals are built.
+* Bars close by event time.  Every symbol has a watermark, the latest tick
+  time seen (or a clock passed to :meth:`BarAggregator.advance`).  A bar
+  closes once the watermark passes its end by ``lateness``.  Until then
+  out-of-order ticks still count, with open and close taken by timestamp
+  rather than arrival.  Ticks for a bar that is already closed are late:
+  they are counted and dropped.
+* Closed bars go into fixed-size per-symbol ring buffers
+  (:meth:`BarAggregator.history`) and to subscribers as :class:`Bar`
+  tuples.  Apart from those closed bars, a tick allocates nothing.
+
+:meth:`BarAggregator.update` takes one tick; :meth:`BarAggregator.update_array`
+takes arrays of ticks and aggregates them with NumPy first.  Both give the
+same bars, with volumes equal up to summation rounding.  Only the order in
+which bars of different symbols are emitted within a batch differs.
+Intervals without ticks produce no bar.
+
+Example
+-------
+>>> bars = BarAggregator(["BTCUSDT", "ETHUSDT"], ("1s", "1m"))
+>>> bars.subscribe(print, "1m")
+>>> bars.update(0, 1_700_000_000_000_000_000, 37_000.0, 0.01)
+True
+>>> bars.history("BTCUSDT", "1s")["close"]
+"""
+from __future__ import annotations
+
+import re
+from operator import itemgetter
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+#: Nanoseconds per interval unit.
+UNIT_NS = {"s": 1_000_000_000, "m": 60_000_000_000, "h": 3_600_000_000_000,
+           "d": 86_400_000_000_000, "w": 604_800_000_000_000}
+_INTERVAL = re.compile(r"(\d+)([smhdw])")
+
+#: Record layout of the closed-bar ring buffers.
+BAR_DTYPE = np.dtype([("start", "<i8"), ("open", "<f8"), ("high", "<f8"),
+                      ("low", "<f8"), ("close", "<f8"), ("volume", "<f8"),
+                      ("vwap", "<f8"), ("trades", "<i8")])
+
+_NEVER = -(1 << 62)
+_INF = 1 << 62
+
+# An open bar is a list [bar number (-1 when the slot is free), open, high,
+# low, close, volume, quote volume, trades, first tick ts, last tick ts],
+# indexed by position in the hot paths.
+
+
+class Bar(NamedTuple):
+    """A closed bar; ``start`` is its open time in epoch ns."""
+
+    symbol: str
+    interval: str
+    start: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    vwap: float
+    trades: int
+
+
+def interval_ns(interval: str) -> int:
+    """Return the length of an interval such as ``"5m"`` in nanoseconds."""
+    match = _INTERVAL.fullmatch(interval)
+    if match is None or int(match.group(1)) < 1:
+        raise ValueError(f"invalid interval: {interval!r}")
+    return int(match.group(1)) * UNIT_NS[match.group(2)]
+
+
+class BarAggregator:
+    """Multi-interval OHLCV bars of a fixed symbol universe.
+
+    Parameters
+    ----------
+    symbols: Sequence[str]
+        Symbols; ticks refer to them by position.
+    intervals: Sequence[str]
+        Bar intervals, each a multiple of the shortest.
+    lateness: float
+        Seconds a bar stays open after its end for out-of-order ticks.
+    history: int
+        Closed bars kept per symbol and interval.
+    """
+
+    def __init__(self, symbols: Sequence[str],
+                 intervals: Sequence[str] = ("1s", "1m", "5m", "1h"),
+                 lateness: float = 0.0, history: int = 1024):
+        if not intervals:
+            raise ValueError("at least one interval is required")
+        if lateness < 0:
+            raise ValueError("lateness must not be negative")
+        self.symbols = list(symbols)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        steps = sorted((interval_ns(i), i) for i in intervals)
+        base = steps[0][0]
+        for step, name in steps:
+            if step % base:
+                raise ValueError(f"{name} is not a multiple of "
+                                 f"{steps[0][1]}")
+        #: Interval names, shortest first, and their lengths in ns.
+        self.intervals: Dict[str, int] = {name: step for step, name in steps}
+        self._names = [name for _, name in steps]
+        self._steps = [step for step, _ in steps]
+        self.lateness = int(round(lateness * 1e9))
+        self._slots = [self.lateness // step + 2 for step in self._steps]
+        n = len(self.symbols)
+        self._open = [[[[-1] + [0.0] * 9 for _ in range(slots)]
+                       for _ in range(n)] for slots in self._slots]
+        self._watermark = [_NEVER] * n
+        # Earliest close time of an open bar per interval and symbol, and
+        # over all intervals per symbol.
+        self._due = [[_INF] * n for _ in self._steps]
+        self._next_close = [_INF] * n
+        self.history_size = history
+        self._history = [np.zeros((n, history), dtype=BAR_DTYPE)
+                         for _ in self._steps]
+        self._closed = [[0] * n for _ in self._steps]
+        self._subscribers: List[List[Callable[[Bar], None]]] = [
+            [] for _ in self._steps]
+        #: Ticks aggregated and late ticks dropped.
+        self.ticks = 0
+        self.late = 0
+
+    # ------------------------------------------------------------ subscribers
+    def subscribe(self, callback: Callable[[Bar], None],
+                  interval: Optional[str] = None) -> None:
+        """Call ``callback`` with every closed bar (of ``interval``)."""
+        for k, name in enumerate(self._names):
+            if interval is None or name == interval:
+                self._subscribers[k].append(callback)
+        if interval is not None and interval not in self.intervals:
+            raise ValueError(f"unknown interval: {interval!r}")
+
+    def unsubscribe(self, callback: Callable[[Bar], None]) -> None:
+        for subscribers in self._subscribers:
+            while callback in subscribers:
+                subscribers.remove(callback)
+
+    # ------------------------------------------------------------------ ticks
+    def update(self, symbol: int, ts: int, price: float,
+               qty: float = 0.0) -> bool:
+        """Add a tick of symbol number ``symbol`` at ``ts`` (epoch ns).
+
+        Returns ``False`` if the tick was late and dropped.
+        """
+        w = self._watermark[symbol]
+        step = self._steps[0]
+        b = ts // step
+        if ts > w:
+            self._watermark[symbol] = ts
+            if ts >= self._next_close[symbol]:
+                self._advance(symbol, ts)
+        elif (b + 1) * step + self.lateness <= w:
+            self.late += 1
+            return False
+        bar = self._open[0][symbol][b % self._slots[0]]
+        if bar[0] == b:
+            if price > bar[2]:
+                bar[2] = price
+            elif price < bar[3]:
+                bar[3] = price
+            if ts < bar[8]:
+                bar[1] = price
+                bar[8] = ts
+            if ts >= bar[9]:
+                bar[4] = price
+                bar[9] = ts
+            bar[5] += qty
+            bar[6] += price * qty
+            bar[7] += 1
+        else:
+            bar[0] = b
+            bar[1] = bar[2] = bar[3] = bar[4] = price
+            bar[5] = qty
+            bar[6] = price * qty
+            bar[7] = 1
+            bar[8] = bar[9] = ts
+            close_at = (b + 1) * step + self.lateness
+            if close_at < self._due[0][symbol]:
+                self._due[0][symbol] = close_at
+                if close_at < self._next_close[symbol]:
+                    self._next_close[symbol] = close_at
+        self.ticks += 1
+        return True
+
+    def update_array(self, symbols: np.ndarray, ts: np.ndarray,
+                     prices: np.ndarray,
+                     quantities: Optional[np.ndarray] = None) -> int:
+        """Add ticks given as equally long arrays, in arrival order.
+
+        Ticks are grouped by symbol and bar with NumPy and each group is
+        merged at once, giving the same bars as :meth:`update` per tick.
+        Returns the number of late ticks dropped.
+        """
+        sym = np.asarray(symbols, dtype=np.int64)
+        ts = np.asarray(ts, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        qty = (np.zeros(len(ts)) if quantities is None
+               else np.asarray(quantities, dtype=np.float64))
+        if not len(ts):
+            return 0
+        step = self._steps[0]
+        order = np.argsort(sym, kind="stable")
+        sym, ts, prices, qty = sym[order], ts[order], prices[order], qty[order]
+        first = np.ones(len(ts), dtype=bool)
+        first[1:] = sym[1:] != sym[:-1]
+
+        # Watermark before each tick: the symbol's watermark so far and the
+        # running maximum of its earlier ticks in this batch.
+        before = np.asarray(self._watermark, dtype=np.int64)[sym]
+        running = _segmented_cummax(ts, first)
+        before[~first] = np.maximum(before[~first], running[:-1][~first[1:]])
+        bars = ts // step
+        late = (bars + 1) * step + self.lateness <= before
+        n_late = int(late.sum())
+        if n_late:
+            keep = ~late
+            sym, ts, prices, qty, bars = (sym[keep], ts[keep], prices[keep],
+                                          qty[keep], bars[keep])
+            if not len(ts):
+                self.late += n_late
+                return n_late
+
+        # One group per symbol and bar, ticks in time (then arrival) order.
+        order = np.lexsort((ts, bars, sym))
+        sym, ts, prices, qty, bars = (sym[order], ts[order], prices[order],
+                                      qty[order], bars[order])
+        start = np.ones(len(ts), dtype=bool)
+        start[1:] = (sym[1:] != sym[:-1]) | (bars[1:] != bars[:-1])
+        head = np.flatnonzero(start)
+        tail = np.append(head[1:], len(ts)) - 1
+        groups = zip(sym[head].tolist(), bars[head].tolist(),
+                     prices[head].tolist(),
+                     np.maximum.reduceat(prices, head).tolist(),
+                     np.minimum.reduceat(prices, head).tolist(),
+                     prices[tail].tolist(),
+                     np.add.reduceat(qty, head).tolist(),
+                     np.add.reduceat(prices * qty, head).tolist(),
+                     np.diff(np.append(head, len(ts))).tolist(),
+                     ts[head].tolist(), ts[tail].tolist())
+        watermark, next_close = self._watermark, self._next_close
+        for s, b, o, h, low, c, v, q, n, t0, t1 in groups:
+            if t1 > watermark[s]:
+                watermark[s] = t1
+                if t1 >= next_close[s]:
+                    self._advance(s, t1)
+            self._merge(0, s, b, o, h, low, c, v, q, n, t0, t1)
+        self.ticks += len(ts)
+        self.late += n_late
+        return n_late
+
+    def advance(self, ts: int) -> None:
+        """Move every symbol's watermark to at least ``ts`` (epoch ns).
+
+        Closes the bars that are due by the clock even for symbols without
+        recent ticks; later ticks before ``ts - lateness`` become late.
+        """
+        for s, w in enumerate(self._watermark):
+            if ts > w:
+                self._watermark[s] = ts
+                if ts >= self._next_close[s]:
+                    self._advance(s, ts)
+
+    # ------------------------------------------------------------------ bars
+    def _merge(self, k: int, s: int, b: int, o: float, h: float,
+               low: float, c: float, v: float, q: float, n: int, t0: int,
+               t1: int) -> None:
+        """Merge a partial bar into open bar ``b`` of interval ``k``."""
+        bar = self._open[k][s][b % self._slots[k]]
+        if bar[0] == b:
+            if h > bar[2]:
+                bar[2] = h
+            if low < bar[3]:
+                bar[3] = low
+            if t0 < bar[8]:
+                bar[1] = o
+                bar[8] = t0
+            if t1 >= bar[9]:
+                bar[4] = c
+                bar[9] = t1
+            bar[5] += v
+            bar[6] += q
+            bar[7] += n
+            return
+        if bar[0] >= 0:
+            # An older bar in this slot is due; it has all its parts since
+            # parts arrive in time order.
+            self._close(k, s, bar)
+        bar[:] = b, o, h, low, c, v, q, n, t0, t1
+        close_at = (b + 1) * self._steps[k] + self.lateness
+        if close_at < self._due[k][s]:
+            self._due[k][s] = close_at
+            if close_at < self._next_close[s]:
+                self._next_close[s] = close_at
+
+    def _advance(self, s: int, w: int) -> None:
+        """Close the bars of symbol ``s`` due at watermark ``w``."""
+        lateness = self.lateness
+        next_close = _INF
+        for k, step in enumerate(self._steps):
+            due_at = self._due[k]
+            if due_at[s] <= w:
+                ring = self._open[k][s]
+                due = [bar for bar in ring
+                       if bar[0] >= 0 and (bar[0] + 1) * step + lateness <= w]
+                due.sort(key=itemgetter(0))
+                for bar in due:
+                    self._close(k, s, bar)
+                first = _INF
+                for bar in ring:
+                    if bar[0] >= 0:
+                        close_at = (bar[0] + 1) * step + lateness
+                        if close_at < first:
+                            first = close_at
+                due_at[s] = first
+            if due_at[s] < next_close:
+                next_close = due_at[s]
+        self._next_close[s] = next_close
+
+    def _close(self, k: int, s: int, bar: list) -> None:
+        b, o, h, low, c, v, q, n, t0, t1 = bar
+        bar[0] = -1
+        start = b * self._steps[k]
+        vwap = q / v if v > 0.0 else c
+        i = self._closed[k][s]
+        self._history[k][s, i % self.history_size] = (start, o, h, low, c,
+                                                      v, vwap, n)
+        self._closed[k][s] = i + 1
+        if k == 0:
+            for j in range(1, len(self._steps)):
+                self._merge(j, s, start // self._steps[j], o, h, low, c, v,
+                            q, n, t0, t1)
+        subscribers = self._subscribers[k]
+        if subscribers:
+            closed = Bar(self.symbols[s], self._names[k], start, o, h, low,
+                         c, v, vwap, n)
+            for callback in subscribers:
+                callback(closed)
+
+    # ------------------------------------------------------------------ query
+    def history(self, symbol: Union[int, str], interval: str,
+                count: Optional[int] = None) -> np.ndarray:
+        """Return up to ``count`` last closed bars, oldest first.
+
+        The result is a copy with :data:`BAR_DTYPE` records.
+        """
+        s = self.index[symbol] if isinstance(symbol, str) else symbol
+        k = self._names.index(interval)
+        closed = self._closed[k][s]
+        size = min(closed, self.history_size)
+        if count is not None:
+            size = min(size, count)
+        slots = np.arange(closed - size, closed) % self.history_size
+        return self._history[k][s, slots]
+
+    def open_bar(self, symbol: Union[int, str],
+                 interval: str) -> Optional[Bar]:
+        """Return the latest bar of ``interval`` that has not closed yet.
+
+        Bars of longer intervals only include closed bars of the shortest.
+        """
+        s = self.index[symbol] if isinstance(symbol, str) else symbol
+        k = self._names.index(interval)
+        bars = [bar for bar in self._open[k][s] if bar[0] >= 0]
+        if not bars:
+            return None
+        b, o, h, low, c, v, q, n, _, _ = max(bars, key=itemgetter(0))
+        return Bar(self.symbols[s], interval, b * self._steps[k], o, h, low,
+                   c, v, q / v if v > 0.0 else c, n)
+
+    def stats(self) -> Dict[str, int]:
+        """Tick, late tick and closed bar counts."""
+        out = {"ticks": self.ticks, "late": self.late}
+        for name, closed in zip(self._names, self._closed):
+            out[f"bars_{name}"] = sum(closed)
+        return out
+
+
+def _segmented_cummax(values: np.ndarray, first: np.ndarray) -> np.ndarray:
+    """Running maximum of ``values`` restarting where ``first`` is set."""
+    segment = np.cumsum(first) - 1
+    low = values.min()
+    span = int(values.max()) - int(low) + 1
+    if span * (int(segment[-1]) + 1) < 1 << 62:
+        # Offsetting each segment above the previous one lets a single
+        # running maximum never carry over a segment boundary.
+        shifted = (values - low) + segment * span
+        return np.maximum.accumulate(shifted) - segment * span + low
+    out = np.empty_like(values)
+    bounds = np.append(np.flatnonzero(first), len(values))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        out[lo:hi] = np.maximum.accumulate(values[lo:hi])
+    return out
@@ -1,15 +1,99 @@
-"""Binance client wrapper for REST and WebSocket interactions."""
-from typing import Callable, Dict, Any, Optional
+"""Binance client wrapper for REST and WebSocket interactions.
 
-try:
-    from binance.client import Client
+REST calls of the :mod:`python-binance` ``Client`` go through an
+:class:`~exchange.rest.RestScheduler`: the client still builds and signs the
+requests, the scheduler keeps them within the account's request weight
+limit, sends orders ahead of bulk downloads and reuses connections.
+:mod:`python-binance`, the exchange info cache (NumPy) and the kline
+downloader (pandas) are imported when a client is created or a download
+starts, not when this module is imported.
+"""
+from __future__ import annotations
+
+import time
+import urllib.parse
+from typing import (TYPE_CHECKING, Callable, Dict, Any, Optional, Sequence,
+                    Union)
+
+from .rest import BASE_URL, TESTNET_URL, WEIGHT_LIMIT
+
+if TYPE_CHECKING:
+    import numpy as np
     from binance.streams import ThreadedWebsocketManager
-except Exception as exc:  # pragma: no cover - external dependency
-    raise ImportError("python-binance is required to use BinanceClient") from exc
+
+    from rl.data_store import MarketDataStore, TimeLike
+
+    from .exchange_info import CheckedOrders
+    from .klines import DownloadResult
+    from .rest import Params, RestScheduler
+    from .streams import MarketStream, TickRecord
+
+
+def _binance():
+    try:
+        from binance.client import Client
+        from binance.streams import ThreadedWebsocketManager
+    except Exception as exc:  # pragma: no cover - external dependency
+        raise ImportError(
+            "python-binance is required to use BinanceClient") from exc
+    return Client, ThreadedWebsocketManager
+
+
+_scheduled_client = None
+
+
+def _scheduled_client_class():
+    """Return ``binance.client.Client`` with its requests sent through a
+    :class:`~exchange.rest.RestScheduler`.
+
+    ``Client._request`` is the single call behind all of its endpoints
+    (``_get``, ``_post``, ``_delete`` and the helpers built on them, including
+    the ping made on construction).  The subclass turns it into a scheduler
+    request of the same path and parameters, weighted and prioritized by
+    :func:`~exchange.rest.endpoint_cost`, and signs it with the client's own
+    signature code when the scheduler sends it.
+    """
+    global _scheduled_client
+    if _scheduled_client is not None:
+        return _scheduled_client
+    from .rest import endpoint_cost
+
+    Client, _ = _binance()
+
+    class ScheduledClient(Client):
+        def __init__(self, scheduler: "RestScheduler", *args: Any,
+                     **kwargs: Any) -> None:
+            self.scheduler = scheduler
+            scheduler.signer = self._sign
+            super().__init__(*args, **kwargs)
+
+        def _sign(self, params: "Params") -> str:
+            data = dict(params)
+            data["timestamp"] = int(time.time() * 1000
+                                    + getattr(self, "timestamp_offset", 0))
+            data["signature"] = self._generate_signature(data)
+            return "&".join(f"{k}={v}" for k, v in self._order_params(data))
+
+        def _request(self, method: str, uri: str, signed: bool,
+                     force_params: bool = False, **kwargs: Any) -> Any:
+            data = dict(kwargs.get("data") or {})
+            data.pop("requests_params", None)
+            params = {k: v for k, v in data.items() if v is not None}
+            path = urllib.parse.urlsplit(uri).path
+            weight, priority = endpoint_cost(method, path)
+            return self.scheduler.request(method, path, params, weight,
+                                          priority, signed)
+
+    _scheduled_client = ScheduledClient
+    return ScheduledClient
 
 
 class BinanceClient:
-    """Simple wrapper around :mod:`python-binance` client.
+    """Binance REST and websocket client.
+
+    :attr:`client` is a ``binance.client.Client`` whose requests are sent by
+    the request scheduler :attr:`rest`, which raises
+    :class:`~exchange.rest.RestError` for error responses.
 
     Parameters
     ----------
@@ -19,6 +103,20 @@ class BinanceClient:
         API secret for authenticated endpoints.
     testnet: bool, default False
         Whether to use Binance testnet endpoints.
+    exchange_info_path: str, optional
+        File caching the trading rules of all symbols between runs.
+    exchange_info_ttl: float, default 3600
+        Seconds after which the cached trading rules are refreshed in the
+        background.
+    base_url: str, optional
+        REST endpoint root; defaults to the (testnet) Binance API.
+    weight_limit: int, default 6000
+        Request weight per minute the scheduler keeps within.
+    rest_workers: int, default 8
+        REST requests in flight at most.
+    stream_url: str, optional
+        Combined stream endpoint of :meth:`market_stream`; defaults to the
+        (testnet) Binance stream.
     """
 
     def __init__(
@@ -26,8 +124,35 @@ class BinanceClient:
         api_key: Optional[str] = None,
         api_secret: Optional[str] = None,
         testnet: bool = False,
+        exchange_info_path: Optional[str] = None,
+        exchange_info_ttl: float = 3600.0,
+        base_url: Optional[str] = None,
+        weight_limit: int = WEIGHT_LIMIT,
+        rest_workers: int = 8,
+        stream_url: Optional[str] = None,
     ) -> None:
-        self.client = Client(api_key, api_secret, testnet=testnet)
+        from .exchange_info import ExchangeInfoCache
+        from .rest import RestScheduler
+
+        if base_url is None:
+            base_url = TESTNET_URL if testnet else BASE_URL
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url
+        self.stream_url = stream_url
+        self.rest = RestScheduler(base_url, api_key, api_secret,
+                                  weight_limit=weight_limit,
+                                  workers=rest_workers)
+        try:
+            self.client = _scheduled_client_class()(
+                self.rest, api_key, api_secret, testnet=testnet)
+        except BaseException:
+            self.rest.close()
+            raise
+        self.testnet = testnet
+        self.exchange_info = ExchangeInfoCache(
+            lambda: self.client.get_exchange_info(), ttl=exchange_info_ttl,
+            path=exchange_info_path)
         self._ws_manager: Optional[ThreadedWebsocketManager] = None
 
     # ------------------------------------------------------------------
@@ -36,6 +161,9 @@ class BinanceClient:
     def get_price_rules(self, symbol: str) -> Dict[str, Any]:
         """Return trading rules for a symbol.
 
+        Rules come from :attr:`exchange_info`, which downloads them for all
+        symbols at once and refreshes them when they are older than the TTL.
+
         Parameters
         ----------
         symbol: str
@@ -46,31 +174,127 @@ class BinanceClient:
         dict
             Dictionary with tick size, minimum quantity and related fields.
         """
-        info = self.client.get_symbol_info(symbol)
-        if info is None:
-            raise ValueError(f"Symbol {symbol!r} not found")
-
-        filters = {f["filterType"]: f for f in info.get("filters", [])}
-        price_filter = filters.get("PRICE_FILTER", {})
-        lot_size = filters.get("LOT_SIZE", {})
-        min_notional = filters.get("MIN_NOTIONAL", {})
-
-        return {
-            "tick_size": float(price_filter.get("tickSize", 0)),
-            "min_price": float(price_filter.get("minPrice", 0)),
-            "max_price": float(price_filter.get("maxPrice", 0)),
-            "min_qty": float(lot_size.get("minQty", 0)),
-            "max_qty": float(lot_size.get("maxQty", 0)),
-            "step_size": float(lot_size.get("stepSize", 0)),
-            "min_notional": float(min_notional.get("minNotional", 0)),
-        }
+        return self.exchange_info.rules(symbol)
+
+    @property
+    def order_errors(self) -> tuple:
+        """Exception types raised by the REST client for rejected orders."""
+        from binance.exceptions import (BinanceAPIException,
+                                        BinanceOrderException)
+
+        from .rest import RestError
+
+        return (RestError, BinanceAPIException, BinanceOrderException)
+
+    def quantize_orders(
+        self,
+        symbols: Union[str, Sequence[str]],
+        prices: Union[Sequence[float], "np.ndarray"],
+        quantities: Union[Sequence[float], "np.ndarray"],
+    ) -> CheckedOrders:
+        """Round candidate orders to the exchange filters and validate them.
+
+        Parameters
+        ----------
+        symbols: str or sequence of str
+            One symbol for all orders or one symbol per order.
+        prices, quantities: array-like
+            Order prices (expected fill prices for market orders) and
+            quantities.
+
+        Returns
+        -------
+        CheckedOrders
+            See :func:`exchange.exchange_info.check_orders`.
+        """
+        from .exchange_info import check_orders
+
+        return check_orders(self.exchange_info.rules_array(symbols), prices,
+                            quantities)
+
+    def download_klines(
+        self,
+        symbol: str,
+        interval: str,
+        start: TimeLike,
+        end: TimeLike,
+        store: Union[MarketDataStore, str],
+        concurrency: int = 8,
+        base_url: Optional[str] = None,
+    ) -> DownloadResult:
+        """Download historical klines into a columnar data store.
+
+        The range is split into pages that are fetched concurrently, with at
+        most ``concurrency`` requests in flight.  Downloads resume after the
+        last candle already in ``store`` and missing candles are re-requested.
+        See :class:`exchange.klines.KlineDownloader`.
+
+        Parameters
+        ----------
+        symbol: str
+            Market symbol, e.g. ``"BTCUSDT"``.
+        interval: str
+            Kline interval such as ``"1m"`` or ``"1h"``.
+        start, end:
+            Time range ``[start, end)`` of candle open times.  ``end=None``
+            downloads up to the last closed candle.
+        store: MarketDataStore or str
+            Target store or its directory.
+        concurrency: int
+            Maximum number of page requests in flight.
+        base_url: str, optional
+            REST endpoint root.  By default pages are requested through
+            :attr:`rest` at bulk priority, so downloads share its weight
+            budget and never hold up orders.
+        """
+        from .klines import KlineDownloader
+
+        if base_url is None:
+            downloader = KlineDownloader(self.base_url,
+                                         concurrency=concurrency,
+                                         scheduler=self.rest)
+        else:
+            downloader = KlineDownloader(base_url, concurrency=concurrency)
+        return downloader.download(symbol, interval, start, end, store)
 
     # ------------------------------------------------------------------
     # WebSocket methods
     # ------------------------------------------------------------------
+    def market_stream(self, symbols: Sequence[str],
+                      on_tick: Callable[["TickRecord"], None],
+                      batch_size: Optional[int] = None) -> MarketStream:
+        """Return a ticker stream of many symbols over combined streams.
+
+        The :class:`~exchange.streams.MarketStream` shares one websocket
+        per ``batch_size`` symbols, reconnects dropped connections and
+        decodes every message into a :class:`~exchange.streams.TickRecord`
+        whose ``symbol`` indexes ``symbols``.  Run it with ``await
+        stream.run()`` and cancel that task to stop it.
+
+        Parameters
+        ----------
+        symbols: sequence of str
+            Market symbols, e.g. ``["BTCUSDT", "ETHUSDT"]``.
+        on_tick: Callable[[TickRecord], None]
+            Called with every tick, on the event loop running the stream.
+        batch_size: int, optional
+            Symbols per connection, see :data:`exchange.streams.BATCH_SIZE`.
+        """
+        from .streams import (BATCH_SIZE, STREAM_URL, TESTNET_STREAM_URL,
+                              MarketStream)
+
+        url = self.stream_url
+        if url is None:
+            url = TESTNET_STREAM_URL if self.testnet else STREAM_URL
+        return MarketStream(symbols, on_tick, url=url,
+                            batch_size=batch_size or BATCH_SIZE)
+
     def stream_live_prices(self, symbol: str, callback: Callable[[Dict[str, Any]], None]) -> None:
         """Stream live ticker prices for ``symbol``.
 
+        Opens one socket per symbol on python-binance's manager thread;
+        :meth:`market_stream` watches many symbols over a few connections.
+
         Parameters
         ----------
         symbol: str
@@ -79,7 +303,10 @@ class BinanceClient:
             Function invoked with raw message dictionaries from Binance.
         """
         if self._ws_manager is None:
-            self._ws_manager = ThreadedWebsocketManager(client=self.client)
+            _, ThreadedWebsocketManager = _binance()
+            self._ws_manager = ThreadedWebsocketManager(
+                api_key=self.api_key, api_secret=self.api_secret,
+                testnet=self.testnet)
             self._ws_manager.start()
 
         def _handle(msg: Dict[str, Any]) -> None:
@@ -92,3 +319,8 @@ class BinanceClient:
         if self._ws_manager is not None:
             self._ws_manager.stop()
             self._ws_manager = None
+
+    def close(self) -> None:
+        """Stop streams and the REST scheduler."""
+        self.stop_stream()
+        self.rest.close()
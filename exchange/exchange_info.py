@@ -0,0 +1,313 @@
+"""Cached exchange metadata and vectorized order quantization.
+
+Binance's ``/api/v3/exchangeInfo`` describes the trading rules of every
+symbol (tick size, lot size, minimum notional).  :class:`ExchangeInfoCache`
+downloads it for all symbols in one bulk request, keeps the parsed rules in
+memory and optionally on disk, and refreshes them in a background thread once
+they are older than ``ttl`` while readers keep using the previous rules.  A
+process with a warm cache file therefore never waits for exchange info before
+its first order.
+
+The rules of all symbols are also kept as a structured array of
+:data:`RULE_DTYPE`, so :func:`quantize_prices`, :func:`quantize_quantities`
+and :func:`check_orders` can validate whole arrays of candidate orders, for
+one symbol or many, without a Python loop.
+
+Example
+-------
+>>> cache = ExchangeInfoCache(client.get_exchange_info, path="exchange_info.json")
+>>> rules = cache.rules_array(["BTCUSDT", "ETHUSDT"])
+>>> orders = check_orders(rules, [27000.123, 1800.5], [0.00123456, 0.5])
+>>> orders.ok
+array([ True,  True])
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import (Any, Callable, Dict, List, NamedTuple, Optional,
+                    Sequence, Tuple, Union)
+
+import numpy as np
+
+#: Structured layout of one symbol's trading rules.
+RULE_DTYPE = np.dtype([("tick_size", "<f8"), ("min_price", "<f8"),
+                       ("max_price", "<f8"), ("min_qty", "<f8"),
+                       ("max_qty", "<f8"), ("step_size", "<f8"),
+                       ("min_notional", "<f8")])
+
+# Reasons reported by :func:`check_orders`.
+OK = 0
+MIN_QTY = 1
+MAX_QTY = 2
+MIN_NOTIONAL = 3
+PRICE_RANGE = 4
+REASONS = ("ok", "min_qty", "max_qty", "min_notional", "price_range")
+
+#: Exchange rules have at most 8 decimals; rounding results to 10 removes
+#: the binary noise of ``n * step`` without touching valid digits.
+_DECIMALS = 10
+
+ArrayLike = Union[Sequence[float], np.ndarray]
+
+
+def parse_rules(info: Dict[str, Any]) -> Dict[str, float]:
+    """Return the trading rules in a symbol's exchange info entry."""
+    filters = {f["filterType"]: f for f in info.get("filters", [])}
+    price_filter = filters.get("PRICE_FILTER", {})
+    lot_size = filters.get("LOT_SIZE", {})
+    # Spot symbols moved from MIN_NOTIONAL to NOTIONAL; accept either.
+    min_notional = filters.get("MIN_NOTIONAL") or filters.get("NOTIONAL", {})
+
+    return {
+        "tick_size": float(price_filter.get("tickSize", 0)),
+        "min_price": float(price_filter.get("minPrice", 0)),
+        "max_price": float(price_filter.get("maxPrice", 0)),
+        "min_qty": float(lot_size.get("minQty", 0)),
+        "max_qty": float(lot_size.get("maxQty", 0)),
+        "step_size": float(lot_size.get("stepSize", 0)),
+        "min_notional": float(min_notional.get("minNotional", 0)),
+    }
+
+
+class ExchangeInfoCache:
+    """Trading rules of all symbols with TTL refresh and disk persistence.
+
+    Parameters
+    ----------
+    fetch: Callable[[], dict]
+        Returns the full exchange info response, e.g.
+        ``binance.client.Client.get_exchange_info``.
+    ttl: float
+        Age in seconds after which the rules are refreshed.  Stale rules are
+        still served while the refresh runs in a background thread.
+    path: str, optional
+        JSON file to load the rules from on first use and to save them to
+        after every refresh.
+    missing_refresh: float
+        Minimum age in seconds before a lookup of an unknown symbol (e.g. a
+        new listing) triggers a synchronous refresh.
+    """
+
+    def __init__(self, fetch: Callable[[], Dict[str, Any]],
+                 ttl: float = 3600.0, path: Optional[str] = None,
+                 missing_refresh: float = 60.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.path = path
+        self.missing_refresh = missing_refresh
+        self.fetched_at = 0.0
+        self.fetches = 0
+        # (rules by symbol, row by symbol, RULE_DTYPE array), replaced as a
+        # whole so readers need no lock.
+        self._state: Tuple[Dict[str, Dict[str, float]], Dict[str, int],
+                           np.ndarray] = ({}, {}, np.zeros(0, RULE_DTYPE))
+        self._lock = threading.Lock()
+        self._refreshing: Optional[threading.Thread] = None
+        self._loaded = False
+
+    # ------------------------------------------------------------------ state
+    def _install(self, rules: Dict[str, Dict[str, float]],
+                 fetched_at: float) -> None:
+        array = np.array([tuple(r[name] for name in RULE_DTYPE.names)
+                          for r in rules.values()], dtype=RULE_DTYPE)
+        index = {symbol: i for i, symbol in enumerate(rules)}
+        self._state = (rules, index, array)
+        self.fetched_at = fetched_at
+
+    def _load(self) -> None:
+        self._loaded = True
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as fh:
+                data = json.load(fh)
+            self._install(data["symbols"], float(data["fetched_at"]))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # a corrupt cache file only costs a download
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump({"fetched_at": self.fetched_at,
+                       "symbols": self._state[0]}, fh)
+        os.replace(tmp, self.path)
+
+    @property
+    def age(self) -> float:
+        """Seconds since the rules were downloaded."""
+        return time.time() - self.fetched_at
+
+    def refresh(self) -> None:
+        """Download the rules of all symbols now."""
+        info = self.fetch()
+        rules = {s["symbol"]: parse_rules(s) for s in info.get("symbols", [])}
+        with self._lock:
+            self.fetches += 1
+            self._install(rules, time.time())
+            self._save()
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return
+
+            def run() -> None:
+                try:
+                    self.refresh()
+                except Exception:  # keep serving the stale rules
+                    pass
+
+            self._refreshing = threading.Thread(target=run, daemon=True)
+            self._refreshing.start()
+
+    def _ensure(self) -> None:
+        if not self._loaded:
+            self._load()
+        if not self._state[0]:
+            self.refresh()
+        elif self.age > self.ttl:
+            self._refresh_in_background()
+
+    def wait(self) -> None:
+        """Block until a running background refresh finishes."""
+        thread = self._refreshing
+        if thread is not None:
+            thread.join()
+
+    # ------------------------------------------------------------------ lookups
+    def _current(self, symbols: Sequence[str]):
+        """Return the state after making sure it knows ``symbols``."""
+        self._ensure()
+        state = self._state
+        missing = [s for s in symbols if s not in state[1]]
+        if missing and self.age > self.missing_refresh:
+            self.refresh()
+            state = self._state
+            missing = [s for s in symbols if s not in state[1]]
+        if missing:
+            raise ValueError(f"Symbol {missing[0]!r} not found")
+        return state
+
+    def rules(self, symbol: str) -> Dict[str, float]:
+        """Return the trading rules of ``symbol`` as a dictionary."""
+        return dict(self._current([symbol])[0][symbol])
+
+    def rules_array(self, symbols: Union[str, Sequence[str]]) -> np.ndarray:
+        """Return the rules of ``symbols`` as a :data:`RULE_DTYPE` array.
+
+        A single symbol gives a 0-d record that broadcasts over any number of
+        orders; a sequence gives one row per symbol, aligned with orders.
+        """
+        if isinstance(symbols, str):
+            _, index, array = self._current([symbols])
+            return array[index[symbols]]
+        _, index, array = self._current(symbols)
+        idx = np.fromiter((index[s] for s in symbols), dtype=np.intp,
+                          count=len(symbols))
+        return array[idx]
+
+    @property
+    def symbols(self) -> List[str]:
+        self._ensure()
+        return list(self._state[1])
+
+
+# ---------------------------------------------------------------------- quantization
+def _snap(units: np.ndarray, step: np.ndarray,
+          value: np.ndarray) -> np.ndarray:
+    # A step of 0 means the filter is disabled: keep the value.
+    with np.errstate(invalid="ignore"):
+        snapped = np.round(units * step, _DECIMALS)
+    return np.where(step > 0, snapped, value)
+
+
+def quantize_prices(prices: ArrayLike, tick_size: ArrayLike,
+                    mode: str = "nearest") -> np.ndarray:
+    """Round ``prices`` to multiples of ``tick_size``.
+
+    ``mode`` is ``"nearest"``, ``"down"`` (e.g. for buy limits that must not
+    pay more) or ``"up"``.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    tick = np.asarray(tick_size, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = prices / tick
+    if mode == "nearest":
+        units = np.round(ratio)
+    elif mode == "down":
+        units = np.floor(ratio + 1e-9)
+    elif mode == "up":
+        units = np.ceil(ratio - 1e-9)
+    else:
+        raise ValueError("mode must be 'nearest', 'down' or 'up'")
+    return _snap(units, tick, prices)
+
+
+def quantize_quantities(quantities: ArrayLike,
+                        step_size: ArrayLike) -> np.ndarray:
+    """Round ``quantities`` down to multiples of ``step_size``.
+
+    Rounding down never orders more than requested (or more than held).
+    """
+    quantities = np.asarray(quantities, dtype=np.float64)
+    step = np.asarray(step_size, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        units = np.floor(quantities / step + 1e-9)
+    return _snap(units, step, quantities)
+
+
+class CheckedOrders(NamedTuple):
+    """Result of :func:`check_orders`; all fields are aligned arrays."""
+
+    price: np.ndarray
+    quantity: np.ndarray
+    ok: np.ndarray
+    reason: np.ndarray
+
+    def reasons(self) -> List[str]:
+        """Return the reason of every order as a string."""
+        return [REASONS[r] for r in self.reason.ravel().tolist()]
+
+
+def check_orders(rules: np.ndarray, prices: ArrayLike, quantities: ArrayLike,
+                 price_mode: str = "nearest") -> CheckedOrders:
+    """Quantize candidate orders and check them against the symbol filters.
+
+    Parameters
+    ----------
+    rules: np.ndarray
+        :data:`RULE_DTYPE` rules, one record for all orders or one row per
+        order (see :meth:`ExchangeInfoCache.rules_array`).
+    prices, quantities: array-like
+        Candidate order prices (for market orders the expected fill price)
+        and quantities.
+    price_mode: str
+        Price rounding, see :func:`quantize_prices`.
+
+    Returns
+    -------
+    CheckedOrders
+        Quantized prices and quantities, a mask of orders passing every
+        filter and the first failed check per order (:data:`REASONS`).
+    """
+    price = quantize_prices(prices, rules["tick_size"], price_mode)
+    quantity = quantize_quantities(quantities, rules["step_size"])
+    price, quantity = np.broadcast_arrays(price, quantity)
+    max_qty = rules["max_qty"]
+    max_price = rules["max_price"]
+    reason = np.zeros(price.shape, dtype=np.int8)
+    # Assign in reverse priority so the first failed check wins.
+    reason[(price < rules["min_price"])
+           | ((max_price > 0) & (price > max_price))] = PRICE_RANGE
+    reason[price * quantity < rules["min_notional"]] = MIN_NOTIONAL
+    reason[(max_qty > 0) & (quantity > max_qty)] = MAX_QTY
+    reason[(quantity <= 0) | (quantity < rules["min_qty"])] = MIN_QTY
+    return CheckedOrders(price, quantity, reason == OK, reason)
@@ -0,0 +1,147 @@
+"""Local stand-in for the Binance ``/api/v3/klines`` endpoint.
+
+:class:`KlineReplayServer` serves a recorded list of klines over HTTP with
+the same paging semantics as Binance (``startTime``/``endTime`` inclusive,
+at most ``limit`` rows).  It lets :class:`~exchange.klines.KlineDownloader`
+be exercised and benchmarked without network access.
+
+Example
+-------
+>>> klines = synthetic_klines("2023-01-01", 10_000, "1m")
+>>> with KlineReplayServer(klines) as server:
+...     KlineDownloader(server.url).download("BTCUSDT", "1m", "2023-01-01",
+...                                          "2023-01-08", "data/btc")
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .klines import INTERVAL_MS, PAGE_LIMIT, Kline
+
+
+def synthetic_klines(start, count: int, interval: str = "1m",
+                     seed: int = 0) -> List[list]:
+    """Return ``count`` random-walk klines in Binance's array layout."""
+    step = INTERVAL_MS[interval]
+    start_ms = int(pd.Timestamp(start).value) // 1_000_000
+    rng = np.random.default_rng(seed)
+    close = 100.0 + np.cumsum(rng.normal(size=count))
+    volume = rng.lognormal(size=count)
+    klines = []
+    for i in range(count):
+        open_ms = start_ms + i * step
+        c = float(close[i])
+        klines.append([open_ms, f"{c:.8f}", f"{c + 0.5:.8f}", f"{c - 0.5:.8f}",
+                       f"{c:.8f}", f"{volume[i]:.8f}", open_ms + step - 1,
+                       f"{c * volume[i]:.8f}", 10, f"{volume[i] / 2:.8f}",
+                       f"{c * volume[i] / 2:.8f}", "0"])
+    return klines
+
+
+class KlineReplayServer:
+    """Threaded HTTP server replaying ``klines``.
+
+    Parameters
+    ----------
+    klines: Sequence
+        Kline arrays sorted by open time.
+    host, port: str, int
+        Address to bind; port ``0`` picks a free port.
+    latency: float
+        Seconds to sleep before answering each request.
+    """
+
+    def __init__(self, klines: Sequence[Kline], host: str = "127.0.0.1",
+                 port: int = 0, latency: float = 0.0):
+        self.klines = list(klines)
+        self._open_times = [int(k[0]) for k in self.klines]
+        self.latency = latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "KlineReplayServer":
+        """Serve klines recorded as a JSON array (or list of pages)."""
+        with open(path) as fh:
+            data = json.load(fh)
+        if data and isinstance(data[0][0], list):
+            data = [k for page in data for k in page]
+        return cls(data, **kwargs)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page(self, start_ms: int, end_ms: int, limit: int) -> List[Kline]:
+        lo = bisect.bisect_left(self._open_times, start_ms)
+        hi = bisect.bisect_right(self._open_times, end_ms)
+        return self.klines[lo:min(hi, lo + min(limit, PAGE_LIMIT))]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server API
+                url = urllib.parse.urlsplit(self.path)
+                if url.path != "/api/v3/klines":
+                    self.send_error(404)
+                    return
+                query = dict(urllib.parse.parse_qsl(url.query))
+                with server._lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight,
+                                               server.in_flight)
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    rows = server.page(int(query.get("startTime", 0)),
+                                       int(query.get("endTime", 2 ** 62)),
+                                       int(query.get("limit", 500)))
+                    body = json.dumps(rows).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        return Handler
+
+    def start(self) -> "KlineReplayServer":
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "KlineReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
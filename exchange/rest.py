@@ -0,0 +1,589 @@
+"""Rate-limit-aware scheduling of Binance REST requests.
+
+:class:`RestScheduler` sends every REST request of a
+:class:`~exchange.binance_client.BinanceClient` through a small pool of
+worker threads sharing keep-alive HTTP connections, and decides what to send
+next:
+
+* **Request weight.**  A :class:`WeightBucket` holds the weight the account
+  may still spend in the current window.  It refills continuously and is
+  corrected down whenever a response reports a higher used weight
+  (``X-MBX-USED-WEIGHT-1M``), so requests wait locally instead of earning
+  ``429``/``418`` responses.
+* **Priority lanes.**  Requests are queued by priority.  :data:`URGENT`
+  requests (orders) always go first, may spend the whole budget and have a
+  worker kept free for them; :data:`NORMAL` and :data:`BULK` requests leave
+  ``reserve`` of the budget and one worker untouched, so a bulk download
+  never delays an order by more than one request.
+* **Coalescing.**  An unsigned ``GET`` identical to one queued or in flight
+  returns the same future instead of a second request.
+* **Retries.**  ``429``/``418`` responses block the bucket for their
+  ``Retry-After`` and are retried.  Reads are also retried after ``5xx``
+  responses and network errors, with exponential backoff and full jitter.
+  Writes (orders) are not: a ``5xx`` or a dropped connection leaves their
+  outcome unknown, so they fail with :class:`RestError` instead.
+
+Only the standard library is used, so the scheduler runs against the local
+stand-in server in :mod:`exchange.rest_server` in tests and benchmarks.
+:class:`~exchange.binance_client.BinanceClient` keeps python-binance's
+``Client`` for endpoints and signing and sends its requests through the
+scheduler, weighted and prioritized by :func:`endpoint_cost`.
+
+Example
+-------
+>>> rest = RestScheduler(TESTNET_URL, api_key, api_secret)  # doctest: +SKIP
+>>> rest.request("GET", "/api/v3/ticker/price", {"symbol": "BTCUSDT"},
+...              weight=2)                                 # doctest: +SKIP
+>>> rest.request("POST", "/api/v3/order", {...}, priority=URGENT,
+...              signed=True)                              # doctest: +SKIP
+"""
+from __future__ import annotations
+
+import hashlib
+import heapq
+import hmac
+import http.client
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import (Any, Callable, Dict, List, Mapping, Optional, Tuple,
+                    Union)
+
+from analytics.metrics import Histogram
+
+BASE_URL = "https://api.binance.com"
+TESTNET_URL = "https://testnet.binance.vision"
+
+#: Request priorities, most urgent first.
+URGENT, NORMAL, BULK = 0, 1, 2
+LANES = {URGENT: "urgent", NORMAL: "normal", BULK: "bulk"}
+
+USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+#: Binance's default request weight limit per minute.
+WEIGHT_LIMIT = 6000
+
+#: Request weight and priority of the endpoints this package calls; other
+#: endpoints cost 1 at :data:`NORMAL` priority, order writes are urgent.
+ENDPOINTS: Dict[str, Tuple[int, int]] = {
+    "/api/v3/exchangeInfo": (20, BULK),
+    "/api/v3/account": (20, NORMAL),
+    "/api/v3/ticker/price": (2, NORMAL),
+    "/api/v3/klines": (2, BULK),
+    "/api/v3/order": (1, URGENT),
+}
+
+Params = Union[Mapping[str, Any], List[Tuple[str, Any]]]
+
+
+def endpoint_cost(method: str, path: str) -> Tuple[int, int]:
+    """Return the ``(weight, priority)`` of a request to ``path``."""
+    weight, priority = ENDPOINTS.get(path, (1, NORMAL))
+    if method.upper() != "GET" and path.startswith("/api/v3/order"):
+        priority = URGENT       # placing, testing or cancelling orders
+    return weight, priority
+
+
+class RestError(Exception):
+    """A failed REST request.
+
+    ``status`` is the HTTP status (``0`` when no response arrived) and
+    ``code``/``message`` are Binance's error code and message, if any.
+    """
+
+    def __init__(self, status: int, code: int, message: str):
+        super().__init__(f"HTTP {status} ({code}): {message}")
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class WeightBucket:
+    """Token bucket of request weight.
+
+    Parameters
+    ----------
+    limit: int
+        Weight allowed per ``window``.
+    window: float
+        Seconds over which ``limit`` refills.
+    reserve: float
+        Fraction of ``limit`` only urgent requests may spend.
+    """
+
+    def __init__(self, limit: int = WEIGHT_LIMIT, window: float = 60.0,
+                 reserve: float = 0.2):
+        self.limit = float(limit)
+        self.rate = limit / window
+        self.reserve = reserve * limit
+        self.tokens = float(limit)
+        self.blocked_until = 0.0
+        self._stamp = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.limit,
+                          self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def take(self, weight: float, urgent: bool, now: float) -> float:
+        """Spend ``weight`` and return 0, or return the seconds to wait."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        floor = 0.0 if urgent else self.reserve
+        missing = weight + floor - self.tokens
+        if missing <= 0.0:
+            self.tokens -= weight
+            return 0.0
+        return missing / self.rate
+
+    def observe(self, used: float, now: float) -> None:
+        """Account for the server's count of weight used in its window."""
+        self._refill(now)
+        self.tokens = min(self.tokens, self.limit - used)
+
+    def block(self, seconds: float, now: float) -> None:
+        """Send nothing for ``seconds`` (after a ``429`` or ``418``)."""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0.0
+        self._stamp = max(self._stamp, self.blocked_until)
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one host.
+
+    Connections idle for longer than ``max_idle`` seconds are closed rather
+    than reused, since the server may already have dropped them.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 10.0,
+                 max_idle: float = 30.0):
+        url = urllib.parse.urlsplit(base_url)
+        self.https = url.scheme == "https"
+        self.host = url.hostname
+        self.port = url.port
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle: List[Tuple[float, http.client.HTTPConnection]] = []
+        self._lock = threading.Lock()
+        #: Connections opened so far.
+        self.opened = 0
+
+    def acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """Return an idle connection (and ``True``) or a new one."""
+        stale = []
+        with self._lock:
+            oldest = time.monotonic() - self.max_idle
+            while self._idle:
+                released, conn = self._idle.pop()
+                if released >= oldest:
+                    break
+                stale.append(conn)
+            else:
+                conn = None
+                self.opened += 1
+        for old in stale:
+            old.close()
+        if conn is not None:
+            return conn, True
+        cls = (http.client.HTTPSConnection if self.https
+               else http.client.HTTPConnection)
+        return cls(self.host, self.port, timeout=self.timeout), False
+
+    def release(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.append((time.monotonic(), conn))
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _, conn in idle:
+            conn.close()
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    method: str = field(compare=False)
+    path: str = field(compare=False)
+    params: Params = field(compare=False)
+    weight: int = field(compare=False)
+    signed: bool = field(compare=False)
+    future: Future = field(compare=False)
+    key: Optional[tuple] = field(compare=False, default=None)
+    attempt: int = field(compare=False, default=0)
+    queued: float = field(compare=False, default=0.0)
+    throttled: bool = field(compare=False, default=False)
+
+
+class RestScheduler:
+    """Prioritized, weight-limited REST request scheduler.
+
+    Parameters
+    ----------
+    base_url: str
+        REST endpoint root, e.g. :data:`BASE_URL` or a local stand-in.
+    api_key, api_secret: str, optional
+        Credentials for signed requests.
+    signer: callable, optional
+        Function returning the signed query string of a signed request's
+        parameters, called whenever the request is sent (so retries carry
+        a fresh timestamp).  Defaults to an HMAC-SHA256 signature with
+        ``api_secret``.
+    weight_limit: int
+        Request weight allowed per ``window`` seconds.
+    window: float
+        Length of the exchange's weight window in seconds.
+    reserve: float
+        Fraction of the weight budget kept for urgent requests.
+    workers: int
+        Requests in flight at most (and connections kept open).
+    retries: int
+        Retries of a request before it fails.
+    backoff, max_backoff: float
+        Base and cap in seconds of the jittered exponential retry delay.
+    timeout: float
+        Socket timeout in seconds.
+    """
+
+    def __init__(self, base_url: str = BASE_URL,
+                 api_key: Optional[str] = None,
+                 api_secret: Optional[str] = None,
+                 signer: Optional[Callable[[Params], str]] = None,
+                 weight_limit: int = WEIGHT_LIMIT, window: float = 60.0,
+                 reserve: float = 0.2, workers: int = 8, retries: int = 5,
+                 backoff: float = 0.25, max_backoff: float = 30.0,
+                 timeout: float = 10.0):
+        if workers < 1:
+            raise ValueError("workers must be positive")
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.signer = signer
+        self.bucket = WeightBucket(weight_limit, window, reserve)
+        self.pool = ConnectionPool(base_url, timeout)
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._queue: List[_Job] = []
+        self._pending: Dict[tuple, Future] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._busy = 0
+        self._closed = False
+        self.counts: Dict[str, int] = dict.fromkeys(
+            ("requests", "coalesced", "retries", "throttled", "errors"), 0)
+        self.statuses: Dict[int, int] = {}
+        #: Time from submission to sending, per lane, in nanoseconds.
+        self.queue_wait = {lane: Histogram(f"rest.{lane}.queue_wait")
+                           for lane in LANES.values()}
+        self._threads = [threading.Thread(target=self._run, daemon=True,
+                                          name=f"rest-{i}")
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    # ------------------------------------------------------------------ public
+    def submit(self, method: str, path: str,
+               params: Optional[Params] = None, weight: int = 1,
+               priority: int = NORMAL, signed: bool = False) -> Future:
+        """Queue a request and return a future of its decoded JSON body.
+
+        ``params`` is a mapping or a list of ``(name, value)`` pairs, which
+        are sent in order.
+        """
+        method = method.upper()
+        params = (list(params) if isinstance(params, list)
+                  else dict(params or {}))
+        key = None
+        if method == "GET" and not signed:
+            items = params if isinstance(params, list) else params.items()
+            key = (path, tuple(sorted(items)))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("scheduler is closed")
+            if key is not None:
+                future = self._pending.get(key)
+                if future is not None:
+                    self.counts["coalesced"] += 1
+                    return future
+            future = Future()
+            if key is not None:
+                self._pending[key] = future
+            self._push(_Job(priority, next(self._seq), method, path, params,
+                            weight, signed, future, key,
+                            queued=time.perf_counter()))
+        return future
+
+    def request(self, method: str, path: str,
+                params: Optional[Params] = None,
+                weight: int = 1, priority: int = NORMAL,
+                signed: bool = False) -> Any:
+        """Send a request through the queue and wait for its result."""
+        return self.submit(method, path, params, weight, priority,
+                           signed).result()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters, response statuses and queue-wait percentiles (ms)."""
+        lanes = {}
+        for lane, hist in self.queue_wait.items():
+            if hist.count:
+                lanes[lane] = {"count": hist.count,
+                               "p50_ms": hist.percentile(50) / 1e6,
+                               "p99_ms": hist.percentile(99) / 1e6,
+                               "max_ms": hist.max() / 1e6}
+        return dict(self.counts, statuses=dict(self.statuses),
+                    connections=self.pool.opened, queued=len(self._queue),
+                    lanes=lanes)
+
+    def close(self) -> None:
+        """Fail queued requests, stop the workers and close connections."""
+        with self._cond:
+            self._closed = True
+            queued, self._queue = self._queue, []
+            self._cond.notify_all()
+        for job in queued:
+            self._finish(job, error=RuntimeError("scheduler is closed"))
+        for thread in self._threads:
+            thread.join()
+        self.pool.close()
+
+    def __enter__(self) -> "RestScheduler":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------ queue
+    def _push(self, job: _Job) -> None:
+        heapq.heappush(self._queue, job)
+        self._cond.notify()
+
+    def _requeue(self, job: _Job) -> None:
+        with self._cond:
+            if self._closed:
+                error = RuntimeError("scheduler is closed")
+            else:
+                self._push(job)
+                return
+        self._finish(job, error=error)
+
+    def _next(self) -> Tuple[Optional[_Job], Optional[float]]:
+        """Pop the job to send now, or return how long to wait."""
+        if not self._queue:
+            return None, None
+        job = self._queue[0]
+        urgent = job.priority == URGENT
+        if not urgent and self.workers > 1 and self._busy >= self.workers - 1:
+            return None, None       # woken when a worker frees up
+        wait = self.bucket.take(job.weight, urgent, time.monotonic())
+        if wait > 0.0:
+            if not job.throttled:
+                # Counted once per request, not on every wake-up.
+                job.throttled = True
+                self.counts["throttled"] += 1
+            return None, wait
+        heapq.heappop(self._queue)
+        self._busy += 1
+        self.counts["requests"] += 1
+        self.queue_wait[LANES.get(job.priority, "bulk")].record(
+            int((time.perf_counter() - job.queued) * 1e9))
+        return job, None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    job, wait = self._next()
+                    if job is not None:
+                        break
+                    self._cond.wait(wait)
+                if self._queue:
+                    self._cond.notify()
+            try:
+                self._execute(job)
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    self._cond.notify()
+
+    def _finish(self, job: _Job, result: Any = None,
+                error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            if job.key is not None:
+                self._pending.pop(job.key, None)
+            if error is not None:
+                self.counts["errors"] += 1
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def _retry(self, job: _Job, error: BaseException,
+               delay: Optional[float] = None) -> None:
+        if job.attempt >= self.retries:
+            self._finish(job, error=error)
+            return
+        jitter = random.uniform(
+            0.0, min(self.max_backoff, self.backoff * 2 ** job.attempt))
+        job.attempt += 1
+        with self._cond:
+            self.counts["retries"] += 1
+        timer = threading.Timer(max(delay or 0.0, jitter), self._requeue,
+                                (job,))
+        timer.daemon = True
+        timer.start()
+
+    # ------------------------------------------------------------------ HTTP
+    def _target(self, job: _Job) -> Tuple[str, Dict[str, str]]:
+        params = job.params
+        headers = {}
+        if job.signed:
+            if not self.api_key or not (self.api_secret or self.signer):
+                raise RestError(0, -2015, "signed request without API keys")
+            if self.signer is not None:
+                query = self.signer(params)
+            else:
+                query = urllib.parse.urlencode(
+                    list(params.items() if isinstance(params, dict)
+                         else params)
+                    + [("timestamp", int(time.time() * 1000))])
+                signature = hmac.new(self.api_secret.encode(),
+                                     query.encode(),
+                                     hashlib.sha256).hexdigest()
+                query = f"{query}&signature={signature}"
+            headers["X-MBX-APIKEY"] = self.api_key
+        else:
+            query = urllib.parse.urlencode(params)
+        path = self.pool.prefix + job.path
+        return (f"{path}?{query}" if query else path), headers
+
+    def _send(self, job: _Job) -> Tuple[int, http.client.HTTPMessage,
+                                        bytes]:
+        target, headers = self._target(job)
+        conn, reused = self.pool.acquire()
+        try:
+            conn.request(job.method, target, headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError,
+                BrokenPipeError):
+            conn.close()
+            if not reused or job.method != "GET":
+                raise
+            # The server closed an idle keep-alive connection: reconnect.
+            conn, _ = self.pool.acquire()
+            try:
+                conn.request(job.method, target, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except BaseException:
+                conn.close()
+                raise
+        except BaseException:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self.pool.release(conn)
+        return response.status, response.headers, body
+
+    def _execute(self, job: _Job) -> None:
+        read = job.method == "GET"
+        try:
+            status, headers, body = self._send(job)
+        except RestError as exc:
+            self._finish(job, error=exc)
+            return
+        except (OSError, http.client.HTTPException) as exc:
+            error = RestError(0, -1, f"{type(exc).__name__}: {exc}")
+            if read:
+                self._retry(job, error)
+            else:
+                self._finish(job, error=error)
+            return
+        now = time.monotonic()
+        used = headers.get(USED_WEIGHT_HEADER)
+        with self._cond:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if used is not None:
+                self.bucket.observe(float(used), now)
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            payload = None
+        if status == 200:
+            self._finish(job, payload)
+            return
+        code, message = -1, body.decode(errors="replace")[:200]
+        if isinstance(payload, dict):
+            code = payload.get("code", code)
+            message = payload.get("msg", message)
+        error = RestError(status, code, message)
+        if status in (418, 429):
+            retry_after = float(headers.get("Retry-After") or 1.0)
+            with self._cond:
+                self.bucket.block(retry_after, now)
+            self._retry(job, error, retry_after)
+        elif status >= 500 and read:
+            self._retry(job, error)
+        else:
+            self._finish(job, error=error)
+
+
+class ScheduledRestClient:
+    """The subset of ``binance.client.Client`` used by this package,
+    implemented on a :class:`RestScheduler` with the standard library.
+
+    Used against the local stand-in server, where python-binance is not
+    needed.  Orders are :data:`URGENT`, account and ticker reads
+    :data:`NORMAL` and exchange info :data:`BULK`.  Weights are Binance's.
+    """
+
+    def __init__(self, scheduler: RestScheduler):
+        self.scheduler = scheduler
+
+    def get_exchange_info(self) -> Dict[str, Any]:
+        return self.scheduler.request("GET", "/api/v3/exchangeInfo",
+                                      weight=20, priority=BULK)
+
+    def get_symbol_info(self, symbol: str) -> Optional[Dict[str, Any]]:
+        info = self.scheduler.request("GET", "/api/v3/exchangeInfo",
+                                      {"symbol": symbol}, weight=2)
+        for entry in info.get("symbols", []):
+            if entry["symbol"] == symbol:
+                return entry
+        return None
+
+    def get_symbol_ticker(self, symbol: str) -> Dict[str, str]:
+        return self.scheduler.request("GET", "/api/v3/ticker/price",
+                                      {"symbol": symbol}, weight=2)
+
+    def get_account(self) -> Dict[str, Any]:
+        return self.scheduler.request("GET", "/api/v3/account", weight=20,
+                                      signed=True)
+
+    def _order(self, symbol: str, side: str, quantity: Any,
+               params: Dict[str, Any]) -> Dict[str, Any]:
+        params = dict(params, symbol=symbol, side=side, type="MARKET",
+                      quantity=quantity)
+        params.setdefault("newOrderRespType", "FULL")
+        return self.scheduler.request("POST", "/api/v3/order", params,
+                                      weight=1, priority=URGENT, signed=True)
+
+    def order_market_buy(self, symbol: str, quantity: Any,
+                         **params: Any) -> Dict[str, Any]:
+        return self._order(symbol, "BUY", quantity, params)
+
+    def order_market_sell(self, symbol: str, quantity: Any,
+                          **params: Any) -> Dict[str, Any]:
+        return self._order(symbol, "SELL", quantity, params)
@@ -0,0 +1,314 @@
+"""Local stand-in for the Binance REST API that enforces request weight.
+
+:class:`RateLimitedServer` answers the endpoints used by
+:class:`~exchange.rest.ScheduledRestClient` and
+:class:`~exchange.klines.KlineDownloader` over keep-alive HTTP/1.1 and
+counts request weight in fixed windows the way Binance does:
+
+* every response carries the ``X-MBX-USED-WEIGHT-1M`` header,
+* a request that would exceed ``weight_limit`` in the current window gets a
+  ``429`` with a ``Retry-After`` until the window ends,
+* a client that keeps sending after ``ban_after`` such responses in one
+  window is banned: every request gets a ``418`` until the ban expires.
+
+It lets :class:`~exchange.rest.RestScheduler` be tested and benchmarked
+against realistic limits without network access.
+
+Example
+-------
+>>> with RateLimitedServer({"BTCUSDT": 30_000.0}, weight_limit=1200,
+...                        window=10.0) as server:
+...     rest = RestScheduler(server.url, "key", "secret", weight_limit=1200,
+...                          window=10.0)
+...     rest.request("GET", "/api/v3/ticker/price", {"symbol": "BTCUSDT"})
+{'symbol': 'BTCUSDT', 'price': '30000.00000000'}
+"""
+from __future__ import annotations
+
+import bisect
+import hashlib
+import hmac
+import itertools
+import json
+import math
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from .rest import USED_WEIGHT_HEADER
+
+#: Request weight per endpoint (Binance's values for the default limits).
+WEIGHTS = {
+    "/api/v3/ping": 1,
+    "/api/v3/time": 1,
+    "/api/v3/ticker/price": 2,
+    "/api/v3/klines": 2,
+    "/api/v3/exchangeInfo": 20,
+    "/api/v3/account": 20,
+    "/api/v3/order": 1,
+}
+SIGNED = {"/api/v3/account", "/api/v3/order"}
+
+
+class RateLimitedServer:
+    """Threaded HTTP server emulating Binance's REST request weight limits.
+
+    Parameters
+    ----------
+    prices: Mapping[str, float]
+        Symbol prices for the ticker and market order endpoints.
+    klines: Sequence, optional
+        Klines sorted by open time served by ``/api/v3/klines`` (for every
+        symbol), e.g. from :func:`exchange.kline_server.synthetic_klines`.
+    weight_limit: int
+        Request weight allowed per window.
+    window: float
+        Window length in seconds.
+    ban_after: int
+        ``429`` responses in one window after which the client is banned.
+    ban_seconds: float
+        Length of a ban.
+    latency: float
+        Seconds to sleep before answering each request.
+    api_key, api_secret: str, optional
+        Credentials that signed requests must carry; any are accepted when
+        not given.
+    host, port: str, int
+        Address to bind; port ``0`` picks a free port.
+    """
+
+    def __init__(self, prices: Mapping[str, float],
+                 klines: Optional[Sequence[Sequence[Any]]] = None,
+                 weight_limit: int = 6000, window: float = 60.0,
+                 ban_after: int = 10, ban_seconds: float = 120.0,
+                 latency: float = 0.0, api_key: Optional[str] = None,
+                 api_secret: Optional[str] = None, host: str = "127.0.0.1",
+                 port: int = 0):
+        self.prices = dict(prices)
+        self.klines = list(klines or [])
+        self._open_times = [int(k[0]) for k in self.klines]
+        self.weight_limit = weight_limit
+        self.window = window
+        self.ban_after = ban_after
+        self.ban_seconds = ban_seconds
+        self.latency = latency
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self._order_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._used = 0
+        self._violations = 0
+        self._banned_until = 0.0
+        self.requests = 0
+        self.connections = 0
+        self.paths: Dict[str, int] = {}
+        self.statuses: Dict[int, int] = {}
+        self.orders: List[Dict[str, Any]] = []
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self) -> Dict[str, Any]:
+        """Request, connection, per-path and per-status counts."""
+        with self._lock:
+            return {"requests": self.requests,
+                    "connections": self.connections,
+                    "paths": dict(self.paths),
+                    "statuses": dict(self.statuses),
+                    "orders": len(self.orders)}
+
+    # ------------------------------------------------------------------ limits
+    def _admit(self, path: str) -> tuple:
+        """Charge the request's weight; return ``(status, used, retry)``."""
+        weight = WEIGHTS.get(path, 1)
+        with self._lock:
+            self.requests += 1
+            self.paths[path] = self.paths.get(path, 0) + 1
+            now = time.monotonic()
+            if now < self._banned_until:
+                return 418, self._used, self._banned_until - now
+            if now - self._window_start >= self.window:
+                elapsed = now - self._window_start
+                self._window_start += elapsed - elapsed % self.window
+                self._used = 0
+                self._violations = 0
+            retry = self._window_start + self.window - now
+            if self._used + weight > self.weight_limit:
+                self._violations += 1
+                if self._violations > self.ban_after:
+                    self._banned_until = now + self.ban_seconds
+                    return 418, self._used, self.ban_seconds
+                return 429, self._used, retry
+            self._used += weight
+            return 200, self._used, retry
+
+    def _authorized(self, query: str, headers: Any) -> bool:
+        if self.api_key is not None:
+            if headers.get("X-MBX-APIKEY") != self.api_key:
+                return False
+        if self.api_secret is None:
+            return True
+        payload, _, signature = query.rpartition("&signature=")
+        expected = hmac.new(self.api_secret.encode(), payload.encode(),
+                            hashlib.sha256).hexdigest()
+        return hmac.compare_digest(signature, expected)
+
+    # ------------------------------------------------------------------ API
+    def _exchange_info(self, symbol: Optional[str]) -> Dict[str, Any]:
+        symbols = [symbol] if symbol else sorted(self.prices)
+        return {"timezone": "UTC", "rateLimits": [{
+            "rateLimitType": "REQUEST_WEIGHT", "interval": "MINUTE",
+            "intervalNum": 1, "limit": self.weight_limit}],
+            "symbols": [{
+                "symbol": s, "status": "TRADING",
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "minPrice": "0.01000000",
+                     "maxPrice": "1000000.00000000",
+                     "tickSize": "0.01000000"},
+                    {"filterType": "LOT_SIZE", "minQty": "0.00001000",
+                     "maxQty": "9000.00000000", "stepSize": "0.00001000"},
+                    {"filterType": "NOTIONAL", "minNotional": "5.00000000",
+                     "maxNotional": "9000000.00000000"},
+                ]} for s in symbols if s in self.prices]}
+
+    def _klines(self, query: Dict[str, str]) -> List[Sequence[Any]]:
+        lo = bisect.bisect_left(self._open_times,
+                                int(query.get("startTime", 0)))
+        hi = bisect.bisect_right(self._open_times,
+                                 int(query.get("endTime", 2 ** 62)))
+        return self.klines[lo:min(hi, lo + int(query.get("limit", 500)))]
+
+    def _order(self, query: Dict[str, str]) -> tuple:
+        symbol = query.get("symbol")
+        if symbol not in self.prices:
+            return 400, {"code": -1121, "msg": "Invalid symbol."}
+        quantity = float(query.get("quantity", 0.0))
+        if not quantity > 0.0:
+            return 400, {"code": -1013, "msg": "Invalid quantity."}
+        price = self.prices[symbol]
+        order = {
+            "symbol": symbol, "orderId": next(self._order_ids),
+            "transactTime": int(time.time() * 1000), "status": "FILLED",
+            "type": query.get("type", "MARKET"), "side": query.get("side"),
+            "origQty": f"{quantity:.8f}", "executedQty": f"{quantity:.8f}",
+            "cummulativeQuoteQty": f"{quantity * price:.8f}",
+            "fills": [{"price": f"{price:.8f}", "qty": f"{quantity:.8f}",
+                       "commission": "0.00000000",
+                       "commissionAsset": symbol[-4:]}],
+        }
+        with self._lock:
+            self.orders.append(order)
+        return 200, order
+
+    def _route(self, method: str, path: str,
+               query: Dict[str, str]) -> tuple:
+        if path in ("/api/v3/ping", "/api/v3/time"):
+            return 200, ({} if path.endswith("ping")
+                         else {"serverTime": int(time.time() * 1000)})
+        if path == "/api/v3/ticker/price":
+            symbol = query.get("symbol")
+            if symbol not in self.prices:
+                return 400, {"code": -1121, "msg": "Invalid symbol."}
+            return 200, {"symbol": symbol,
+                         "price": f"{self.prices[symbol]:.8f}"}
+        if path == "/api/v3/klines":
+            return 200, self._klines(query)
+        if path == "/api/v3/exchangeInfo":
+            return 200, self._exchange_info(query.get("symbol"))
+        if path == "/api/v3/account":
+            return 200, {"balances": []}
+        if path == "/api/v3/order" and method == "POST":
+            return self._order(query)
+        return 404, {"code": -1, "msg": "Unknown endpoint."}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this, a
+            # keep-alive client waits for delayed ACKs on every response.
+            disable_nagle_algorithm = True
+
+            def setup(self) -> None:
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def _reply(self, status: int, payload: Any, used: int,
+                       retry: float) -> None:
+                with server._lock:
+                    server.statuses[status] = (
+                        server.statuses.get(status, 0) + 1)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header(USED_WEIGHT_HEADER, str(used))
+                if status in (418, 429):
+                    self.send_header("Retry-After",
+                                     str(max(math.ceil(retry), 1)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _serve(self, method: str) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                url = urllib.parse.urlsplit(self.path)
+                status, used, retry = server._admit(url.path)
+                if status != 200:
+                    message = ("Way too many requests; IP banned."
+                               if status == 418 else
+                               "Too much request weight used.")
+                    self._reply(status, {"code": -1003, "msg": message},
+                                used, retry)
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                if (url.path in SIGNED
+                        and not server._authorized(url.query, self.headers)):
+                    self._reply(401, {"code": -1022,
+                                      "msg": "Signature for this request is "
+                                             "not valid."}, used, retry)
+                    return
+                query = dict(urllib.parse.parse_qsl(url.query))
+                status, payload = server._route(method, url.path, query)
+                self._reply(status, payload, used, retry)
+
+            def do_GET(self) -> None:  # noqa: N802 - http.server API
+                self._serve("GET")
+
+            def do_POST(self) -> None:  # noqa: N802 - http.server API
+                self._serve("POST")
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        return Handler
+
+    def start(self) -> "RateLimitedServer":
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "RateLimitedServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
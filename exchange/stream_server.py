@@ -0,0 +1,229 @@
+"""Local stand-in for the Binance combined-stream websocket endpoint.
+
+:class:`StreamReplayServer` accepts ``SUBSCRIBE`` requests like
+``wss://stream.binance.com:9443/stream`` and replays recorded combined-stream
+messages to each client, filtered to the streams it subscribed to, either as
+fast as the connection takes them or at a fixed rate.  It lets
+:class:`~exchange.streams.MarketStream` be tested and benchmarked offline,
+including reconnects (``drop_after``).
+
+Example
+-------
+>>> messages = synthetic_ticker_messages(["BTCUSDT", "ETHUSDT"], 10_000)
+>>> with StreamReplayServer(messages) as server:
+...     stream = MarketStream(["BTCUSDT", "ETHUSDT"], print, url=server.url)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from .streams import ConnectionClosed, websockets
+
+_STREAM = re.compile(r'"stream":"([^"]+)"')
+
+
+def synthetic_ticker_messages(symbols: Sequence[str], count: int,
+                              start_ms: int = 1_672_531_200_000,
+                              seed: int = 0) -> List[str]:
+    """Return ``count`` combined-stream 24hr ticker messages in Binance's
+    layout, cycling through ``symbols`` with random-walk prices."""
+    rng = np.random.default_rng(seed)
+    prices = {s: 100.0 + 10 * rng.random() for s in symbols}
+    steps = rng.normal(scale=0.05, size=count)
+    volumes = rng.lognormal(size=count)
+    messages = []
+    for i in range(count):
+        symbol = symbols[i % len(symbols)]
+        price = prices[symbol] = max(prices[symbol] + steps[i], 0.01)
+        event_ms = start_ms + i
+        data = (
+            f'{{"e":"24hrTicker","E":{event_ms},"s":"{symbol}",'
+            f'"p":"0.10000000","P":"0.100","w":"{price:.8f}",'
+            f'"x":"{price:.8f}","c":"{price:.8f}","Q":"0.01000000",'
+            f'"b":"{price - 0.01:.8f}","B":"1.00000000",'
+            f'"a":"{price + 0.01:.8f}","A":"1.00000000",'
+            f'"o":"{price:.8f}","h":"{price + 1:.8f}","l":"{price - 1:.8f}",'
+            f'"v":"{volumes[i]:.8f}","q":"{volumes[i] * price:.8f}",'
+            f'"O":{event_ms - 86_400_000},"C":{event_ms},"F":0,"L":{i},'
+            f'"n":{i + 1}}}'
+        )
+        messages.append(f'{{"stream":"{symbol.lower()}@ticker","data":{data}}}')
+    return messages
+
+
+class StreamReplayServer:
+    """Websocket server replaying combined-stream ``messages``.
+
+    Parameters
+    ----------
+    messages: Sequence[str]
+        Recorded combined-stream messages (``{"stream": ..., "data": ...}``).
+    host, port: str, int
+        Address to bind; port ``0`` picks a free port.
+    rate: float, optional
+        Messages per second per connection; ``None`` sends as fast as
+        possible.
+    repeat: bool
+        Loop over the recording instead of closing the connection at its end.
+    drop_after: int, optional
+        Close each connection after sending this many messages, to exercise
+        client reconnects.
+    close_timeout: float
+        Seconds to wait for a client to answer the closing handshake on
+        :meth:`stop`; clients that stopped reading are dropped after that.
+    """
+
+    def __init__(self, messages: Sequence[str], host: str = "127.0.0.1",
+                 port: int = 0, rate: Optional[float] = None,
+                 repeat: bool = False, drop_after: Optional[int] = None,
+                 close_timeout: float = 1.0):
+        self.messages = list(messages)
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.repeat = repeat
+        self.drop_after = drop_after
+        self.close_timeout = close_timeout
+        # Index of the recording by stream name, so filtering a
+        # subscription is a merge of precomputed positions.
+        by_stream: Dict[str, List[int]] = defaultdict(list)
+        for i, message in enumerate(self.messages):
+            match = _STREAM.search(message)
+            if match:
+                by_stream[match.group(1)].append(i)
+        self._by_stream = {k: np.asarray(v) for k, v in by_stream.items()}
+        self.connections = 0
+        self.subscriptions = 0
+        self.sent = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._open: Set = set()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "StreamReplayServer":
+        """Serve messages recorded one JSON document per line."""
+        with open(path) as fh:
+            return cls([line.strip() for line in fh if line.strip()],
+                       **kwargs)
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/stream"
+
+    def _selection(self, streams: Sequence[str]) -> List[str]:
+        parts = [self._by_stream[s] for s in streams if s in self._by_stream]
+        if not parts:
+            return []
+        order = np.sort(np.concatenate(parts))
+        return [self.messages[i] for i in order]
+
+    async def _handler(self, ws) -> None:
+        self.connections += 1
+        self._open.add(ws)
+        try:
+            await self._replay(ws)
+        except (ConnectionClosed, asyncio.TimeoutError,
+                asyncio.CancelledError):
+            # The client went away (or the server is shutting down) in the
+            # middle of the replay; nothing is left to send it.
+            pass
+        finally:
+            self._open.discard(ws)
+
+    async def _replay(self, ws) -> None:
+        streams: List[str] = []
+        # Wait for the first SUBSCRIBE, then replay.
+        async for raw in ws:
+            request = json.loads(raw)
+            if request.get("method") == "SUBSCRIBE":
+                streams.extend(request.get("params", []))
+                self.subscriptions += 1
+                await ws.send(json.dumps({"result": None,
+                                          "id": request.get("id")}))
+                break
+        selection = self._selection(streams)
+        if not selection:
+            return
+        delay = 1.0 / self.rate if self.rate else 0.0
+        sent = 0
+        while True:
+            for message in selection:
+                await ws.send(message)
+                sent += 1
+                self.sent += 1
+                if self.drop_after is not None and sent >= self.drop_after:
+                    return
+                if delay:
+                    await asyncio.sleep(delay)
+            if not self.repeat:
+                break
+        await ws.close()
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+
+        async def main() -> None:
+            self._server = await websockets.serve(
+                self._handler, self.host, self.port, max_size=None,
+                compression=None, close_timeout=self.close_timeout)
+            self.port = next(iter(self._server.sockets)).getsockname()[1]
+            self._stopping = asyncio.Event()
+            self._ready.set()
+            await self._stopping.wait()
+            await self._shutdown()
+
+        async def cancel_pending() -> None:
+            # Let connection tasks (keepalive pings, closing handshakes)
+            # see their cancellation before the loop goes away.
+            pending = asyncio.all_tasks() - {asyncio.current_task()}
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        self._loop.run_until_complete(main())
+        self._loop.run_until_complete(cancel_pending())
+        self._loop.close()
+
+    def start(self) -> "StreamReplayServer":
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    async def _shutdown(self) -> None:
+        self._server.close()
+        try:
+            await asyncio.wait_for(self._server.wait_closed(),
+                                   self.close_timeout)
+        except asyncio.TimeoutError:
+            # A client that went away without finishing the closing
+            # handshake would hold its handler until the next keepalive
+            # ping times out.
+            for ws in list(self._open):
+                ws.transport.abort()
+            await self._server.wait_closed()
+
+    def stop(self) -> None:
+        if self._stopping is not None and self._loop is not None:
+            # The loop shuts the server down itself before it returns, so
+            # no task is left pending when it closes.
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread is not None:
+            self._thread.join()
+        self._stopping = None
+
+    def __enter__(self) -> "StreamReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
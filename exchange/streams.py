@@ -0,0 +1,236 @@
+"""Multiplexed market data streams with compact tick decoding.
+
+:class:`MarketStream` watches many symbols over Binance *combined stream*
+connections: symbols are split into batches of at most ``batch_size`` and
+each batch shares one websocket, subscribed to ``<symbol>@ticker`` with a
+single ``SUBSCRIBE`` request.  Dropped and refused connections are reopened
+with jittered exponential backoff (at least the ``Retry-After`` of a
+``429``/``418`` handshake rejection) and the batch is subscribed again.
+
+Messages are decoded by :class:`TickDecoder` straight into
+:class:`TickRecord` tuples ``(symbol id, ts, bid, ask, last, volume)`` with
+one precompiled regular expression over the raw text; no dict is built for
+the common case.  Anything that does not match the expected layout falls back
+to :mod:`json`.  :data:`TICK_DTYPE` is the equivalent packed NumPy record for
+storing ticks in bulk.
+
+:mod:`exchange.stream_server` provides a local stand-in that replays recorded
+messages, see ``benchmarks/stream_parse.py`` for the throughput benchmark.
+
+Example
+-------
+>>> stream = MarketStream(["BTCUSDT", "ETHUSDT"], on_tick=print)
+>>> asyncio.run(stream.run())
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import random
+import re
+from typing import (Callable, Dict, Iterable, List, NamedTuple, Optional,
+                    Sequence, Union)
+
+import numpy as np
+
+try:
+    import websockets
+    from websockets.exceptions import ConnectionClosed, WebSocketException
+except Exception as exc:  # pragma: no cover - external dependency
+    raise ImportError("websockets is required for market data streams") from exc
+
+STREAM_URL = "wss://stream.binance.com:9443/stream"
+TESTNET_STREAM_URL = "wss://testnet.binance.vision/stream"
+
+#: Binance accepts up to 1024 streams per connection; smaller batches keep
+#: one slow connection from holding up many symbols.
+BATCH_SIZE = 200
+
+#: Packed record layout of a tick (44 bytes).
+TICK_DTYPE = np.dtype([("symbol", "<u4"), ("ts", "<i8"), ("bid", "<f8"),
+                       ("ask", "<f8"), ("last", "<f8"), ("volume", "<f8")])
+
+Message = Union[str, bytes]
+
+
+class TickRecord(NamedTuple):
+    """Decoded ticker update; ``ts`` is the event time in epoch ns."""
+
+    symbol: int
+    ts: int
+    bid: float
+    ask: float
+    last: float
+    volume: float
+
+
+# Field order of Binance 24hr ticker events: E, s, ..., c, ..., b, ..., a,
+# ..., v.  Lazy gaps keep the match anchored to the next key.
+_TICKER = r'"E":(\d+),"s":"(\w+)".*?"c":"([^"]*)".*?"b":"([^"]*)".*?' \
+          r'"a":"([^"]*)".*?"v":"([^"]*)"'
+_TICKER_STR = re.compile(_TICKER)
+_TICKER_BYTES = re.compile(_TICKER.encode())
+
+
+class TickDecoder:
+    """Decode ticker messages of a fixed symbol universe.
+
+    Parameters
+    ----------
+    symbols:
+        Symbols to decode; their positions are the record symbol ids.
+        Messages for other symbols decode to ``None``.
+    """
+
+    def __init__(self, symbols: Sequence[str]):
+        self.symbols = [s.upper() for s in symbols]
+        self._ids: Dict[Union[str, bytes], int] = {}
+        for i, symbol in enumerate(self.symbols):
+            self._ids[symbol] = i
+            self._ids[symbol.encode()] = i
+        #: Messages that needed the JSON fallback.
+        self.fallbacks = 0
+
+    def decode(self, message: Message) -> Optional[TickRecord]:
+        """Return the tick in ``message``, or ``None`` for other messages."""
+        pattern = _TICKER_BYTES if isinstance(message, bytes) else _TICKER_STR
+        match = pattern.search(message)
+        if match is None:
+            return self._decode_json(message)
+        ts, symbol, last, bid, ask, volume = match.groups()
+        sid = self._ids.get(symbol)
+        if sid is None:
+            return None
+        return TickRecord(sid, int(ts) * 1_000_000, float(bid), float(ask),
+                          float(last), float(volume))
+
+    def _decode_json(self, message: Message) -> Optional[TickRecord]:
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return None
+        if isinstance(data, dict) and "data" in data:
+            data = data["data"]
+        if not isinstance(data, dict) or "s" not in data or "c" not in data:
+            return None  # subscription acks, errors, other event types
+        self.fallbacks += 1
+        sid = self._ids.get(data["s"])
+        if sid is None:
+            return None
+        return TickRecord(sid, int(data.get("E", 0)) * 1_000_000,
+                          float(data.get("b", "nan")),
+                          float(data.get("a", "nan")), float(data["c"]),
+                          float(data.get("v", 0.0)))
+
+    def decode_array(self, messages: Iterable[Message]) -> np.ndarray:
+        """Decode many messages into a :data:`TICK_DTYPE` array."""
+        ticks = [t for t in map(self.decode, messages) if t is not None]
+        return np.array(ticks, dtype=TICK_DTYPE)
+
+
+def stream_names(symbols: Iterable[str]) -> List[str]:
+    return [f"{s.lower()}@ticker" for s in symbols]
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """Return the ``Retry-After`` seconds of a rate-limited handshake."""
+    response = getattr(exc, "response", None)       # InvalidStatus
+    status = getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None)
+    if status is None:                              # legacy InvalidStatusCode
+        status = getattr(exc, "status_code", None)
+        headers = getattr(exc, "headers", None)
+    if status not in (418, 429) or headers is None:
+        return None
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class MarketStream:
+    """Combined-stream ticker subscription for many symbols.
+
+    Parameters
+    ----------
+    symbols:
+        Symbols to watch.  Record symbol ids index this list.
+    on_tick:
+        Called with every decoded :class:`TickRecord`, on the event loop.
+    url:
+        Combined stream endpoint, e.g. :data:`STREAM_URL` or a local
+        :class:`~exchange.stream_server.StreamReplayServer`.
+    batch_size:
+        Maximum number of symbols per connection.
+    max_backoff:
+        Upper bound in seconds of the reconnect delay.
+    """
+
+    def __init__(self, symbols: Sequence[str],
+                 on_tick: Callable[[TickRecord], None],
+                 url: str = STREAM_URL, batch_size: int = BATCH_SIZE,
+                 max_backoff: float = 30.0):
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        self.decoder = TickDecoder(symbols)
+        self.on_tick = on_tick
+        self.url = url
+        self.max_backoff = max_backoff
+        symbols = self.decoder.symbols
+        self.batches = [symbols[i:i + batch_size]
+                        for i in range(0, len(symbols), batch_size)]
+        self.messages = 0
+        self.ticks = 0
+        self.reconnects = 0
+        self._ids = itertools.count(1)
+
+    @property
+    def symbols(self) -> List[str]:
+        return self.decoder.symbols
+
+    async def _connection(self, batch: Sequence[str]) -> None:
+        decode = self.decoder.decode
+        on_tick = self.on_tick
+        request = json.dumps({"method": "SUBSCRIBE",
+                              "params": stream_names(batch),
+                              "id": next(self._ids)})
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                async with websockets.connect(self.url, max_size=None,
+                                              compression=None) as ws:
+                    # (Re)subscribe the whole batch on every connect.
+                    await ws.send(request)
+                    attempt = 0
+                    async for message in ws:
+                        self.messages += 1
+                        tick = decode(message)
+                        if tick is not None:
+                            self.ticks += 1
+                            on_tick(tick)
+            except (ConnectionClosed, OSError, asyncio.TimeoutError):
+                pass
+            except WebSocketException as exc:
+                # Handshake rejections, e.g. 429/418/503 while the
+                # connection rate is limited.
+                retry_after = _retry_after(exc)
+            self.reconnects += 1
+            delay = min(self.max_backoff, 0.1 * 2 ** attempt)
+            attempt += 1
+            delay *= 0.5 + random.random()
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            await asyncio.sleep(delay)
+
+    async def run(self) -> None:
+        """Stream until cancelled, reconnecting dropped connections."""
+        tasks = [asyncio.create_task(self._connection(batch))
+                 for batch in self.batches]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -2,26 +2,128 @@
 
 This module provides helper functions to train a simple PPO agent on the
 :class:`TradingEnv` environment and to run inference with a saved model.
+
+pandas, gym and Stable-Baselines3 (and with it torch) take seconds to import,
+so they are imported inside the functions that use them.  Importing this
+module, e.g. to build a command line parser, stays cheap.
 """
 from __future__ import annotations
 
-import pandas as pd
-from stable_baselines3 import PPO
-from stable_baselines3.common.vec_env import DummyVecEnv
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from stable_baselines3 import PPO
+
+    from .data_store import TimeLike
+    from .features import FeaturePipeline
+
+VEC_MODES = ("inprocess", "subprocess")
+
+
+def check_vec_mode(workers: int, vec_mode: Optional[str]) -> str:
+    """Validate a worker count and vectorization mode, returning the mode.
 
-from .env import TradingEnv
+    ``vec_mode=None`` picks ``"subprocess"`` when ``workers > 1``.
+    """
+    if vec_mode is None:
+        vec_mode = "subprocess" if workers > 1 else "inprocess"
+    if vec_mode not in VEC_MODES:
+        raise ValueError(f"vec_mode must be one of {VEC_MODES}")
+    if vec_mode == "inprocess" and workers > 1:
+        raise ValueError("workers > 1 requires vec_mode='subprocess'")
+    return vec_mode
 
 
-def load_data(csv_path: str) -> pd.DataFrame:
+def load_data(csv_path: str, start: TimeLike = None,
+              end: TimeLike = None,
+              use_cache: bool = True) -> pd.DataFrame:
     """Load market data from a CSV file.
 
-    The CSV file must contain at least a ``price`` column.
+    The CSV file must contain at least a ``price`` column.  By default the
+    file is converted once into a columnar :mod:`~rl.data_store` cache next to
+    it, which later calls memory-map instead of parsing the CSV again.
+    ``csv_path`` may also point at a store directory directly.  Either way a
+    sorted ``timestamp`` column of dates is returned as naive UTC
+    ``datetime64[ns]``; see :func:`~rl.data_store.parse_times`.
+
+    Parameters
+    ----------
+    csv_path: str
+        CSV file or :class:`~rl.data_store.MarketDataStore` directory.
+    start, end: optional
+        Time range ``[start, end)`` on the ``timestamp`` column.
+    use_cache: bool
+        Parse the CSV directly instead of going through the cache.
     """
-    return pd.read_csv(csv_path)
+    from . import data_store
+
+    if Path(csv_path).is_dir():
+        return data_store.MarketDataStore(csv_path).read(start, end)
+    if not use_cache:
+        import pandas as pd
+
+        frame = data_store.parse_times(pd.read_csv(csv_path))
+        return data_store._slice_frame(frame, start, end,
+                                       data_store.TIME_COLUMN)
+    return data_store.load_csv(csv_path, start, end)
+
+
+def train_model(data: pd.DataFrame, timesteps: int = 10_000,
+                n_envs: int = 1, episode_length: Optional[int] = None,
+                workers: int = 1, vec_mode: Optional[str] = None,
+                seed: Optional[int] = None, fee: float = 0.001,
+                ppo_kwargs: Optional[Dict[str, Any]] = None,
+                features: Optional[FeaturePipeline] = None,
+                window: int = 1) -> PPO:
+    """Train and return a PPO agent on an in-memory dataset.
+
+    See :func:`train` for the parameters.  ``fee`` is the proportional
+    trading fee of the environment and ``ppo_kwargs`` are passed on to
+    :class:`~stable_baselines3.PPO` (``learning_rate``, ``gamma``, ...).
+    """
+    vec_mode = check_vec_mode(workers, vec_mode)
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    from .env import TradingEnv
+    from .vec_env import SubprocVecTradingEnv, VecTradingEnv
+
+    # The feature matrix is computed once per environment (once in total
+    # for the subprocess workers, which share it).
+    feature_kwargs = dict(features=features, window=window)
+    if vec_mode == "subprocess":
+        env = SubprocVecTradingEnv(data, num_envs=max(n_envs, workers),
+                                   workers=workers, fee=fee,
+                                   episode_length=episode_length, seed=seed,
+                                   **feature_kwargs)
+    elif n_envs > 1 or episode_length is not None:
+        env = VecTradingEnv(data, num_envs=n_envs, fee=fee,
+                            episode_length=episode_length, seed=seed,
+                            **feature_kwargs)
+    else:
+        env = DummyVecEnv([lambda: TradingEnv(data, fee=fee,
+                                              **feature_kwargs)])
+    try:
+        model = PPO("MlpPolicy", env, verbose=0, seed=seed,
+                    **(ppo_kwargs or {}))
+        model.learn(total_timesteps=timesteps)
+    finally:
+        env.close()
+    return model
 
 
 def train(data_path: str, timesteps: int = 10_000,
-          model_path: str = "ppo_trading") -> None:
+          model_path: str = "ppo_trading", n_envs: int = 1,
+          episode_length: Optional[int] = None, workers: int = 1,
+          vec_mode: Optional[str] = None, seed: Optional[int] = None,
+          start: TimeLike = None,
+          end: TimeLike = None, fee: float = 0.001,
+          ppo_kwargs: Optional[Dict[str, Any]] = None,
+          policy_path: Optional[str] = None,
+          features: Optional[FeaturePipeline] = None,
+          window: int = 1) -> None:
     """Train a PPO agent on the :class:`TradingEnv`.
 
     Parameters
@@ -32,15 +134,119 @@ def train(data_path: str, timesteps: int = 10_000,
         Number of timesteps to train for.
     model_path: str
         Location where the trained model will be saved.
+    n_envs: int
+        Number of parallel episodes.  Values above one use the batched
+        :class:`VecTradingEnv` instead of a ``DummyVecEnv``.
+    episode_length: int, optional
+        Steps per episode for the batched environment.  Episodes start at
+        random offsets when given and span the full dataset otherwise.
+    workers: int
+        Number of environment worker processes for subprocess stepping.
+        ``n_envs`` is raised to at least ``workers``.
+    vec_mode: str, optional
+        ``"inprocess"`` to step all episodes in the training process or
+        ``"subprocess"`` to step them in worker processes that share the price
+        data.  Defaults to ``"subprocess"`` when ``workers`` is above one.
+    seed: int, optional
+        Seed for the policy and for the episode offsets of every worker.
+    start, end: optional
+        Time range ``[start, end)`` of the data to train on.
+    fee: float
+        Proportional trading fee assumed by the environment.
+    ppo_kwargs: dict, optional
+        Extra keyword arguments for :class:`~stable_baselines3.PPO`.
+    policy_path: str, optional
+        Also export the policy for NumPy-only inference to this ``.npz``
+        file, see :mod:`rl.policy_engine`.
+    features: FeaturePipeline, optional
+        Observe the last ``window`` rows of these precomputed features
+        instead of the price, see :class:`TradingEnv`.  The model must be
+        evaluated with the same pipeline and window.
+    window: int
+        Lookback window length used with ``features``.
+    """
+    check_vec_mode(workers, vec_mode)
+    data = load_data(data_path, start, end)
+    model = train_model(data, timesteps=timesteps, n_envs=n_envs,
+                        episode_length=episode_length, workers=workers,
+                        vec_mode=vec_mode, seed=seed, fee=fee,
+                        ppo_kwargs=ppo_kwargs, features=features,
+                        window=window)
+    model.save(model_path)
+    if policy_path is not None:
+        from .policy_engine import export_policy
+
+        export_policy(model, policy_path)
+
+
+def train_portfolio(bank_path: str, timesteps: int = 10_000,
+                    model_path: str = "ppo_portfolio", n_assets: int = 8,
+                    n_envs: int = 1, episode_length: int = 256,
+                    workers: int = 1, seed: Optional[int] = None,
+                    fee: float = 0.001, action_mode: str = "weights",
+                    ppo_kwargs: Optional[Dict[str, Any]] = None) -> None:
+    """Train a PPO agent on a :class:`~rl.portfolio_env.PortfolioEnv`.
+
+    Parameters
+    ----------
+    bank_path: str
+        Symbol bank directory, see :mod:`rl.symbol_bank`.
+    n_assets: int
+        Symbols sampled per episode.
+    n_envs: int
+        Number of parallel episodes.
+    workers: int
+        Above one, every episode steps in its own ``SubprocVecEnv`` process
+        (``n_envs`` is raised to at least ``workers``).  Workers open the
+        bank by path, so no prices are sent to them.
+    action_mode: str
+        ``"weights"`` or ``"orders"``.
+
+    The remaining parameters are as for :func:`train`.
     """
-    data = load_data(data_path)
-    env = DummyVecEnv([lambda: TradingEnv(data)])
-    model = PPO("MlpPolicy", env, verbose=0)
-    model.learn(total_timesteps=timesteps)
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+    from .portfolio_env import PortfolioEnv
+
+    def make(rank: int):
+        env_seed = None if seed is None else seed + rank
+        return lambda: PortfolioEnv(bank_path, n_assets=n_assets,
+                                    episode_length=episode_length, fee=fee,
+                                    action_mode=action_mode, seed=env_seed)
+
+    factories = [make(rank) for rank in range(max(n_envs, workers))]
+    if workers > 1:
+        env = SubprocVecEnv(factories)
+    else:
+        env = DummyVecEnv(factories)
+    try:
+        model = PPO("MlpPolicy", env, verbose=0, seed=seed,
+                    **(ppo_kwargs or {}))
+        model.learn(total_timesteps=timesteps)
+    finally:
+        env.close()
     model.save(model_path)
 
 
-def run_inference(data_path: str, model_path: str = "ppo_trading") -> float:
+def load_model(model_path: str) -> Any:
+    """Load a saved PPO model, or a NumPy policy from an ``.npz`` export.
+
+    Both provide the ``predict(obs, deterministic)`` method used by the
+    evaluation and trading code.
+    """
+    if model_path.endswith(".npz"):
+        from .policy_engine import PolicyEngine
+
+        return PolicyEngine.load(model_path)
+    from stable_baselines3 import PPO
+
+    return PPO.load(model_path)
+
+
+def run_inference(data_path: str, model_path: str = "ppo_trading",
+                  start: TimeLike = None,
+                  end: TimeLike = None) -> float:
     """Run inference using a trained model.
 
     Parameters
@@ -48,21 +254,67 @@ def run_inference(data_path: str, model_path: str = "ppo_trading") -> float:
     data_path: str
         Path to CSV file with market data.
     model_path: str
-        Path to the saved model.
+        Path to the saved model or an exported ``.npz`` policy.
+    start, end: optional
+        Time range ``[start, end)`` of the data to run on.
 
     Returns
     -------
     float
         Final portfolio value after running the agent on the dataset.
     """
-    data = load_data(data_path)
-    env = TradingEnv(data)
-    model = PPO.load(model_path)
+    from .evaluate import evaluate
+
+    data = load_data(data_path, start, end)
+    model = load_model(model_path)
+    results = evaluate(model, [data], deterministic=False)
+    return float(results["final_value"].iloc[0])
+
 
-    obs = env.reset()
-    done = False
-    while not done:
-        action, _ = model.predict(obs)
-        obs, _, done, info = env.step(int(action))
+def evaluate_models(data_paths: Sequence[str], model_paths: Sequence[str],
+                    slice_length: Optional[int] = None,
+                    stride: Optional[int] = None, deterministic: bool = False,
+                    start: TimeLike = None, end: TimeLike = None,
+                    features: Optional[FeaturePipeline] = None,
+                    window: int = 1) -> pd.DataFrame:
+    """Backtest several models on several datasets or time slices.
+
+    All runs of a model advance in lockstep with one batched ``predict`` call
+    per step, see :func:`rl.evaluate.evaluate`.
+
+    Parameters
+    ----------
+    data_paths: Sequence[str]
+        CSV files or data store directories.
+    model_paths: Sequence[str]
+        Saved models or exported ``.npz`` policies.
+    slice_length: int, optional
+        Split every dataset into slices of this many rows.
+    stride: int, optional
+        Rows between slice starts; defaults to ``slice_length``.
+    deterministic: bool
+        Whether the policies act deterministically; off by default, as for
+        ``python -m rl.infer`` without ``--deterministic``.
+    start, end: optional
+        Time range ``[start, end)`` applied to every dataset.
+    features, window: optional
+        Feature pipeline and lookback window the models were trained with.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Results table with one row per model and dataset (or slice).
+    """
+    from .evaluate import evaluate, time_slices
 
-    return float(info["portfolio_value"])
+    datasets = {}
+    for path in data_paths:
+        data = load_data(path, start, end)
+        if slice_length is None:
+            datasets[path] = data
+            continue
+        for i, part in enumerate(time_slices(data, slice_length, stride)):
+            datasets[f"{path}[{i}]"] = part
+    models = {path: load_model(path) for path in model_paths}
+    return evaluate(models, datasets, deterministic=deterministic,
+                    features=features, window=window)
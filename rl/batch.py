@@ -0,0 +1,204 @@
+"""Batched trading accounting shared by the vectorized environments.
+
+:class:`TradingBatch` holds the state of many :class:`~rl.env.TradingEnv`
+style episodes in NumPy arrays and advances all of them at once.  It only
+depends on NumPy so that subprocess workers can host a batch without
+importing Stable-Baselines3 or torch.
+"""
+from __future__ import annotations
+
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+SeedLike = Union[None, int, np.random.SeedSequence]
+
+
+def apply_actions(balance: np.ndarray, holdings: np.ndarray,
+                  price: np.ndarray, actions: np.ndarray, fee: float,
+                  idx: Optional[np.ndarray] = None
+                  ) -> Tuple[np.ndarray, np.ndarray]:
+    """Apply hold/buy/sell ``actions`` in place, as :class:`TradingEnv` does.
+
+    ``price`` and ``actions`` are aligned with the rows ``idx`` of
+    ``balance`` and ``holdings``, or with the whole arrays when ``idx`` is
+    ``None``.
+
+    Returns
+    -------
+    tuple
+        Rows that bought a positive quantity and rows that sold a positive
+        holding.
+    """
+    bought = sold = np.empty(0, dtype=np.int64)
+
+    buy = np.flatnonzero(actions == 1)
+    if buy.size:
+        rows = buy if idx is None else idx[buy]
+        cash = balance[rows]
+        buy_price = price[buy]
+        qty = cash / buy_price
+        cost = qty * buy_price * (1 + fee)
+        ok = cost <= cash
+        filled = rows[ok]
+        balance[filled] -= cost[ok]
+        holdings[filled] += qty[ok]
+        bought = filled[qty[ok] > 0]
+
+    sell = np.flatnonzero(actions == 2)
+    if sell.size:
+        rows = sell if idx is None else idx[sell]
+        held = holdings[rows]
+        sold = rows[held > 0]
+        balance[rows] += held * price[sell] * (1 - fee)
+        holdings[rows] = 0.0
+
+    return bought, sold
+
+
+class TradingBatch:
+    """State and step logic for ``num_envs`` parallel trading episodes.
+
+    Parameters
+    ----------
+    prices: numpy.ndarray
+        One dimensional ``float64`` price series.  It is used as is, so a view
+        into shared or memory-mapped memory is never copied.
+    num_envs: int
+        Number of parallel episodes.
+    initial_balance: float
+        Starting cash balance of every episode.
+    fee: float
+        Proportional trading fee.
+    episode_length: int, optional
+        Number of steps per episode.  By default every episode runs over the
+        full series from the first price.  When given, each episode starts at
+        a random offset into the series.
+    seed: int or numpy.random.SeedSequence, optional
+        Seed for the random episode offsets.
+    features: numpy.ndarray, optional
+        Precomputed ``(len(prices), n_features)`` matrix from
+        :meth:`~rl.features.FeaturePipeline.transform`.  When given, the
+        observation holds the last ``window`` feature rows instead of the
+        price, and episodes start no earlier than step ``window - 1``.
+    window: int
+        Lookback window length used with ``features``.
+    """
+
+    def __init__(self, prices: np.ndarray, num_envs: int,
+                 initial_balance: float = 1000.0, fee: float = 0.001,
+                 episode_length: Optional[int] = None, seed: SeedLike = None,
+                 features: Optional[np.ndarray] = None, window: int = 1):
+        if prices.ndim != 1 or len(prices) < 2:
+            raise ValueError("data must contain at least two prices")
+        if num_envs < 1:
+            raise ValueError("num_envs must be positive")
+        if features is None:
+            window = 1
+        elif len(features) != len(prices):
+            raise ValueError("features must have one row per price")
+        if not 1 <= window < len(prices):
+            raise ValueError("window must be between 1 and len(prices) - 1")
+
+        self._first_step = window - 1
+        max_length = len(prices) - 1 - self._first_step
+        if episode_length is None:
+            episode_length = max_length
+        if not 1 <= episode_length <= max_length:
+            raise ValueError(
+                f"episode_length must be between 1 and {max_length}")
+
+        self.prices = prices
+        self.features = features
+        self.window = window
+        if features is not None:
+            self._windows = sliding_window_view(
+                features, window, axis=0).transpose(0, 2, 1)
+            self.obs_size = window * features.shape[1] + 2
+        else:
+            self._windows = None
+            self.obs_size = 3
+        self.num_envs = num_envs
+        self.initial_balance = initial_balance
+        self.fee = fee
+        self.episode_length = episode_length
+        self._max_start = max_length - episode_length
+        self.seed(seed)
+
+        self.balance = np.full(num_envs, float(initial_balance))
+        self.holdings = np.zeros(num_envs)
+        self.start = np.zeros(num_envs, dtype=np.int64)
+        self.current_step = np.zeros(num_envs, dtype=np.int64)
+
+    def seed(self, seed: SeedLike = None) -> None:
+        """Reseed the generator used for episode offsets."""
+        self._rng = np.random.default_rng(seed)
+
+    def _reset_envs(self, idx: np.ndarray) -> None:
+        self.balance[idx] = self.initial_balance
+        self.holdings[idx] = 0.0
+        start = self._first_step
+        if self._max_start:
+            start += self._rng.integers(0, self._max_start + 1, size=len(idx))
+        self.start[idx] = start
+        self.current_step[idx] = start
+
+    def _fill_obs(self, obs: np.ndarray, idx) -> None:
+        step = self.current_step[idx]
+        if self._windows is None:
+            obs[:, 0] = self.prices[step]
+        else:
+            obs[:, :-2] = self._windows[step - self._first_step].reshape(
+                len(obs), -1)
+        obs[:, -2] = self.balance[idx]
+        obs[:, -1] = self.holdings[idx]
+
+    def _get_obs(self) -> np.ndarray:
+        obs = np.empty((self.num_envs, self.obs_size), dtype=np.float32)
+        self._fill_obs(obs, slice(None))
+        return obs
+
+    def reset(self) -> np.ndarray:
+        """Reset every episode and return the ``(num_envs, obs_size)`` batch."""
+        self._reset_envs(np.arange(self.num_envs))
+        return self._get_obs()
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray,
+                                                 np.ndarray, np.ndarray,
+                                                 np.ndarray, np.ndarray]:
+        """Apply ``actions`` to every episode.
+
+        Finished episodes are reset immediately, so the returned observations
+        always belong to running episodes.
+
+        Returns
+        -------
+        tuple
+            ``(obs, rewards, dones, values, done_idx, terminal_obs)`` where
+            ``values`` holds the portfolio value after the step and
+            ``terminal_obs`` the final observation of each episode listed in
+            ``done_idx``.
+        """
+        balance, holdings = self.balance, self.holdings
+        price = self.prices[self.current_step]
+        prev_value = balance + holdings * price
+
+        apply_actions(balance, holdings, price, actions, self.fee)
+
+        self.current_step += 1
+        dones = self.current_step >= self.start + self.episode_length
+
+        next_price = self.prices[self.current_step]
+        values = balance + holdings * next_price
+        rewards = (values - prev_value).astype(np.float32)
+
+        obs = self._get_obs()
+        done_idx = np.flatnonzero(dones)
+        terminal_obs = obs[done_idx]
+        if done_idx.size:
+            self._reset_envs(done_idx)
+            reset_obs = terminal_obs.copy()
+            self._fill_obs(reset_obs, done_idx)
+            obs[done_idx] = reset_obs
+        return obs, rewards, dones, values, done_idx, terminal_obs
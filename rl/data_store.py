@@ -0,0 +1,484 @@
+"""Columnar binary market-data store with memory-mapped reads.
+
+A :class:`MarketDataStore` is a directory holding one raw little-endian
+binary file per column plus a ``manifest.json`` describing the column dtypes,
+the row count, the optional time index and the source the data was built
+from.  Columns are opened with :class:`numpy.memmap`, so loading is
+independent of file size and processes reading the same store share the page
+cache instead of holding private copies.
+
+:func:`load_csv` converts a CSV file into a store next to it on first use and
+memory-maps the store afterwards.  The cache is rebuilt when the CSV's
+content hash changes.  Time-range reads binary-search the sorted time index
+and only touch the pages of the requested rows.  A ``timestamp`` column that
+is unsorted, not made of dates, or numeric (the epoch unit is unknown) is
+stored as parsed and left unindexed, and time ranges then filter rows the way
+the uncached path does.
+
+A write builds the new store in a sibling temporary directory and swaps it
+in, so readers never see a half-written store and memory maps of the old
+column files stay valid.
+
+Command line usage::
+
+    python -m rl.data_store prices.csv            # build/refresh and time loads
+    python -m rl.data_store prices.csv --start 2023-01-01 --end 2023-02-01
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+import warnings
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 2
+TIME_COLUMN = "timestamp"
+
+TimeLike = Union[str, int, np.datetime64, pd.Timestamp, None]
+
+
+@dataclass
+class LoadStats:
+    """Timing of the last :func:`load_csv` call."""
+
+    path: str
+    cold: bool
+    seconds: float
+    rows: int
+
+
+last_load: Optional[LoadStats] = None
+
+
+def file_sha256(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    """Return the hex SHA-256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _to_ns(value: TimeLike) -> Optional[int]:
+    if value is None:
+        return None
+    return int(pd.Timestamp(value).value)
+
+
+class MarketDataStore:
+    """Directory of memory-mappable column files.
+
+    Parameters
+    ----------
+    path: str or Path
+        Store directory.  It is created on the first write.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._manifest: Optional[Dict[str, Any]] = None
+
+    # ------------------------------------------------------------------
+    # Manifest
+    # ------------------------------------------------------------------
+    @property
+    def manifest(self) -> Dict[str, Any]:
+        if self._manifest is None:
+            with open(self.path / MANIFEST) as fh:
+                self._manifest = json.load(fh)
+        return self._manifest
+
+    def exists(self) -> bool:
+        return (self.path / MANIFEST).exists()
+
+    @property
+    def rows(self) -> int:
+        return int(self.manifest["rows"])
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.manifest["columns"])
+
+    @property
+    def index_column(self) -> Optional[str]:
+        return self.manifest.get("index")
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp = self.path / (MANIFEST + ".tmp")
+        with open(tmp, "w") as fh:
+            json.dump(manifest, fh, indent=2)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.path / MANIFEST)
+        self._manifest = manifest
+
+    def _column_path(self, name: str) -> Path:
+        return self.path / f"{name}.bin"
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _time_index(series: pd.Series, unit: Optional[str]) -> np.ndarray:
+        """Return ``series`` as ``int64`` UTC nanoseconds."""
+        if pd.api.types.is_numeric_dtype(series) and unit is None:
+            raise ValueError(f"time column {series.name!r} is numeric; "
+                             "pass its epoch unit")
+        try:
+            with warnings.catch_warnings():
+                # Columns that are not dates warn before they fail.
+                warnings.simplefilter("ignore", UserWarning)
+                times = pd.to_datetime(series, unit=unit, utc=True)
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"time column {series.name!r} does not hold "
+                             f"dates: {exc}") from None
+        return times.dt.tz_convert(None).to_numpy(
+            "datetime64[ns]").view(np.int64)
+
+    @classmethod
+    def _columns_of(cls, frame: pd.DataFrame, index: Optional[str],
+                    unit: Optional[str] = None) -> Dict[str, np.ndarray]:
+        arrays: Dict[str, np.ndarray] = {}
+        for name in frame.columns:
+            series = frame[name]
+            if name == index:
+                values = cls._time_index(series, unit)
+            elif pd.api.types.is_bool_dtype(series):
+                values = series.to_numpy(np.bool_)
+            elif pd.api.types.is_numeric_dtype(series):
+                values = series.to_numpy()
+            else:
+                values = series.astype(str).to_numpy(np.str_)
+            arrays[str(name)] = np.ascontiguousarray(
+                values, dtype=values.dtype.newbyteorder("<"))
+        return arrays
+
+    def write(self, frame: pd.DataFrame, index: Optional[str] = TIME_COLUMN,
+              source: Optional[Dict[str, Any]] = None,
+              unit: Optional[str] = None) -> None:
+        """Replace the store contents with ``frame``.
+
+        The new store is written to a temporary directory next to
+        :attr:`path` and swapped in once complete.
+
+        Parameters
+        ----------
+        frame:
+            Data to store.  Numeric and boolean columns keep their dtype,
+            other columns are stored as fixed width strings.
+        index:
+            Name of the time column.  It is stored as ``int64`` UTC
+            nanoseconds and must be sorted.  Ignored when ``frame`` has no
+            such column.
+        source:
+            Free-form description of where the data came from, kept in the
+            manifest.
+        unit:
+            Epoch unit (``"s"``, ``"ms"``, ...) of a numeric time column.
+            A numeric time column without it is rejected rather than
+            guessed.
+
+        Raises
+        ------
+        ValueError
+            If the time column is unsorted, holds no dates or is numeric
+            without ``unit``; write with ``index=None`` to store it as is.
+        """
+        if index not in frame.columns:
+            index = None
+        arrays = self._columns_of(frame, index, unit)
+        if index is not None and np.any(np.diff(arrays[index]) < 0):
+            raise ValueError(f"time column {index!r} must be sorted")
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        staging = MarketDataStore(self.path.with_name(
+            f"{self.path.name}.tmp-{uuid.uuid4().hex}"))
+        try:
+            staging.path.mkdir()
+            for name, values in arrays.items():
+                values.tofile(staging._column_path(name))
+            staging._write_manifest({
+                "version": FORMAT_VERSION,
+                "rows": len(frame),
+                "columns": {name: v.dtype.str for name, v in arrays.items()},
+                "index": index,
+                "unit": unit,
+                "source": source or {},
+            })
+            self._swap_in(staging.path)
+        finally:
+            shutil.rmtree(staging.path, ignore_errors=True)
+        self._manifest = staging.manifest
+
+    def _swap_in(self, staging: Path, attempts: int = 5) -> None:
+        """Replace :attr:`path` with the directory ``staging``.
+
+        A directory can only be renamed onto a missing or empty one, so the
+        current store is moved aside first and deleted afterwards; files of
+        it that are memory-mapped elsewhere stay readable until unmapped.
+        """
+        for _ in range(attempts):
+            retired = self.path.with_name(
+                f"{self.path.name}.old-{uuid.uuid4().hex}")
+            try:
+                os.replace(self.path, retired)
+            except FileNotFoundError:
+                retired = None
+            try:
+                os.replace(staging, self.path)
+            except OSError:
+                # Most likely another writer swapped its store in between the
+                # renames; otherwise put the current store back.
+                if retired is not None:
+                    try:
+                        os.replace(retired, self.path)
+                    except OSError:
+                        shutil.rmtree(retired, ignore_errors=True)
+                continue
+            if retired is not None:
+                shutil.rmtree(retired, ignore_errors=True)
+            return
+        raise OSError(f"could not replace {self.path}")
+
+    def append(self, frame: pd.DataFrame) -> None:
+        """Append rows with the same columns to the store.
+
+        Column files are extended first and the manifest is replaced last, so
+        an interrupted append leaves the previous rows intact; stray bytes are
+        truncated by the next append.
+        """
+        if not self.exists():
+            raise FileNotFoundError(f"no store at {self.path}")
+        if not len(frame):
+            return
+        index = self.index_column
+        arrays = self._columns_of(frame[self.columns], index,
+                                  self.manifest.get("unit"))
+        if index is not None:
+            new_index = arrays[index]
+            last = self.last_timestamp()
+            if np.any(np.diff(new_index) < 0) or (
+                    last is not None and new_index[0] <= last):
+                raise ValueError("appended rows must extend the time index")
+
+        manifest = dict(self.manifest)
+        dtypes = dict(manifest["columns"])
+        rows = self.rows
+        for name, values in arrays.items():
+            dtype = np.dtype(dtypes[name])
+            if values.dtype.kind == "U" and dtype.kind == "U":
+                if values.dtype.itemsize > dtype.itemsize:
+                    raise ValueError(
+                        f"strings in column {name!r} exceed the stored width")
+            values = values.astype(dtype, copy=False)
+            with open(self._column_path(name), "r+b") as fh:
+                fh.truncate(rows * dtype.itemsize)
+                fh.seek(0, os.SEEK_END)
+                values.tofile(fh)
+                fh.flush()
+                os.fsync(fh.fileno())
+        manifest["rows"] = rows + len(frame)
+        self._write_manifest(manifest)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def column(self, name: str) -> np.ndarray:
+        """Return a read-only memory map of ``name``."""
+        dtype = np.dtype(self.manifest["columns"][name])
+        if self.rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._column_path(name), dtype=dtype, mode="r",
+                         shape=(self.rows,))
+
+    def last_timestamp(self) -> Optional[int]:
+        """Return the last time index value in nanoseconds, if any."""
+        if self.index_column is None or self.rows == 0:
+            return None
+        return int(self.column(self.index_column)[-1])
+
+    def row_range(self, start: TimeLike = None,
+                  end: TimeLike = None) -> Tuple[int, int]:
+        """Return the ``[lo, hi)`` rows with ``start <= time < end``."""
+        lo, hi = 0, self.rows
+        if start is None and end is None:
+            return lo, hi
+        if self.index_column is None:
+            raise ValueError("store has no time index to slice by")
+        times = self.column(self.index_column)
+        if start is not None:
+            lo = int(np.searchsorted(times, _to_ns(start), side="left"))
+        if end is not None:
+            hi = int(np.searchsorted(times, _to_ns(end), side="left"))
+        return lo, max(lo, hi)
+
+    def read(self, start: TimeLike = None, end: TimeLike = None,
+             columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Return rows with ``start <= time < end`` as a DataFrame.
+
+        Numeric columns of the frame are views of the memory maps; the time
+        column is returned as ``datetime64[ns]``.
+        """
+        lo, hi = self.row_range(start, end)
+        names = list(columns) if columns is not None else self.columns
+        data = {}
+        for name in names:
+            values = self.column(name)[lo:hi]
+            if name == self.index_column:
+                values = values.view("datetime64[ns]")
+            data[name] = values
+        return pd.DataFrame(data, copy=False)
+
+
+def parse_times(frame: pd.DataFrame,
+                time_column: str = TIME_COLUMN) -> pd.DataFrame:
+    """Convert ``time_column`` of a parsed CSV the way the store reads it.
+
+    Sorted dates become naive UTC ``datetime64[ns]``, as returned by
+    :meth:`MarketDataStore.read`; numeric, unsorted or non-date columns are
+    left as parsed.  ``frame`` is modified in place and returned.
+    """
+    if time_column not in frame.columns:
+        return frame
+    try:
+        times = MarketDataStore._time_index(frame[time_column], None)
+    except ValueError:
+        return frame
+    if not np.any(np.diff(times) < 0):
+        frame[time_column] = times.view("datetime64[ns]")
+    return frame
+
+
+def _slice_frame(frame: pd.DataFrame, start: TimeLike, end: TimeLike,
+                 time_column: str) -> pd.DataFrame:
+    if start is None and end is None:
+        return frame
+    if time_column not in frame.columns:
+        raise ValueError("data has no time column to slice by")
+    times = pd.to_datetime(frame[time_column], utc=True).dt.tz_convert(None)
+    mask = np.ones(len(frame), dtype=bool)
+    if start is not None:
+        mask &= (times >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (times < pd.Timestamp(end)).to_numpy()
+    return frame[mask].reset_index(drop=True)
+
+
+def _source_info(csv_path: Path, stat: os.stat_result) -> Dict[str, Any]:
+    return {"path": str(csv_path.resolve()), "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns}
+
+
+def _cache_is_fresh(store: MarketDataStore, csv_path: Path) -> bool:
+    if not store.exists() or store.manifest.get("version") != FORMAT_VERSION:
+        return False
+    cached = store.manifest.get("source", {})
+    stat = csv_path.stat()
+    if (cached.get("size"), cached.get("mtime_ns")) == (stat.st_size,
+                                                        stat.st_mtime_ns):
+        return True
+    # The file was touched; only rebuild if its content really changed.
+    if cached.get("size") != stat.st_size:
+        return False
+    if cached.get("sha256") != file_sha256(csv_path):
+        return False
+    manifest = dict(store.manifest)
+    manifest["source"] = {**cached, **_source_info(csv_path, stat)}
+    store._write_manifest(manifest)
+    return True
+
+
+def default_cache_dir(csv_path: Union[str, Path]) -> Path:
+    """Return the store directory used for ``csv_path`` by default."""
+    csv_path = Path(csv_path)
+    return csv_path.with_name(csv_path.name + ".cache")
+
+
+def load_csv(csv_path: Union[str, Path], start: TimeLike = None,
+             end: TimeLike = None, cache_dir: Union[str, Path, None] = None,
+             time_column: str = TIME_COLUMN) -> pd.DataFrame:
+    """Load a CSV through its columnar cache.
+
+    The first call parses the CSV and writes a :class:`MarketDataStore` to
+    ``cache_dir`` (``<csv>.cache`` by default); later calls memory-map it.
+    The timing of the call is kept in :data:`last_load` and logged.
+
+    Parameters
+    ----------
+    csv_path:
+        Source CSV file.
+    start, end:
+        Optional time range ``[start, end)`` on ``time_column``.
+    cache_dir:
+        Store directory.
+    time_column:
+        Name of the time column used as index, if present.  It is only
+        indexed when it holds sorted dates; otherwise it is kept as parsed
+        and ``start``/``end`` filter rows like :func:`_slice_frame`.
+    """
+    global last_load
+    began = time.perf_counter()
+    csv_path = Path(csv_path)
+    store = MarketDataStore(cache_dir or default_cache_dir(csv_path))
+    cold = not _cache_is_fresh(store, csv_path)
+    frame = None
+    if cold:
+        stat = csv_path.stat()
+        source = _source_info(csv_path, stat)
+        source["sha256"] = file_sha256(csv_path)
+        parsed = pd.read_csv(csv_path)
+        try:
+            try:
+                store.write(parsed, index=time_column, source=source)
+            except ValueError as exc:
+                logger.info("not indexing %s by time: %s", csv_path, exc)
+                store.write(parsed, index=None, source=source)
+        except OSError as exc:
+            logger.warning("cannot write cache %s: %s", store.path, exc)
+            frame = _slice_frame(parse_times(parsed, time_column), start,
+                                 end, time_column)
+    if frame is None:
+        if store.index_column is None and (start is not None
+                                           or end is not None):
+            frame = _slice_frame(store.read(), start, end, time_column)
+        else:
+            frame = store.read(start, end)
+    seconds = time.perf_counter() - began
+    last_load = LoadStats(str(csv_path), cold, seconds, len(frame))
+    logger.info("%s load of %s: %d rows in %.3fs",
+                "cold" if cold else "warm", csv_path, len(frame), seconds)
+    return frame
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Build the columnar cache of a CSV and report load times")
+    parser.add_argument("data", help="Path to CSV file with market data")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Store directory (default: <data>.cache)")
+    parser.add_argument("--start", default=None, help="Start of time range")
+    parser.add_argument("--end", default=None, help="End of time range")
+    args = parser.parse_args()
+    for _ in range(2):
+        load_csv(args.data, args.start, args.end, cache_dir=args.cache_dir)
+        stats = last_load
+        print(f"{'cold' if stats.cold else 'warm'} load: {stats.rows} rows "
+              f"in {stats.seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
+from typing import Optional
+
 import gym
 from gym import spaces
 import numpy as np
 import pandas as pd
 
+from analytics import metrics
+
+from .features import FeaturePipeline
+
 class TradingEnv(gym.Env):
     """A simple trading environment for reinforcement learning.
 
@@ -15,37 +21,81 @@ class TradingEnv(gym.Env):
     * 2 - sell all holdings
 
     Rewards are the change in portfolio value across timesteps.
+
+    The ``price`` column is copied once into a contiguous ``float64`` array at
+    construction so that :meth:`step` and :meth:`reset` never touch ``pandas``.
+    Observations are written into a preallocated buffer which is overwritten by
+    the next call to :meth:`step` or :meth:`reset`; copy it if it needs to be
+    kept around.  The final observation of an episode is returned as a copy,
+    since vectorised environments keep it (as ``terminal_observation``)
+    across the automatic reset that follows.
+
+    When a :class:`~rl.features.FeaturePipeline` is given, the price in the
+    observation is replaced by the last ``window`` rows of the precomputed
+    feature matrix (flattened, oldest first), followed by balance and
+    holdings.  Episodes then start at step ``window - 1`` so that the first
+    window is complete.
     """
 
     metadata = {"render.modes": ["human"]}
 
     def __init__(self, data: pd.DataFrame, initial_balance: float = 1000.0,
-                 fee: float = 0.001):
+                 fee: float = 0.001,
+                 features: Optional[FeaturePipeline] = None, window: int = 1):
         super().__init__()
         if "price" not in data.columns:
             raise ValueError("data must contain a 'price' column")
         self.data = data.reset_index(drop=True)
         self.initial_balance = initial_balance
         self.fee = fee
+        self.prices = np.ascontiguousarray(self.data["price"].to_numpy(),
+                                           dtype=np.float64)
+        self._last_step = len(self.prices) - 1
 
         # Action space: hold, buy, sell
         self.action_space = spaces.Discrete(3)
-        # Observation: price, balance, holdings
-        self.observation_space = spaces.Box(low=0.0, high=np.inf, shape=(3,),
-                                            dtype=np.float32)
+        if features is None:
+            self.features = None
+            self._windows = None
+            self._first_step = 0
+            self._obs = np.empty(3, dtype=np.float32)
+            # Observation: price, balance, holdings
+            self.observation_space = spaces.Box(low=0.0, high=np.inf,
+                                                shape=(3,), dtype=np.float32)
+        else:
+            if not 1 <= window < len(self.prices):
+                raise ValueError("window must be between 1 and len(data) - 1")
+            self.features = features.transform(self.data)
+            self._windows = features.windows(self.features, window)
+            self._first_step = window - 1
+            n_features = self.features.shape[1]
+            self._obs = np.empty(window * n_features + 2, dtype=np.float32)
+            self._obs_window = self._obs[:-2].reshape(window, n_features)
+            # Observation: feature window, balance, holdings
+            self.observation_space = spaces.Box(low=-np.inf, high=np.inf,
+                                                shape=self._obs.shape,
+                                                dtype=np.float32)
 
         self.reset()
 
-    def _get_obs(self) -> np.ndarray:
-        price = float(self.data.loc[self.current_step, "price"])
-        return np.array([price, self.balance, self.holdings],
-                        dtype=np.float32)
+    def _get_obs(self, price: float) -> np.ndarray:
+        obs = self._obs
+        if self._windows is None:
+            obs[0] = price
+        else:
+            self._obs_window[...] = self._windows[
+                self.current_step - self._first_step]
+        obs[-2] = self.balance
+        obs[-1] = self.holdings
+        return obs
 
     def _portfolio_value(self, price: float) -> float:
         return self.balance + self.holdings * price
 
+    @metrics.instrumented("env.step")
     def step(self, action: int):
-        price = float(self.data.loc[self.current_step, "price"])
+        prices = self.prices
+        price = prices.item(self.current_step)
         prev_value = self._portfolio_value(price)
 
         if action == 1:  # buy
@@ -60,24 +110,26 @@ class TradingEnv(gym.Env):
             self.holdings = 0.0
 
         self.current_step += 1
-        done = self.current_step >= len(self.data) - 1
+        done = self.current_step >= self._last_step
 
-        next_price = float(self.data.loc[self.current_step, "price"])
+        next_price = prices.item(self.current_step)
         current_value = self._portfolio_value(next_price)
         reward = current_value - prev_value
 
-        obs = self._get_obs()
+        obs = self._get_obs(next_price)
+        if done:
+            obs = obs.copy()
         info = {"portfolio_value": current_value}
         return obs, reward, done, info
 
     def reset(self):  # type: ignore[override]
         self.balance = float(self.initial_balance)
         self.holdings = 0.0
-        self.current_step = 0
-        return self._get_obs()
+        self.current_step = self._first_step
+        return self._get_obs(self.prices.item(self.current_step))
 
     def render(self, mode: str = "human") -> None:
-        price = float(self.data.loc[self.current_step, "price"])
+        price = self.prices.item(self.current_step)
         value = self._portfolio_value(price)
         print(
             f"Step: {self.current_step} | Price: {price:.2f} | "
@@ -0,0 +1,164 @@
+"""Batched backtest evaluation of trained policies.
+
+:func:`evaluate` runs every model over many datasets (for example the time
+slices returned by :func:`time_slices`) in lockstep.  At each step the
+observations of all unfinished runs go through the policy as one batch, and
+the accounting is done with the same array operations as
+:class:`~rl.batch.TradingBatch`, so results match stepping a
+:class:`~rl.env.TradingEnv` per run.  Return and risk statistics come from
+the vectorized path of :class:`~analytics.performance.PerformanceMetrics`
+over each run's portfolio values, so they agree with a live tracker's
+streaming metrics.
+"""
+from __future__ import annotations
+
+from typing import Any, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from analytics import metrics
+from analytics.performance import PerformanceMetrics
+
+from .batch import apply_actions
+from .features import FeaturePipeline
+
+Data = Union[pd.DataFrame, np.ndarray]
+
+RESULT_COLUMNS = ["model", "dataset", "steps", "final_value", "total_return",
+                  "max_drawdown", "volatility", "sharpe", "sortino", "trades"]
+
+
+def time_slices(data: pd.DataFrame, length: int,
+                stride: Optional[int] = None) -> List[pd.DataFrame]:
+    """Split ``data`` into windows of ``length`` rows every ``stride`` rows.
+
+    The slices are views of ``data``; a trailing partial slice is dropped.
+    """
+    if length < 2:
+        raise ValueError("length must be at least 2")
+    stride = stride or length
+    return [data.iloc[start:start + length]
+            for start in range(0, len(data) - length + 1, stride)]
+
+
+def _named(items: Union[Mapping[str, Any], Sequence[Any]]) -> List[tuple]:
+    if isinstance(items, Mapping):
+        return [(str(name), item) for name, item in items.items()]
+    return [(str(i), item) for i, item in enumerate(items)]
+
+
+def _prices(data: Data) -> np.ndarray:
+    if isinstance(data, pd.DataFrame):
+        if "price" not in data.columns:
+            raise ValueError("data must contain a 'price' column")
+        data = data["price"].to_numpy()
+    return np.asarray(data, dtype=np.float64)
+
+
+def evaluate(models: Union[Any, Mapping[str, Any], Sequence[Any]],
+             datasets: Union[Mapping[str, Data], Sequence[Data]],
+             initial_balance: float = 1000.0, fee: float = 0.001,
+             deterministic: bool = False,
+             features: Optional[FeaturePipeline] = None,
+             window: int = 1) -> pd.DataFrame:
+    """Evaluate every model on every dataset with batched policy calls.
+
+    Parameters
+    ----------
+    models:
+        A model with a Stable-Baselines3 style ``predict(obs, deterministic)``
+        method, or a mapping/sequence of such models.
+    datasets:
+        Mapping or sequence of frames with a ``price`` column (or price
+        arrays).  Datasets may have different lengths.
+    initial_balance, fee:
+        Account settings, as for :class:`~rl.env.TradingEnv`.
+    deterministic:
+        Whether the policy acts deterministically.  Off by default, like
+        ``predict`` and ``python -m rl.infer``.
+    features, window:
+        Feature pipeline and lookback window the models were trained with,
+        see :class:`~rl.env.TradingEnv`.  ``datasets`` must then be frames.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per model and dataset with the number of steps, final
+        portfolio value, total return, maximum drawdown (as a fraction of the
+        running peak), per-step volatility, Sharpe and Sortino ratios and
+        the number of executed trades.
+    """
+    if hasattr(models, "predict"):
+        models = [models]
+    named_models = _named(models)
+    named_data = _named(datasets)
+    if not named_data:
+        raise ValueError("no datasets to evaluate")
+
+    prices = [_prices(data) for _, data in named_data]
+    first = window - 1 if features is not None else 0
+    for (name, _), series in zip(named_data, prices):
+        if len(series) < first + 2:
+            raise ValueError(f"dataset {name!r} is too short")
+    lengths = np.array([len(p) for p in prices])
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    flat_prices = np.concatenate(prices)
+    starts = offsets + first
+    lasts = offsets + lengths - 1
+
+    windows = None
+    if features is not None:
+        matrix = np.concatenate([features.transform(data)
+                                 for _, data in named_data])
+        windows = FeaturePipeline.windows(matrix, window)
+        obs_size = window * matrix.shape[1] + 2
+    else:
+        obs_size = 3
+
+    rows = []
+    n_runs = len(named_data)
+    for model_name, model in named_models:
+        step = starts.copy()
+        balance = np.full(n_runs, float(initial_balance))
+        holdings = np.zeros(n_runs)
+        values = np.empty_like(flat_prices)
+        values[starts] = balance
+        trades = np.zeros(n_runs, dtype=np.int64)
+        active = np.flatnonzero(step < lasts)
+
+        while active.size:
+            current = step[active]
+            obs = np.empty((active.size, obs_size), dtype=np.float32)
+            if windows is None:
+                obs[:, 0] = flat_prices[current]
+            else:
+                obs[:, :-2] = windows[current - first].reshape(active.size, -1)
+            obs[:, -2] = balance[active]
+            obs[:, -1] = holdings[active]
+
+            with metrics.timer("policy.predict"):
+                actions, _ = model.predict(obs, deterministic=deterministic)
+            actions = np.asarray(actions).reshape(active.size)
+            bought, sold = apply_actions(balance, holdings,
+                                         flat_prices[current], actions, fee,
+                                         idx=active)
+            trades[bought] += 1
+            trades[sold] += 1
+
+            step[active] += 1
+            values[step[active]] = (balance[active] + holdings[active]
+                                    * flat_prices[step[active]])
+            active = active[step[active] < lasts[active]]
+
+        final_value = balance + holdings * flat_prices[lasts]
+        for i, (data_name, _) in enumerate(named_data):
+            stats = PerformanceMetrics.from_history(
+                values[starts[i]:lasts[i] + 1]).summary()
+            rows.append((model_name, data_name, int(lasts[i] - starts[i]),
+                         float(final_value[i]),
+                         float(final_value[i] / initial_balance - 1.0),
+                         stats["max_drawdown"], stats["volatility"],
+                         stats["sharpe"], stats["sortino"], int(trades[i])))
+
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
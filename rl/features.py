@@ -0,0 +1,432 @@
+"""Declarative technical features for :class:`~rl.env.TradingEnv` observations.
+
+A :class:`FeaturePipeline` is built from a list of feature specs such as
+:class:`Returns`, :class:`RollingMean` or :class:`RSI`.  For training,
+:meth:`FeaturePipeline.transform` computes the whole feature matrix of a
+dataset once with vectorized ``pandas`` operations and
+:meth:`FeaturePipeline.windows` exposes lookback windows as zero-copy strided
+views into it.  For live trading, :meth:`FeaturePipeline.stream` returns a
+:class:`FeatureStream` that updates the same features in O(1) per tick.
+
+All rolling statistics use ``min_periods=1`` semantics, so the first rows are
+computed over the history available so far instead of being ``NaN``.
+
+Example
+-------
+>>> pipeline = FeaturePipeline([Returns(), RollingMean(20), RSI(14)])
+>>> matrix = pipeline.transform(data)           # (len(data), 3)
+>>> windows = pipeline.windows(matrix, 32)     # (len(data) - 31, 32, 3) view
+"""
+from __future__ import annotations
+
+import dataclasses
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class _Stream:
+    """Incremental state of a single feature."""
+
+    def update(self, x: float) -> float:
+        raise NotImplementedError
+
+
+class _Window:
+    """Fixed size sliding window with O(1) mean and variance updates.
+
+    Like ``pandas`` rolling kernels, a window of identical values reports that
+    value as its mean and a deviation of exactly zero.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values: deque = deque()
+        self._mean = 0.0
+        self.m2 = 0.0
+        self._last = None
+        self._run = 0
+
+    def push(self, x: float) -> None:
+        if x == self._last:
+            self._run += 1
+        else:
+            self._last = x
+            self._run = 1
+        values = self.values
+        if len(values) < self.size:
+            values.append(x)
+            delta = x - self._mean
+            self._mean += delta / len(values)
+            self.m2 += delta * (x - self._mean)
+            return
+        old = values.popleft()
+        values.append(x)
+        old_mean = self._mean
+        self._mean += (x - old) / self.size
+        self.m2 += (x - old) * (x - self._mean + old - old_mean)
+
+    @property
+    def constant(self) -> bool:
+        return self._run >= len(self.values)
+
+    @property
+    def mean(self) -> float:
+        return self._last if self.constant else self._mean
+
+    @property
+    def std(self) -> float:
+        if self.constant:
+            return 0.0
+        return math.sqrt(max(self.m2, 0.0) / len(self.values))
+
+
+class Feature:
+    """Base class of feature specs.
+
+    Subclasses define the input ``column``, a vectorized :meth:`compute` over a
+    full series and a :meth:`stream` factory for incremental updates.
+    """
+
+    column: str
+
+    @property
+    def name(self) -> str:
+        params = [str(v) for k, v in vars(self).items() if k != "column"]
+        return "_".join([type(self).__name__.lower(), self.column, *params])
+
+    def compute(self, series: pd.Series) -> np.ndarray:
+        raise NotImplementedError
+
+    def stream(self) -> _Stream:
+        raise NotImplementedError
+
+
+@dataclass(frozen=True)
+class Column(Feature):
+    """Raw value of ``column``."""
+
+    column: str = "price"
+
+    def compute(self, series: pd.Series) -> np.ndarray:
+        return series.to_numpy(dtype=np.float64)
+
+    def stream(self) -> _Stream:
+        return _ColumnStream()
+
+
+class _ColumnStream(_Stream):
+    def update(self, x: float) -> float:
+        return x
+
+
+@dataclass(frozen=True)
+class Returns(Feature):
+    """Simple one step return ``x[t] / x[t - 1] - 1`` (zero on the first row)."""
+
+    column: str = "price"
+
+    def compute(self, series: pd.Series) -> np.ndarray:
+        values = series.to_numpy(dtype=np.float64)
+        out = np.zeros_like(values)
+        out[1:] = values[1:] / values[:-1] - 1.0
+        return out
+
+    def stream(self) -> _Stream:
+        return _ReturnsStream()
+
+
+class _ReturnsStream(_Stream):
+    def __init__(self) -> None:
+        self.prev = None
+
+    def update(self, x: float) -> float:
+        prev, self.prev = self.prev, x
+        return 0.0 if prev is None else x / prev - 1.0
+
+
+@dataclass(frozen=True)
+class RollingMean(Feature):
+    """Mean of the last ``window`` values."""
+
+    window: int = 20
+    column: str = "price"
+
+    def compute(self, series: pd.Series) -> np.ndarray:
+        return series.rolling(self.window, min_periods=1).mean().to_numpy()
+
+    def stream(self) -> _Stream:
+        return _RollingMeanStream(self.window)
+
+
+class _RollingMeanStream(_Stream):
+    def __init__(self, window: int) -> None:
+        self.window = _Window(window)
+
+    def update(self, x: float) -> float:
+        self.window.push(x)
+        return self.window.mean
+
+
+@dataclass(frozen=True)
+class RollingStd(Feature):
+    """Population standard deviation of the last ``window`` values."""
+
+    window: int = 20
+    column: str = "price"
+
+    def compute(self, series: pd.Series) -> np.ndarray:
+        return series.rolling(self.window, min_periods=1).std(ddof=0).to_numpy()
+
+    def stream(self) -> _Stream:
+        return _RollingStdStream(self.window)
+
+
+class _RollingStdStream(_Stream):
+    def __init__(self, window: int) -> None:
+        self.window = _Window(window)
+
+    def update(self, x: float) -> float:
+        self.window.push(x)
+        return self.window.std
+
+
+@dataclass(frozen=True)
+class EMA(Feature):
+    """Exponential moving average with ``alpha = 2 / (span + 1)``."""
+
+    span: int = 20
+    column: str = "price"
+
+    def compute(self, series: pd.Series) -> np.ndarray:
+        return series.ewm(span=self.span, adjust=False).mean().to_numpy()
+
+    def stream(self) -> _Stream:
+        return _EMAStream(2.0 / (self.span + 1.0))
+
+
+class _EMAStream(_Stream):
+    def __init__(self, alpha: float) -> None:
+        self.alpha = alpha
+        self.value = None
+
+    def update(self, x: float) -> float:
+        if self.value is None:
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+@dataclass(frozen=True)
+class RSI(Feature):
+    """Relative strength index in ``[0, 100]`` with Wilder smoothing.
+
+    The index is 50 until the first price change is observed.
+    """
+
+    period: int = 14
+    column: str = "price"
+
+    def compute(self, series: pd.Series) -> np.ndarray:
+        delta = series.diff().fillna(0.0)
+        alpha = 1.0 / self.period
+        gain = delta.clip(lower=0.0).ewm(alpha=alpha, adjust=False).mean()
+        loss = (-delta).clip(lower=0.0).ewm(alpha=alpha, adjust=False).mean()
+        gain, loss = gain.to_numpy(), loss.to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100.0 - 100.0 / (1.0 + gain / loss)
+        rsi[loss == 0] = 100.0
+        rsi[(loss == 0) & (gain == 0)] = 50.0
+        return rsi
+
+    def stream(self) -> _Stream:
+        return _RSIStream(1.0 / self.period)
+
+
+class _RSIStream(_Stream):
+    def __init__(self, alpha: float) -> None:
+        self.alpha = alpha
+        self.prev = None
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def update(self, x: float) -> float:
+        delta = 0.0 if self.prev is None else x - self.prev
+        self.prev = x
+        if delta > 0:
+            self.gain += self.alpha * (delta - self.gain)
+            self.loss -= self.alpha * self.loss
+        else:
+            self.gain -= self.alpha * self.gain
+            self.loss += self.alpha * (-delta - self.loss)
+        if self.loss == 0:
+            return 50.0 if self.gain == 0 else 100.0
+        return 100.0 - 100.0 / (1.0 + self.gain / self.loss)
+
+
+@dataclass(frozen=True)
+class ZScore(Feature):
+    """Deviation from the rolling mean in units of rolling standard deviation.
+
+    Defaults to the ``volume`` column.  Rows with zero deviation map to 0.
+    """
+
+    window: int = 20
+    column: str = "volume"
+
+    def compute(self, series: pd.Series) -> np.ndarray:
+        rolling = series.rolling(self.window, min_periods=1)
+        mean = rolling.mean().to_numpy()
+        std = rolling.std(ddof=0).to_numpy()
+        values = series.to_numpy(dtype=np.float64)
+        out = np.zeros_like(values)
+        np.divide(values - mean, std, out=out, where=std > 0)
+        return out
+
+    def stream(self) -> _Stream:
+        return _ZScoreStream(self.window)
+
+
+class _ZScoreStream(_Stream):
+    def __init__(self, window: int) -> None:
+        self.window = _Window(window)
+
+    def update(self, x: float) -> float:
+        window = self.window
+        window.push(x)
+        std = window.std
+        return (x - window.mean) / std if std > 0 else 0.0
+
+
+#: Feature specs by the lower case names used in :meth:`FeaturePipeline.parse`.
+FEATURES = {cls.__name__.lower(): cls for cls in (
+    Column, Returns, RollingMean, RollingStd, EMA, RSI, ZScore)}
+
+
+class FeaturePipeline:
+    """Ordered collection of feature specs.
+
+    Parameters
+    ----------
+    features: Sequence[Feature]
+        Features in the order of the output columns.
+    """
+
+    def __init__(self, features: Sequence[Feature]):
+        if not features:
+            raise ValueError("a pipeline needs at least one feature")
+        self.features = list(features)
+
+    @classmethod
+    def parse(cls, spec: str) -> "FeaturePipeline":
+        """Build a pipeline from a comma separated spec.
+
+        Every item is a name from :data:`FEATURES` followed by its
+        parameters in field order, separated by colons, e.g.
+        ``"returns,rollingmean:20,rsi:14,zscore:20:volume"``.
+        """
+        features = []
+        for item in spec.split(","):
+            name, *args = item.strip().split(":")
+            feature = FEATURES.get(name.lower())
+            if feature is None:
+                raise ValueError(f"unknown feature {name!r}, expected one "
+                                 f"of {sorted(FEATURES)}")
+            fields = dataclasses.fields(feature)
+            if len(args) > len(fields):
+                raise ValueError(f"too many parameters for {name!r}")
+            try:
+                values = [int(arg) if field.type == "int" else arg
+                          for field, arg in zip(fields, args)]
+            except ValueError:
+                raise ValueError(f"invalid parameters for {name!r}: "
+                                 f"{item.strip()!r}") from None
+            features.append(feature(*values))
+        return cls(features)
+
+    @property
+    def names(self) -> List[str]:
+        return [feature.name for feature in self.features]
+
+    @property
+    def columns(self) -> List[str]:
+        """Input columns required by the pipeline."""
+        return sorted({feature.column for feature in self.features})
+
+    def transform(self, data: pd.DataFrame,
+                  dtype: np.dtype = np.float32) -> np.ndarray:
+        """Compute the C-contiguous ``(len(data), n_features)`` matrix."""
+        missing = [c for c in self.columns if c not in data.columns]
+        if missing:
+            raise ValueError(f"data is missing columns {missing}")
+        series: Dict[str, pd.Series] = {
+            c: data[c].astype(np.float64).reset_index(drop=True)
+            for c in self.columns
+        }
+        out = np.empty((len(data), len(self.features)), dtype=dtype)
+        for i, feature in enumerate(self.features):
+            out[:, i] = feature.compute(series[feature.column])
+        return out
+
+    @staticmethod
+    def windows(matrix: np.ndarray, window: int) -> np.ndarray:
+        """Return all lookback windows of ``matrix`` without copying.
+
+        Row ``i`` of the result is ``matrix[i:i + window]``, so the window
+        ending at timestep ``t`` is ``windows[t - window + 1]``.
+        """
+        return sliding_window_view(matrix, window, axis=0).transpose(0, 2, 1)
+
+    def stream(self, window: int = 1) -> "FeatureStream":
+        """Return an incremental feature state for live data."""
+        return FeatureStream(self, window)
+
+
+class FeatureStream:
+    """Incremental version of a :class:`FeaturePipeline`.
+
+    Each :meth:`update` costs O(1) per feature and writes into preallocated
+    buffers.  The last ``window`` feature rows are kept in a doubled ring
+    buffer, so :meth:`window` is always a contiguous view.
+    """
+
+    def __init__(self, pipeline: FeaturePipeline, window: int = 1):
+        if window < 1:
+            raise ValueError("window must be positive")
+        self.pipeline = pipeline
+        self.size = window
+        self.count = 0
+        self._streams = [(f.column, f.stream()) for f in pipeline.features]
+        n_features = len(self._streams)
+        self._buffer = np.zeros((2 * window, n_features), dtype=np.float32)
+        self._pos = 0
+
+    def update(self, values: Mapping[str, float]) -> np.ndarray:
+        """Consume one tick and return the latest feature row (a view).
+
+        Parameters
+        ----------
+        values:
+            Mapping with a value for every input column of the pipeline.
+        """
+        pos = self._pos
+        row = self._buffer[pos]
+        for i, (column, stream) in enumerate(self._streams):
+            row[i] = stream.update(float(values[column]))
+        self._buffer[pos + self.size] = row
+        self._pos = (pos + 1) % self.size
+        self.count += 1
+        return self._buffer[pos + self.size]
+
+    def window(self) -> np.ndarray:
+        """Return the last ``window`` rows, oldest first, as a view.
+
+        Rows before the first ``window`` ticks are zero.
+        """
+        return self._buffer[self._pos:self._pos + self.size]
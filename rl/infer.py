@@ -1,17 +1,76 @@
 """Command line entry point for running inference with a trained model."""
 import argparse
+from pathlib import Path
 
 from . import baseline
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Run inference with PPO model")
-    parser.add_argument("data", help="Path to CSV file with price data")
-    parser.add_argument("--model", default="ppo_trading",
-                        help="Path to the trained model")
+    parser.add_argument("data", nargs="+",
+                        help="Path(s) to CSV files with price data")
+    parser.add_argument("--model", nargs="+", default=["ppo_trading"],
+                        help="Path(s) to the trained model(s) or exported "
+                             ".npz policies")
+    parser.add_argument("--start", default=None,
+                        help="Only use rows at or after this timestamp")
+    parser.add_argument("--end", default=None,
+                        help="Only use rows before this timestamp")
+    parser.add_argument("--slice-length", type=int, default=None,
+                        help="Backtest on slices of this many rows")
+    parser.add_argument("--stride", type=int, default=None,
+                        help="Rows between slice starts (default: slice length)")
+    parser.add_argument("--features", default=None, metavar="SPEC",
+                        help="Observe precomputed features instead of the "
+                             "price, e.g. 'returns,rollingmean:20,rsi:14'")
+    parser.add_argument("--window", type=int, default=1,
+                        help="Feature rows per observation (with "
+                             "--features)")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="Use deterministic actions")
+    parser.add_argument("--metrics", nargs="?", const="-", default=None,
+                        metavar="PATH",
+                        help="Record hot-path timings and write them to PATH "
+                             "(.json or text; default: stderr) at exit")
+    parser.add_argument("--out", default=None,
+                        help="Write the results table to this CSV file")
     args = parser.parse_args()
-    value = baseline.run_inference(args.data, model_path=args.model)
-    print(f"Final portfolio value: {value:.2f}")
+    for path in args.data:
+        if not Path(path).exists():
+            parser.error(f"no such file or directory: {path}")
+    for path in args.model:
+        # Stable-Baselines3 adds the .zip suffix when saving.
+        if not (Path(path).exists() or Path(path + ".zip").exists()):
+            parser.error(f"no such model: {path}")
+    features = None
+    if args.features is not None:
+        from .features import FeaturePipeline
+
+        try:
+            features = FeaturePipeline.parse(args.features)
+        except ValueError as exc:
+            parser.error(str(exc))
+    if args.metrics:
+        from analytics import metrics
+
+        metrics.enable(args.metrics)
+
+    if (len(args.data) == 1 and len(args.model) == 1
+            and args.slice_length is None and args.out is None
+            and not args.deterministic and features is None):
+        value = baseline.run_inference(args.data[0], model_path=args.model[0],
+                                       start=args.start, end=args.end)
+        print(f"Final portfolio value: {value:.2f}")
+        return
+
+    results = baseline.evaluate_models(
+        args.data, args.model, slice_length=args.slice_length,
+        stride=args.stride, deterministic=args.deterministic,
+        start=args.start, end=args.end, features=features,
+        window=args.window)
+    if args.out:
+        results.to_csv(args.out, index=False)
+    print(results.to_string(index=False))
 
 
 if __name__ == "__main__":
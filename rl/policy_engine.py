@@ -0,0 +1,241 @@
+"""NumPy-only inference for trained ``MlpPolicy`` agents.
+
+``model.predict`` on a single observation goes through torch, gym space
+checks and Stable-Baselines3 preprocessing, which costs far more than the
+few small matrix products the policy actually consists of.
+:func:`export_policy` writes the actor of a trained PPO ``MlpPolicy``
+(the policy MLP and the action head; the value network is not needed to act)
+to a compact ``.npz`` artifact, and :class:`PolicyEngine` runs it with NumPy
+alone:
+
+* weights are float32 and stored transposed, so a layer is one
+  ``matmul(x, W, out=...)`` plus an in-place bias and activation,
+* all intermediate buffers are preallocated for ``max_batch`` observations,
+  so :meth:`PolicyEngine.act` and :meth:`PolicyEngine.act_batch` do not
+  allocate,
+* :meth:`PolicyEngine.act_batch` decides for many symbols in one pass.
+
+Deterministic actions are the argmax of the action logits, exactly as in
+``model.predict(obs, deterministic=True)`` for a ``Discrete`` action space.
+:meth:`PolicyEngine.predict` has the Stable-Baselines3 signature, so an engine
+can stand in for a model in :func:`rl.evaluate.evaluate` and
+:func:`trading.pipeline.model_policy`.  ``benchmarks/policy_latency.py``
+compares its latency with the Stable-Baselines3 path.
+
+Example
+-------
+>>> export_policy(PPO.load("ppo_trading"), "ppo_trading.npz")
+>>> engine = PolicyEngine.load("ppo_trading.npz")
+>>> engine.act(obs)
+1
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+#: Activations supported by the engine, applied in place.
+ACTIVATIONS: Dict[str, Callable[[np.ndarray], None]] = {
+    "tanh": lambda x: np.tanh(x, out=x),
+    "relu": lambda x: np.maximum(x, 0.0, out=x),
+    "identity": lambda x: None,
+}
+
+_TORCH_ACTIVATIONS = {"Tanh": "tanh", "ReLU": "relu", "Identity": "identity"}
+
+Layer = Tuple[np.ndarray, np.ndarray]
+
+
+def _policy_layers(model: Any) -> Tuple[List[Layer], List[str], Layer,
+                                        Tuple[int, ...]]:
+    """Return the actor layers, activations, action head and obs shape."""
+    from torch import nn
+
+    policy = model.policy
+    # gym or gymnasium, depending on how the model was created.
+    if type(model.action_space).__name__ != "Discrete":
+        raise ValueError("only Discrete action spaces are supported")
+    if type(policy.pi_features_extractor).__name__ != "FlattenExtractor":
+        raise ValueError("only policies with a FlattenExtractor are supported")
+
+    def numpy_linear(module: nn.Linear) -> Layer:
+        weight = module.weight.detach().cpu().numpy().astype(np.float32)
+        bias = module.bias.detach().cpu().numpy().astype(np.float32)
+        return np.ascontiguousarray(weight.T), bias
+
+    layers: List[Layer] = []
+    activations: List[str] = []
+    for module in policy.mlp_extractor.policy_net:
+        if isinstance(module, nn.Linear):
+            layers.append(numpy_linear(module))
+            activations.append("identity")
+        else:
+            name = _TORCH_ACTIVATIONS.get(type(module).__name__)
+            if name is None or not layers:
+                raise ValueError(
+                    f"unsupported policy layer {type(module).__name__}")
+            activations[-1] = name
+    head = numpy_linear(policy.action_net)
+    return layers, activations, head, tuple(model.observation_space.shape)
+
+
+class PolicyEngine:
+    """Allocation-free forward pass of an exported ``MlpPolicy`` actor.
+
+    Parameters
+    ----------
+    layers:
+        ``(weight, bias)`` per hidden layer, weights shaped ``(in, out)``.
+    activations:
+        Activation name (see :data:`ACTIVATIONS`) after each hidden layer.
+    head:
+        ``(weight, bias)`` of the action head.
+    obs_shape:
+        Shape of a single observation.
+    max_batch:
+        Largest number of observations decided in one pass; bigger batches
+        are split.
+    seed:
+        Seed for stochastic actions (``deterministic=False``).
+    """
+
+    def __init__(self, layers: Sequence[Layer], activations: Sequence[str],
+                 head: Layer, obs_shape: Sequence[int], max_batch: int = 256,
+                 seed: Optional[int] = None):
+        if len(layers) != len(activations):
+            raise ValueError("need one activation per layer")
+        unknown = set(activations) - set(ACTIVATIONS)
+        if unknown:
+            raise ValueError(f"unknown activations {sorted(unknown)}")
+        if max_batch < 1:
+            raise ValueError("max_batch must be positive")
+        as32 = lambda a: np.ascontiguousarray(a, dtype=np.float32)  # noqa: E731
+        self.layers = [(as32(w), as32(b)) for w, b in layers]
+        self.activations = list(activations)
+        self.head = (as32(head[0]), as32(head[1]))
+        self.obs_shape = tuple(int(n) for n in obs_shape)
+        self.obs_size = int(np.prod(self.obs_shape))
+        self.n_actions = self.head[0].shape[1]
+        self.max_batch = max_batch
+        self.rng = np.random.default_rng(seed)
+        self._apply = [ACTIVATIONS[a] for a in self.activations]
+        self._obs = np.empty((max_batch, self.obs_size), dtype=np.float32)
+        self._hidden = [np.empty((max_batch, w.shape[1]), dtype=np.float32)
+                        for w, _ in self.layers]
+        self._logits = np.empty((max_batch, self.n_actions), dtype=np.float32)
+        self._actions = np.empty(max_batch, dtype=np.int64)
+
+    # ------------------------------------------------------------------ artifacts
+    @classmethod
+    def from_model(cls, model: Any, **kwargs) -> "PolicyEngine":
+        """Build an engine from a trained Stable-Baselines3 PPO model."""
+        layers, activations, head, obs_shape = _policy_layers(model)
+        return cls(layers, activations, head, obs_shape, **kwargs)
+
+    def save(self, path: str) -> None:
+        """Write the weights and layout to an ``.npz`` artifact."""
+        arrays = {}
+        for i, (weight, bias) in enumerate(self.layers):
+            arrays[f"w{i}"] = weight
+            arrays[f"b{i}"] = bias
+        arrays["head_w"], arrays["head_b"] = self.head
+        meta = {"version": FORMAT_VERSION, "activations": self.activations,
+                "obs_shape": list(self.obs_shape)}
+        with open(path, "wb") as fh:
+            np.savez(fh, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "PolicyEngine":
+        """Load an artifact written by :meth:`save`."""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != FORMAT_VERSION:
+                raise ValueError(f"unsupported policy artifact {path}")
+            layers = [(data[f"w{i}"], data[f"b{i}"])
+                      for i in range(len(meta["activations"]))]
+            head = (data["head_w"], data["head_b"])
+        return cls(layers, meta["activations"], head, meta["obs_shape"],
+                   **kwargs)
+
+    # ------------------------------------------------------------------ inference
+    def _forward(self, n: int) -> np.ndarray:
+        """Return the logits of the first ``n`` rows of the obs buffer."""
+        x = self._obs[:n]
+        for (weight, bias), apply, buf in zip(self.layers, self._apply,
+                                              self._hidden):
+            out = buf[:n]
+            np.matmul(x, weight, out=out)
+            out += bias
+            apply(out)
+            x = out
+        logits = self._logits[:n]
+        np.matmul(x, self.head[0], out=logits)
+        logits += self.head[1]
+        return logits
+
+    def _choose(self, logits: np.ndarray, out: np.ndarray,
+                deterministic: bool) -> None:
+        if not deterministic:
+            # Gumbel-max: argmax(logits + G) samples softmax(logits).
+            gumbel = -np.log(-np.log(self.rng.random(logits.shape)))
+            logits = logits + gumbel
+        np.argmax(logits, axis=1, out=out)
+
+    def act(self, obs: np.ndarray, deterministic: bool = True) -> int:
+        """Return the action for a single observation."""
+        self._obs[0] = np.reshape(obs, self.obs_size)
+        out = self._actions[:1]
+        self._choose(self._forward(1), out, deterministic)
+        return int(out[0])
+
+    def act_batch(self, obs: np.ndarray,
+                  deterministic: bool = True) -> np.ndarray:
+        """Return actions for a batch of observations, one per row.
+
+        The result is a view of an internal buffer that the next call
+        overwrites when the batch fits in ``max_batch``; copy it to keep it.
+        """
+        obs = np.reshape(obs, (-1, self.obs_size))
+        n = len(obs)
+        if n > self.max_batch:
+            return np.concatenate([
+                self.act_batch(obs[i:i + self.max_batch],
+                               deterministic).copy()
+                for i in range(0, n, self.max_batch)])
+        self._obs[:n] = obs
+        out = self._actions[:n]
+        self._choose(self._forward(n), out, deterministic)
+        return out
+
+    def predict(self, observation: np.ndarray, state: Any = None,
+                episode_start: Any = None, deterministic: bool = False
+                ) -> Tuple[np.ndarray, None]:
+        """Stable-Baselines3 compatible ``predict``.
+
+        A single observation gives a 0-d action array, a batch one action
+        per row.
+        """
+        observation = np.asarray(observation)
+        actions = self.act_batch(observation, deterministic).copy()
+        if observation.shape == self.obs_shape:
+            return actions.reshape(()), None
+        return actions, None
+
+
+def export_policy(model: Any, path: str) -> PolicyEngine:
+    """Export the actor of a trained PPO ``MlpPolicy`` to ``path``.
+
+    ``model`` is a :class:`~stable_baselines3.PPO` instance or the path of a
+    saved one.  Returns the engine built from it.
+    """
+    if isinstance(model, str):
+        from stable_baselines3 import PPO
+
+        model = PPO.load(model)
+    engine = PolicyEngine.from_model(model)
+    engine.save(path)
+    return engine
@@ -0,0 +1,208 @@
+"""Multi-asset portfolio environment over a :class:`~rl.symbol_bank.SymbolBank`.
+
+Every episode trades ``n_assets`` symbols sampled from the bank, starting at
+a random row where all of them already trade.  :meth:`PortfolioEnv.reset`
+copies that episode's ``(window + episode_length + 1, n_assets)`` price block
+out of the memory-mapped bank and precomputes its log returns, and
+:meth:`PortfolioEnv.step` only does vectorized arithmetic on ``n_assets``
+long arrays, so the cost of a step does not depend on how many symbols the
+bank holds or how long their histories are.
+
+Actions, depending on ``action_mode``:
+
+* ``"weights"``: ``n_assets + 1`` non-negative scores, normalized to the
+  target weights of the assets and, last, of cash.  All zeros means cash.
+* ``"orders"``: one value in ``[-1, 1]`` per asset.  Positive values buy
+  that fraction of ``1 / n_assets`` of the portfolio value, negative values
+  sell that fraction of the holding.
+
+Rebalancing sells first; buys are scaled down together when the cash,
+including the sale proceeds, cannot pay for them.  Both sides pay ``fee``
+on the traded value.  The reward is the change in portfolio value across
+the step, as in :class:`~rl.env.TradingEnv`.
+
+The observation holds, per asset, the last ``window`` log returns (oldest
+first), then the current asset weights and the cash weight.  It is written
+into a preallocated buffer that the next :meth:`~PortfolioEnv.step` or
+:meth:`~PortfolioEnv.reset` overwrites, except for the final observation of
+an episode, which is a copy so that vectorised environments can keep it
+across the automatic reset.
+"""
+from __future__ import annotations
+
+from typing import Optional, Union
+
+import gym
+from gym import spaces
+import numpy as np
+
+from analytics import metrics
+
+from .symbol_bank import SymbolBank
+
+ACTION_MODES = ("weights", "orders")
+
+
+class PortfolioEnv(gym.Env):
+    """Portfolio of symbols sampled from a symbol bank.
+
+    Parameters
+    ----------
+    bank: SymbolBank or str
+        Bank or bank directory.
+    n_assets: int
+        Symbols traded per episode.
+    episode_length: int
+        Steps per episode.
+    window: int
+        Log returns per asset in the observation.
+    initial_balance: float
+        Starting cash.
+    fee: float
+        Fee rate on the value of every trade.
+    action_mode: str
+        ``"weights"`` or ``"orders"``, see the module docstring.
+    seed: int, optional
+        Seed of the episode sampler.
+    """
+
+    metadata = {"render.modes": ["human"]}
+
+    def __init__(self, bank: Union[SymbolBank, str], n_assets: int = 8,
+                 episode_length: int = 256, window: int = 16,
+                 initial_balance: float = 1000.0, fee: float = 0.001,
+                 action_mode: str = "weights", seed: Optional[int] = None):
+        super().__init__()
+        if action_mode not in ACTION_MODES:
+            raise ValueError(f"action_mode must be one of {ACTION_MODES}")
+        if episode_length < 1 or window < 1:
+            raise ValueError("episode_length and window must be positive")
+        self.bank = bank if isinstance(bank, SymbolBank) else SymbolBank(bank)
+        self.n_assets = n_assets
+        self.episode_length = episode_length
+        self.window = window
+        self.initial_balance = initial_balance
+        self.fee = fee
+        self.action_mode = action_mode
+        self._rows = window + episode_length + 1
+        self.rng = np.random.default_rng(seed)
+
+        k = n_assets
+        if action_mode == "weights":
+            self.action_space = spaces.Box(low=0.0, high=1.0, shape=(k + 1,),
+                                           dtype=np.float32)
+        else:
+            self.action_space = spaces.Box(low=-1.0, high=1.0, shape=(k,),
+                                           dtype=np.float32)
+        self._obs = np.empty(k * window + k + 1, dtype=np.float32)
+        self._obs_returns = self._obs[:k * window].reshape(k, window)
+        self._obs_weights = self._obs[k * window:]
+        # Observation: per-asset return windows, asset weights, cash weight
+        self.observation_space = spaces.Box(low=-np.inf, high=np.inf,
+                                            shape=self._obs.shape,
+                                            dtype=np.float32)
+        self._prices = np.empty((self._rows, k), dtype=np.float64)
+        self._returns = np.empty((k, self._rows - 1), dtype=np.float64)
+        self.holdings = np.zeros(k, dtype=np.float64)
+        self._value = np.empty(k, dtype=np.float64)
+        self.reset()
+
+    def seed(self, seed: Optional[int] = None):  # type: ignore[override]
+        self.rng = np.random.default_rng(seed)
+        return [seed]
+
+    # ------------------------------------------------------------------ helpers
+    def _portfolio_value(self, price: np.ndarray) -> float:
+        return self.balance + float(self.holdings @ price)
+
+    def _get_obs(self, price: np.ndarray, value: float) -> np.ndarray:
+        t = self.current_step
+        self._obs_returns[...] = self._returns[:, t:t + self.window]
+        weights = self._obs_weights
+        np.multiply(self.holdings, price, out=self._value)
+        np.divide(self._value, value, out=weights[:-1])
+        weights[-1] = self.balance / value
+        return self._obs
+
+    def _trades(self, action, price: np.ndarray, value: float) -> np.ndarray:
+        """Value to buy (positive) or sell (negative) of every asset."""
+        action = np.asarray(action, dtype=np.float64)
+        held = np.multiply(self.holdings, price, out=self._value)
+        if self.action_mode == "weights":
+            scores = np.maximum(action, 0.0)
+            total = scores.sum()
+            if total <= 0.0:
+                return -held
+            return scores[:-1] * (value / total) - held
+        orders = np.clip(action, -1.0, 1.0)
+        return np.where(orders > 0.0, orders * (value / self.n_assets),
+                        orders * held)
+
+    def _execute(self, trades: np.ndarray, price: np.ndarray) -> float:
+        """Trade ``trades`` by value, sells first, and return the fees."""
+        fee = self.fee
+        sells = np.minimum(trades, 0.0)
+        buys = np.maximum(trades, 0.0)
+        sold = -float(sells.sum())
+        self.balance += sold * (1 - fee)
+        bought = float(buys.sum())
+        cost = bought * (1 + fee)
+        if cost > self.balance:
+            scale = max(self.balance, 0.0) / cost
+            buys *= scale
+            bought *= scale
+            cost = self.balance
+        self.balance -= cost
+        self.holdings += (sells + buys) / price
+        np.maximum(self.holdings, 0.0, out=self.holdings)
+        return (sold + bought) * fee
+
+    # ------------------------------------------------------------------ gym API
+    @metrics.instrumented("portfolio_env.step")
+    def step(self, action):
+        prices = self._prices
+        price = prices[self.window + self.current_step]
+        prev_value = self._portfolio_value(price)
+
+        fees = self._execute(self._trades(action, price, prev_value), price)
+        self.fees_paid += fees
+
+        self.current_step += 1
+        done = self.current_step >= self.episode_length
+
+        next_price = prices[self.window + self.current_step]
+        current_value = self._portfolio_value(next_price)
+        reward = current_value - prev_value
+
+        obs = self._get_obs(next_price, current_value)
+        if done:
+            obs = obs.copy()
+        info = {"portfolio_value": current_value, "fees": fees}
+        return obs, reward, done, info
+
+    def reset(self):  # type: ignore[override]
+        self.symbols, self.start = self.bank.sample(
+            self.rng, self.n_assets, self._rows)
+        prices = self.bank.window(self.symbols, self.start, self._rows,
+                                  out=self._prices)
+        np.divide(prices[1:].T, prices[:-1].T, out=self._returns)
+        np.log(self._returns, out=self._returns)
+        self.balance = float(self.initial_balance)
+        self.holdings[:] = 0.0
+        self.fees_paid = 0.0
+        self.current_step = 0
+        price = prices[self.window]
+        return self._get_obs(price, self._portfolio_value(price))
+
+    @property
+    def symbol_names(self):
+        names = self.bank.symbols
+        return [names[k] for k in self.symbols]
+
+    def render(self, mode: str = "human") -> None:
+        price = self._prices[self.window + self.current_step]
+        value = self._portfolio_value(price)
+        held = ", ".join(f"{name}: {qty:.4f}" for name, qty in
+                         zip(self.symbol_names, self.holdings.tolist()))
+        print(f"Step: {self.current_step} | Balance: {self.balance:.2f} | "
+              f"Value: {value:.2f} | {held}")
@@ -0,0 +1,103 @@
+"""Shared-memory market data and subprocess environment workers.
+
+The price series (and the feature matrix, when training on features) is
+copied once into a :mod:`multiprocessing.shared_memory` block owned by the
+training process.  Workers receive only a small :class:`SharedPricesHandle`
+and map the same memory, so the data is neither pickled nor duplicated per
+worker.  This module deliberately imports nothing
+beyond NumPy to keep each worker process small.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .batch import TradingBatch
+
+
+@dataclass(frozen=True)
+class SharedPricesHandle:
+    """Picklable reference to a :class:`SharedPrices` block."""
+
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str = "float64"
+
+    def attach(self) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+        """Map the block and return it with a read-only array view."""
+        shm = shared_memory.SharedMemory(name=self.name)
+        array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+        array.flags.writeable = False
+        return shm, array
+
+
+class SharedPrices:
+    """Price series, or another array, stored once in shared memory.
+
+    Parameters
+    ----------
+    prices: numpy.ndarray
+        Price series (or feature matrix) to publish.
+    dtype: numpy.dtype
+        Type the array is stored as.
+    """
+
+    def __init__(self, prices: np.ndarray, dtype: np.dtype = np.float64):
+        prices = np.asarray(prices, dtype=dtype)
+        self._shm = shared_memory.SharedMemory(create=True,
+                                               size=max(prices.nbytes, 1))
+        self.array = np.ndarray(prices.shape, dtype=prices.dtype,
+                                buffer=self._shm.buf)
+        self.array[...] = prices
+        self.handle = SharedPricesHandle(self._shm.name, prices.shape,
+                                         prices.dtype.str)
+
+    def close(self) -> None:
+        """Release and unlink the shared block."""
+        if self._shm is None:
+            return
+        del self.array
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+
+def worker(remote, parent_remote, handle: SharedPricesHandle,
+           batch_kwargs: Dict[str, Any],
+           features: Optional[SharedPricesHandle] = None) -> None:
+    """Serve a :class:`TradingBatch` over ``remote`` until told to close.
+
+    Commands are ``(name, payload)`` tuples: ``("step", actions)``,
+    ``("reset", None)``, ``("seed", seed)`` and ``("close", None)``.
+    ``features`` is the shared feature matrix, if the batch uses one.
+    """
+    parent_remote.close()
+    shm, prices = handle.attach()
+    feature_shm = matrix = None
+    if features is not None:
+        feature_shm, matrix = features.attach()
+    batch = TradingBatch(prices, features=matrix, **batch_kwargs)
+    try:
+        while True:
+            cmd, payload = remote.recv()
+            if cmd == "step":
+                remote.send(batch.step(payload))
+            elif cmd == "reset":
+                remote.send(batch.reset())
+            elif cmd == "seed":
+                batch.seed(payload)
+            elif cmd == "close":
+                break
+            else:
+                raise NotImplementedError(f"unknown command {cmd!r}")
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del batch, prices, matrix
+        shm.close()
+        if feature_shm is not None:
+            feature_shm.close()
+        remote.close()
@@ -0,0 +1,339 @@
+"""Parallel walk-forward and hyperparameter sweeps.
+
+A sweep trains and backtests one PPO agent per combination of parameter set
+and walk-forward fold.  Parameter sets come from :func:`grid` or
+:func:`random_search` over the arguments of :func:`rl.baseline.train_model`;
+keys it does not know (``learning_rate``, ``gamma``, ...) are passed on to
+:class:`~stable_baselines3.PPO`.  Folds come from :func:`walk_forward`.
+
+Trials run on a process pool.  Each finished trial is committed to a SQLite
+results file straight away under a key hashed from its parameters, fold and
+the data, so a crashed or interrupted sweep loses no completed work and a
+rerun skips every trial that is already there.  A trial that raises (say, a
+random draw PPO rejects) is recorded in a separate ``failures`` table with
+its error and the sweep goes on; a rerun tries it again.
+
+Command line usage::
+
+    python -m rl.sweep prices.csv --grid '{"learning_rate": [3e-4, 1e-3]}' \\
+        --train-size 20000 --test-size 5000 --results sweep.sqlite
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import (TYPE_CHECKING, Any, Dict, Iterable, List, Mapping,
+                    Optional, Sequence, Tuple)
+
+from . import baseline
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+#: Parameters consumed by :func:`rl.baseline.train_model` itself.
+TRAIN_PARAMS = ("timesteps", "n_envs", "episode_length", "seed", "fee")
+
+Fold = Tuple[int, int, int, int]
+
+
+def grid(space: Mapping[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Return every combination of the values in ``space``."""
+    names = list(space)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(space[n] for n in names))]
+
+
+def random_search(space: Mapping[str, Any], trials: int,
+                  seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Draw ``trials`` parameter sets from ``space``.
+
+    A list value is sampled uniformly from its items.  A ``[low, high]``
+    pair given as a tuple (or a two element dict ``{"low": .., "high": ..}``)
+    is sampled uniformly from the range, as an integer if both bounds are.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(trials):
+        params = {}
+        for name, spec in space.items():
+            if isinstance(spec, dict):
+                spec = (spec["low"], spec["high"])
+            if isinstance(spec, tuple):
+                low, high = spec
+                if isinstance(low, int) and isinstance(high, int):
+                    params[name] = int(rng.integers(low, high + 1))
+                else:
+                    params[name] = float(rng.uniform(low, high))
+            else:
+                params[name] = spec[int(rng.integers(len(spec)))]
+        out.append(params)
+    return out
+
+
+def walk_forward(n_rows: int, train_size: int, test_size: int,
+                 step: Optional[int] = None) -> List[Fold]:
+    """Return rolling ``(train_start, train_end, test_start, test_end)`` rows.
+
+    Each fold trains on ``train_size`` rows and tests on the following
+    ``test_size`` rows; folds advance by ``step`` rows (``test_size`` by
+    default).
+    """
+    step = step or test_size
+    folds = []
+    start = 0
+    while start + train_size + test_size <= n_rows:
+        train_end = start + train_size
+        folds.append((start, train_end, train_end, train_end + test_size))
+        start += step
+    if not folds:
+        raise ValueError("data is too short for a single fold")
+    return folds
+
+
+def data_fingerprint(data: pd.DataFrame) -> str:
+    """Hash the price column of ``data``."""
+    import numpy as np
+
+    prices = np.ascontiguousarray(data["price"].to_numpy(), dtype=np.float64)
+    return hashlib.sha256(prices.tobytes()).hexdigest()
+
+
+def trial_key(params: Mapping[str, Any], fold: Fold, fingerprint: str) -> str:
+    payload = json.dumps({"params": params, "fold": fold, "data": fingerprint},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def run_trial(data_path: str, params: Dict[str, Any],
+              fold: Fold) -> Dict[str, Any]:
+    """Train on the fold's training rows and backtest on its test rows."""
+    from .evaluate import evaluate
+
+    began = time.perf_counter()
+    train_start, train_end, test_start, test_end = fold
+    data = baseline.load_data(data_path)
+    train_kwargs = {k: v for k, v in params.items() if k in TRAIN_PARAMS}
+    ppo_kwargs = {k: v for k, v in params.items() if k not in TRAIN_PARAMS}
+    model = baseline.train_model(data.iloc[train_start:train_end],
+                                 ppo_kwargs=ppo_kwargs, **train_kwargs)
+    result = evaluate(model, [data.iloc[test_start:test_end]],
+                      fee=params.get("fee", 0.001),
+                      deterministic=True).iloc[0]
+    return {
+        "final_value": float(result["final_value"]),
+        "total_return": float(result["total_return"]),
+        "max_drawdown": float(result["max_drawdown"]),
+        "trades": int(result["trades"]),
+        "seconds": time.perf_counter() - began,
+    }
+
+
+def _init_worker() -> None:
+    # One trial per core: keep torch from spawning a thread per core in
+    # every worker.
+    try:
+        import torch
+    except ImportError:  # pragma: no cover - torch comes with SB3
+        return
+    torch.set_num_threads(1)
+
+
+class ResultStore:
+    """SQLite file holding one row per finished trial.
+
+    Parameters are stored as JSON, so they can be queried with SQLite's
+    ``json_extract`` or expanded with :meth:`to_frame`.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS trials (
+            key TEXT PRIMARY KEY,
+            data_path TEXT,
+            params TEXT,
+            train_start INTEGER, train_end INTEGER,
+            test_start INTEGER, test_end INTEGER,
+            final_value REAL, total_return REAL, max_drawdown REAL,
+            trades INTEGER, seconds REAL,
+            finished_at REAL
+        )
+    """
+
+    FAILURES_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS failures (
+            key TEXT PRIMARY KEY,
+            data_path TEXT,
+            params TEXT,
+            train_start INTEGER, train_end INTEGER,
+            test_start INTEGER, test_end INTEGER,
+            error TEXT,
+            finished_at REAL
+        )
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(self.SCHEMA)
+        self.conn.execute(self.FAILURES_SCHEMA)
+        self.conn.commit()
+
+    def done_keys(self) -> set:
+        return {row[0] for row in self.conn.execute("SELECT key FROM trials")}
+
+    def add(self, key: str, data_path: str, params: Mapping[str, Any],
+            fold: Fold, result: Mapping[str, Any]) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO trials VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, data_path, json.dumps(params, sort_keys=True), *fold,
+                 result["final_value"], result["total_return"],
+                 result["max_drawdown"], result["trades"], result["seconds"],
+                 time.time()))
+            self.conn.execute("DELETE FROM failures WHERE key = ?", (key,))
+
+    def add_failure(self, key: str, data_path: str,
+                    params: Mapping[str, Any], fold: Fold,
+                    error: BaseException) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO failures VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, data_path, json.dumps(params, sort_keys=True), *fold,
+                 f"{type(error).__name__}: {error}", time.time()))
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return all trials with one column per parameter."""
+        return self._frame("trials")
+
+    def failures_frame(self) -> pd.DataFrame:
+        """Return the failed trials and their errors, one column per
+        parameter."""
+        return self._frame("failures")
+
+    def _frame(self, table: str) -> pd.DataFrame:
+        import pandas as pd
+
+        frame = pd.read_sql_query(
+            f"SELECT * FROM {table} ORDER BY finished_at", self.conn)
+        params = pd.json_normalize(frame["params"].map(json.loads).tolist())
+        params.columns = [f"param_{c}" for c in params.columns]
+        return pd.concat([frame.drop(columns="params"), params], axis=1)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def run_sweep(data_path: str, param_sets: Iterable[Dict[str, Any]],
+              folds: Sequence[Fold], results_path: str,
+              workers: Optional[int] = None) -> pd.DataFrame:
+    """Run every parameter set on every fold and return the results table.
+
+    Trials already present in ``results_path`` are skipped.  Trials that
+    raise are left out of the table and recorded with their error, see
+    :meth:`ResultStore.failures_frame`.
+    """
+    data = baseline.load_data(data_path)
+    fingerprint = data_fingerprint(data)
+    store = ResultStore(results_path)
+    try:
+        done = store.done_keys()
+        tasks = []
+        for params in param_sets:
+            for fold in folds:
+                key = trial_key(params, fold, fingerprint)
+                if key not in done:
+                    tasks.append((key, params, tuple(fold)))
+                    done.add(key)
+
+        if tasks:
+            workers = min(workers or os.cpu_count() or 1, len(tasks))
+            # Trials run torch, which must not be forked mid-flight.
+            ctx = mp.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                     initializer=_init_worker) as pool:
+                futures = {pool.submit(run_trial, data_path, params, fold):
+                           (key, params, fold)
+                           for key, params, fold in tasks}
+                try:
+                    for future in as_completed(futures):
+                        key, params, fold = futures[future]
+                        try:
+                            result = future.result()
+                        except Exception as exc:
+                            store.add_failure(key, data_path, params, fold,
+                                              exc)
+                        else:
+                            store.add(key, data_path, params, fold, result)
+                except BaseException:
+                    # Interrupted: don't run the queued trials on the way
+                    # out of the pool.
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+        return store.to_frame()
+    finally:
+        store.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Walk-forward hyperparameter sweep of the PPO agent")
+    parser.add_argument("data", help="CSV file or data store directory")
+    space = parser.add_mutually_exclusive_group(required=True)
+    space.add_argument("--grid", type=json.loads,
+                       help="JSON object mapping parameters to value lists")
+    space.add_argument("--random", type=json.loads,
+                       help="JSON object of value lists or {low, high} ranges")
+    parser.add_argument("--trials", type=int, default=10,
+                        help="Number of random parameter sets")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed for random search")
+    parser.add_argument("--train-size", type=int, required=True,
+                        help="Rows per training window")
+    parser.add_argument("--test-size", type=int, required=True,
+                        help="Rows per test window")
+    parser.add_argument("--step", type=int, default=None,
+                        help="Rows between folds (default: test size)")
+    parser.add_argument("--results", default="sweep.sqlite",
+                        help="SQLite results file")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+    if not os.path.exists(args.data):
+        parser.error(f"no such file or directory: {args.data}")
+
+    if args.grid is not None:
+        param_sets = grid(args.grid)
+    else:
+        param_sets = random_search(args.random, args.trials, seed=args.seed)
+    n_rows = len(baseline.load_data(args.data))
+    folds = walk_forward(n_rows, args.train_size, args.test_size, args.step)
+    results = run_sweep(args.data, param_sets, folds, args.results,
+                        workers=args.workers)
+    print(results.drop(columns=["key", "data_path", "finished_at"])
+          .to_string(index=False))
+    store = ResultStore(args.results)
+    try:
+        failures = store.failures_frame()
+    finally:
+        store.close()
+    if len(failures):
+        print(f"\n{len(failures)} trial(s) failed; rerun to retry them:",
+              file=sys.stderr)
+        print(failures.drop(columns=["key", "data_path", "finished_at"])
+              .to_string(index=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
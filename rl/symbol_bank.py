@@ -0,0 +1,220 @@
+"""Memory-mapped price bank of many symbols on a shared time axis.
+
+A :class:`SymbolBank` is a :class:`~rl.data_store.MarketDataStore` with one
+``float64`` price column per symbol next to the ``timestamp`` index, so each
+symbol's history is one contiguous memory-mapped file.  Symbols that start
+trading after the first row hold ``NaN`` before their first price (the
+first valid row of every symbol is kept in the manifest); gaps after it are
+forward filled.
+
+Readers map only the columns they touch and copy only the rows they need,
+so a process sampling episodes from a universe of thousands of symbols
+holds no more than its current episode in memory and shares the page cache
+with every other process reading the bank.  A bank pickles as its path,
+which makes it cheap to hand to subprocess environments.
+
+Command line usage::
+
+    python -m rl.symbol_bank bank/ --csv BTCUSDT=btc.csv --csv ETHUSDT=eth.csv
+    python -m rl.symbol_bank bank/ --csv-dir data/     # <SYMBOL>.csv files
+"""
+from __future__ import annotations
+
+import argparse
+import re
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .data_store import TIME_COLUMN, MarketDataStore
+
+_SYMBOL = re.compile(r"[A-Za-z0-9_.-]+")
+
+
+def _time_ns(values: pd.Series) -> np.ndarray:
+    """Epoch milliseconds or datetimes as ``int64`` UTC nanoseconds."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(np.int64) * 1_000_000
+    values = pd.to_datetime(values, utc=True).dt.tz_convert(None)
+    return values.to_numpy("datetime64[ns]").view(np.int64)
+
+
+def _ffill(values: np.ndarray) -> np.ndarray:
+    valid = ~np.isnan(values)
+    last = np.where(valid, np.arange(len(values)), 0)
+    np.maximum.accumulate(last, out=last)
+    return values[last]
+
+
+class SymbolBank:
+    """Read access to a bank built by :meth:`build`.
+
+    Parameters
+    ----------
+    path: str or Path
+        Bank directory.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.store = MarketDataStore(path)
+        if not self.store.exists():
+            raise FileNotFoundError(f"no symbol bank at {path}")
+        bank = self.store.manifest.get("source", {}).get("bank")
+        if bank is None:
+            raise ValueError(f"{path} is not a symbol bank")
+        self.symbols: List[str] = list(bank["symbols"])
+        #: Row of the first price of every symbol.
+        self.first_valid = np.asarray(bank["first_valid"], dtype=np.int64)
+        self._sorted_first = np.sort(self.first_valid)
+        self._columns: Dict[int, np.ndarray] = {}
+
+    @property
+    def path(self) -> Path:
+        return self.store.path
+
+    def __len__(self) -> int:
+        return self.store.rows
+
+    def __getstate__(self) -> Dict[str, str]:
+        return {"path": str(self.path)}
+
+    def __setstate__(self, state: Dict[str, str]) -> None:
+        self.__init__(state["path"])
+
+    # ------------------------------------------------------------------ build
+    @classmethod
+    def build(cls, path: Union[str, Path],
+              frames: Mapping[str, pd.DataFrame], price_column: str = "price",
+              time_column: str = TIME_COLUMN) -> "SymbolBank":
+        """Write a bank of ``symbol -> frame`` price histories to ``path``.
+
+        Frames are aligned on ``time_column`` (epoch milliseconds or
+        datetimes) with an outer join, or by row number when none of them
+        has one.  Duplicate timestamps keep their last price.
+        """
+        if not frames:
+            raise ValueError("a symbol bank needs at least one symbol")
+        timed = all(time_column in f.columns for f in frames.values())
+        prices, times = {}, {}
+        for symbol, frame in frames.items():
+            if not _SYMBOL.fullmatch(symbol) or symbol == TIME_COLUMN:
+                raise ValueError(f"invalid symbol name {symbol!r}")
+            if price_column not in frame.columns:
+                raise ValueError(f"{symbol}: no {price_column!r} column")
+            prices[symbol] = frame[price_column].to_numpy(np.float64)
+            if timed:
+                times[symbol] = _time_ns(frame[time_column])
+        if timed:
+            index = np.unique(np.concatenate(list(times.values())))
+            rows = len(index)
+        else:
+            rows = max(len(values) for values in prices.values())
+        # Columns are aligned with NumPy: a pandas outer join of thousands
+        # of series costs far more than the data is worth.
+        columns = {}
+        first_valid = []
+        for symbol, values in prices.items():
+            column = np.full(rows, np.nan)
+            if timed:
+                order = np.argsort(times[symbol], kind="stable")
+                stamps = times[symbol][order]
+                last = np.append(stamps[1:] != stamps[:-1], True)
+                column[np.searchsorted(index, stamps[last])] = \
+                    values[order][last]
+            else:
+                column[:len(values)] = values
+            valid = ~np.isnan(column)
+            first_valid.append(int(valid.argmax()) if valid.any() else rows)
+            columns[symbol] = _ffill(column)
+        wide = pd.DataFrame(columns)
+        if timed:
+            wide.insert(0, TIME_COLUMN, index.view("datetime64[ns]"))
+        MarketDataStore(path).write(
+            wide, index=TIME_COLUMN if timed else None,
+            source={"bank": {"symbols": list(columns),
+                             "first_valid": first_valid}})
+        return cls(path)
+
+    @classmethod
+    def from_csv(cls, path: Union[str, Path],
+                 csv_paths: Mapping[str, Union[str, Path]],
+                 price_column: str = "price") -> "SymbolBank":
+        """Build a bank from ``symbol -> CSV path`` via their columnar
+        caches, see :func:`rl.baseline.load_data`."""
+        from .baseline import load_data
+
+        return cls.build(path, {symbol: load_data(str(csv))
+                                for symbol, csv in csv_paths.items()},
+                         price_column=price_column)
+
+    # ------------------------------------------------------------------ read
+    def column(self, k: int) -> np.ndarray:
+        """Memory map of the prices of symbol number ``k``."""
+        column = self._columns.get(k)
+        if column is None:
+            column = self._columns[k] = self.store.column(self.symbols[k])
+        return column
+
+    def window(self, symbols: Sequence[int], start: int, length: int,
+               out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Copy rows ``[start, start + length)`` of ``symbols`` into a
+        ``(length, len(symbols))`` array."""
+        if out is None:
+            out = np.empty((length, len(symbols)), dtype=np.float64)
+        for j, k in enumerate(symbols):
+            out[:, j] = self.column(int(k))[start:start + length]
+        return out
+
+    def eligible(self, start: int) -> np.ndarray:
+        """Numbers of the symbols with a price at row ``start``."""
+        return np.flatnonzero(self.first_valid <= start)
+
+    def sample(self, rng: np.random.Generator, n_symbols: int,
+               length: int) -> Tuple[np.ndarray, int]:
+        """Pick a random start row and ``n_symbols`` symbols trading
+        throughout ``length`` rows from it.
+
+        Returns
+        -------
+        tuple
+            Symbol numbers and start row.
+        """
+        if not 1 <= n_symbols <= len(self.symbols):
+            raise ValueError(f"cannot sample {n_symbols} of "
+                             f"{len(self.symbols)} symbols")
+        lo = int(self._sorted_first[n_symbols - 1])
+        hi = len(self) - length
+        if hi < lo:
+            raise ValueError(f"bank has no {length} rows with {n_symbols} "
+                             "symbols trading")
+        start = int(rng.integers(lo, hi + 1))
+        symbols = rng.choice(self.eligible(start), n_symbols, replace=False)
+        return symbols, start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Build a memory-mapped multi-symbol price bank")
+    parser.add_argument("out", help="Bank directory to write")
+    parser.add_argument("--csv", action="append", default=[],
+                        metavar="SYMBOL=PATH",
+                        help="Price CSV of one symbol (repeatable)")
+    parser.add_argument("--csv-dir", default=None,
+                        help="Directory of <SYMBOL>.csv files")
+    parser.add_argument("--price-column", default="price")
+    args = parser.parse_args()
+    csv_paths: Dict[str, Union[str, Path]] = dict(
+        item.split("=", 1) for item in args.csv)
+    if args.csv_dir is not None:
+        for csv in sorted(Path(args.csv_dir).glob("*.csv")):
+            csv_paths.setdefault(csv.stem, csv)
+    if not csv_paths:
+        parser.error("give --csv or --csv-dir")
+    bank = SymbolBank.from_csv(args.out, csv_paths, args.price_column)
+    print(f"{args.out}: {len(bank.symbols)} symbols x {len(bank)} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,89 @@
 """Command line entry point for training the baseline agent."""
 import argparse
+from pathlib import Path
 
 from . import baseline
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Train PPO trading agent")
-    parser.add_argument("data", help="Path to CSV file with price data")
+    parser.add_argument("data", help="Path to CSV file with price data, or "
+                                     "to a symbol bank with --assets")
     parser.add_argument("--timesteps", type=int, default=10_000,
                         help="Number of training timesteps")
     parser.add_argument("--out", default="ppo_trading",
                         help="Where to save the trained model")
+    parser.add_argument("--envs", type=int, default=1,
+                        help="Number of parallel episodes (batched when > 1)")
+    parser.add_argument("--episode-length", type=int, default=None,
+                        help="Steps per episode for the batched environment")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of environment worker processes")
+    parser.add_argument("--vec-mode", choices=baseline.VEC_MODES, default=None,
+                        help="Step episodes in this process or in workers "
+                             "(default: subprocess when --workers > 1)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Random seed for the policy and workers")
+    parser.add_argument("--export-policy", default=None, metavar="NPZ",
+                        help="Also export the policy for NumPy-only "
+                             "inference to this file")
+    parser.add_argument("--metrics", nargs="?", const="-", default=None,
+                        metavar="PATH",
+                        help="Record hot-path timings and write them to PATH "
+                             "(.json or text; default: stderr) at exit")
+    parser.add_argument("--assets", type=int, default=None,
+                        help="Train a portfolio of this many symbols sampled "
+                             "from the symbol bank DATA per episode")
+    parser.add_argument("--action-mode", choices=("weights", "orders"),
+                        default="weights",
+                        help="Portfolio actions: target weights or "
+                             "per-symbol orders (with --assets)")
+    parser.add_argument("--features", default=None, metavar="SPEC",
+                        help="Observe precomputed features instead of the "
+                             "price, e.g. 'returns,rollingmean:20,rsi:14'")
+    parser.add_argument("--window", type=int, default=1,
+                        help="Feature rows per observation (with "
+                             "--features)")
+    parser.add_argument("--start", default=None,
+                        help="Only use rows at or after this timestamp")
+    parser.add_argument("--end", default=None,
+                        help="Only use rows before this timestamp")
     args = parser.parse_args()
-    baseline.train(args.data, timesteps=args.timesteps, model_path=args.out)
+    if not Path(args.data).exists():
+        parser.error(f"no such file or directory: {args.data}")
+    try:
+        baseline.check_vec_mode(args.workers, args.vec_mode)
+    except ValueError as exc:
+        parser.error(str(exc))
+    features = None
+    if args.features is not None:
+        if args.assets is not None:
+            parser.error("--features does not apply to --assets")
+        from .features import FeaturePipeline
+
+        try:
+            features = FeaturePipeline.parse(args.features)
+        except ValueError as exc:
+            parser.error(str(exc))
+    if args.metrics:
+        from analytics import metrics
+
+        metrics.enable(args.metrics)
+    if args.assets is not None:
+        if not Path(args.data).is_dir():
+            parser.error("--assets needs a symbol bank directory")
+        baseline.train_portfolio(
+            args.data, timesteps=args.timesteps, model_path=args.out,
+            n_assets=args.assets, n_envs=args.envs,
+            episode_length=args.episode_length or 256, workers=args.workers,
+            seed=args.seed, action_mode=args.action_mode)
+        return
+    baseline.train(args.data, timesteps=args.timesteps, model_path=args.out,
+                   n_envs=args.envs, episode_length=args.episode_length,
+                   workers=args.workers, vec_mode=args.vec_mode,
+                   seed=args.seed, start=args.start, end=args.end,
+                   policy_path=args.export_policy, features=features,
+                   window=args.window)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,286 @@
+"""Natively vectorized versions of :class:`~rl.env.TradingEnv`.
+
+:class:`VecTradingEnv` keeps the balance, holdings, step index and episode
+offset of ``N`` parallel episodes in NumPy arrays and advances all of them
+with a handful of array operations per step.  :class:`SubprocVecTradingEnv`
+spreads the same batched stepping over several worker processes that share a
+single copy of the price data.  Both implement the Stable-Baselines3
+:class:`~stable_baselines3.common.vec_env.VecEnv` interface so they can be
+passed to ``PPO`` directly instead of wrapping many :class:`TradingEnv`
+instances in ``DummyVecEnv``.
+"""
+from __future__ import annotations
+
+import multiprocessing as mp
+from typing import Any, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from stable_baselines3.common.vec_env import VecEnv
+
+from .batch import TradingBatch
+from .features import FeaturePipeline
+from .shared import SharedPrices, worker
+
+try:
+    from gymnasium import spaces
+except ImportError:  # older Stable-Baselines3 releases are built on gym
+    from gym import spaces
+
+
+def _price_array(data: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+    if isinstance(data, pd.DataFrame):
+        if "price" not in data.columns:
+            raise ValueError("data must contain a 'price' column")
+        data = data["price"].to_numpy()
+    return np.ascontiguousarray(data, dtype=np.float64)
+
+
+class _TradingVecEnv(VecEnv):
+    """Common :class:`VecEnv` plumbing for the batched trading environments."""
+
+    def __init__(self, num_envs: int, initial_balance: float, fee: float,
+                 episode_length: Optional[int], obs_size: int = 3):
+        self.initial_balance = initial_balance
+        self.fee = fee
+        self.episode_length = episode_length
+        self.render_mode = None
+        low = 0.0 if obs_size == 3 else -np.inf
+        observation_space = spaces.Box(low=low, high=np.inf,
+                                       shape=(obs_size,), dtype=np.float32)
+        super().__init__(num_envs, observation_space, spaces.Discrete(3))
+
+    @staticmethod
+    def _infos(values: np.ndarray, done_idx: np.ndarray,
+               terminal_obs: np.ndarray) -> List[dict]:
+        infos: List[dict] = [{"portfolio_value": v} for v in values.tolist()]
+        for i, obs in zip(done_idx.tolist(), terminal_obs):
+            infos[i]["terminal_observation"] = obs
+        return infos
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        return [getattr(self, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(self, attr_name: str, value: Any, indices=None) -> None:
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None,
+                   **method_kwargs) -> List[Any]:
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs)
+                for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return [False] * len(self._get_indices(indices))
+
+
+class VecTradingEnv(_TradingVecEnv):
+    """Batched trading environment with the semantics of :class:`TradingEnv`.
+
+    Every sub-environment trades the same price series with the same
+    hold/buy/sell actions, fees and rewards as :class:`TradingEnv`.  Finished
+    episodes are reset automatically; the observation that ended the episode
+    is returned in ``info["terminal_observation"]`` as Stable-Baselines3
+    expects.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame or numpy.ndarray
+        Either a frame with a ``price`` column or a one dimensional array of
+        prices.
+    num_envs: int
+        Number of parallel episodes.
+    initial_balance: float
+        Starting cash balance of every episode.
+    fee: float
+        Proportional trading fee.
+    episode_length: int, optional
+        Number of steps per episode.  By default every episode runs over the
+        full series from the first price, exactly like :class:`TradingEnv`.
+        When given, each episode starts at a random offset into the series.
+    seed: int, optional
+        Seed for the random episode offsets.
+    features: FeaturePipeline, optional
+        Feature pipeline applied once to ``data`` (which must then be a
+        frame).  Observations hold the last ``window`` feature rows followed
+        by balance and holdings, as in :class:`TradingEnv`.
+    window: int
+        Lookback window length used with ``features``.
+    """
+
+    def __init__(self, data: Union[pd.DataFrame, np.ndarray], num_envs: int = 64,
+                 initial_balance: float = 1000.0, fee: float = 0.001,
+                 episode_length: Optional[int] = None,
+                 seed: Optional[int] = None,
+                 features: Optional[FeaturePipeline] = None, window: int = 1):
+        matrix = None
+        if features is not None:
+            if not isinstance(data, pd.DataFrame):
+                raise ValueError("features require data as a DataFrame")
+            matrix = features.transform(data)
+        self.batch = TradingBatch(_price_array(data), num_envs,
+                                  initial_balance=initial_balance, fee=fee,
+                                  episode_length=episode_length, seed=seed,
+                                  features=matrix, window=window)
+        super().__init__(num_envs, initial_balance, fee,
+                         self.batch.episode_length, self.batch.obs_size)
+        self._actions = np.zeros(num_envs, dtype=np.int64)
+
+    def reset(self) -> np.ndarray:
+        if self._seeds[0] is not None:
+            self.batch.seed(self._seeds[0])
+        self._reset_seeds()
+        self._reset_options()
+        return self.batch.reset()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._actions = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        obs, rewards, dones, values, done_idx, terminal_obs = \
+            self.batch.step(self._actions)
+        return obs, rewards, dones, self._infos(values, done_idx, terminal_obs)
+
+    def close(self) -> None:
+        pass
+
+
+class SubprocVecTradingEnv(_TradingVecEnv):
+    """Batched trading environment stepped by worker processes.
+
+    The ``num_envs`` episodes are split evenly across ``workers`` processes,
+    each of which advances its share with a :class:`TradingBatch`.  Prices
+    live once in shared memory, so memory use does not grow with the number
+    of workers beyond the interpreter itself.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame or numpy.ndarray
+        Either a frame with a ``price`` column or a one dimensional array of
+        prices.
+    num_envs: int
+        Total number of parallel episodes, at least ``workers``.
+    workers: int
+        Number of worker processes.
+    initial_balance: float
+        Starting cash balance of every episode.
+    fee: float
+        Proportional trading fee.
+    episode_length: int, optional
+        Number of steps per episode, see :class:`VecTradingEnv`.
+    seed: int, optional
+        Base seed.  Each worker draws its episode offsets from an independent
+        stream spawned from this seed.
+    start_method: str, optional
+        :mod:`multiprocessing` start method.  Defaults to ``"fork"`` where
+        available so that workers share the parent's already imported modules
+        copy-on-write; ``"spawn"`` and ``"forkserver"`` re-import the main
+        module, and with it torch, in every worker.
+    features: FeaturePipeline, optional
+        Feature pipeline, see :class:`VecTradingEnv`.  The feature matrix is
+        computed once here and shared with the workers like the prices.
+    window: int
+        Lookback window length used with ``features``.
+    """
+
+    def __init__(self, data: Union[pd.DataFrame, np.ndarray], num_envs: int,
+                 workers: int, initial_balance: float = 1000.0,
+                 fee: float = 0.001, episode_length: Optional[int] = None,
+                 seed: Optional[int] = None,
+                 start_method: Optional[str] = None,
+                 features: Optional[FeaturePipeline] = None, window: int = 1):
+        if workers < 1:
+            raise ValueError("workers must be positive")
+        if num_envs < workers:
+            raise ValueError("num_envs must be at least the number of workers")
+
+        prices = _price_array(data)
+        matrix = None
+        if features is not None:
+            if not isinstance(data, pd.DataFrame):
+                raise ValueError("features require data as a DataFrame")
+            matrix = features.transform(data)
+        # Validate arguments in the parent before starting any process.
+        probe = TradingBatch(prices, 1, episode_length=episode_length,
+                             features=matrix, window=window)
+        episode_length = probe.episode_length
+
+        self._counts = [len(part) for part in
+                        np.array_split(np.arange(num_envs), workers)]
+        self._offsets = np.cumsum([0] + self._counts[:-1])
+        self._shared = SharedPrices(prices)
+        self._shared_features = None
+        if matrix is not None:
+            self._shared_features = SharedPrices(matrix, dtype=matrix.dtype)
+        feature_handle = (None if self._shared_features is None
+                          else self._shared_features.handle)
+        self._closed = False
+
+        if start_method is None:
+            start_method = ("fork" if "fork" in mp.get_all_start_methods()
+                            else "spawn")
+        ctx = mp.get_context(start_method)
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        self.remotes, self.processes = [], []
+        for count, worker_seed in zip(self._counts, seeds):
+            remote, work_remote = ctx.Pipe()
+            batch_kwargs = dict(num_envs=count,
+                                initial_balance=initial_balance, fee=fee,
+                                episode_length=episode_length,
+                                seed=worker_seed, window=window)
+            process = ctx.Process(target=worker,
+                                  args=(work_remote, remote,
+                                        self._shared.handle, batch_kwargs,
+                                        feature_handle),
+                                  daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+        super().__init__(num_envs, initial_balance, fee, episode_length,
+                         probe.obs_size)
+
+    def reset(self) -> np.ndarray:
+        if self._seeds[0] is not None:
+            seeds = np.random.SeedSequence(self._seeds[0]).spawn(
+                len(self.remotes))
+            for remote, worker_seed in zip(self.remotes, seeds):
+                remote.send(("seed", worker_seed))
+        self._reset_seeds()
+        self._reset_options()
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        return np.concatenate([remote.recv() for remote in self.remotes])
+
+    def step_async(self, actions: np.ndarray) -> None:
+        actions = np.asarray(actions).reshape(self.num_envs)
+        for remote, offset, count in zip(self.remotes, self._offsets,
+                                         self._counts):
+            remote.send(("step", actions[offset:offset + count]))
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        obs, rewards, dones, values, done_idx, terminal_obs = (
+            np.concatenate(parts) for parts in zip(*results))
+        offsets = np.repeat(self._offsets,
+                            [len(result[4]) for result in results])
+        done_idx = done_idx + offsets
+        return obs, rewards, dones, self._infos(values, done_idx, terminal_obs)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        for remote in self.remotes:
+            try:
+                remote.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for process in self.processes:
+            process.join()
+        for remote in self.remotes:
+            remote.close()
+        self._shared.close()
+        if self._shared_features is not None:
+            self._shared_features.close()
+        self._closed = True
@@ -0,0 +1,314 @@
+"""Write-ahead logging and recovery of a :class:`PaperTrader` account.
+
+A :class:`TraderJournal` is attached to a trader created with ``wal_dir``.
+The trader marks the symbols and orders each operation changes, and at the
+end of the operation the journal appends their new state to an
+:class:`~analytics.wal.WriteAheadLog`:
+
+* ``SYMBOL``: a symbol got the next array index,
+* ``POSITION``: quantity, last price and reserved units of one symbol, plus
+  the account's cash, fees paid and reserved cash (52 bytes),
+* ``ORDER``: the full state of one order (79 bytes),
+* ``PRICE``: a price update that changed nothing else (17 bytes),
+* ``PRICES``: a batch of such updates (13 bytes per symbol),
+* ``RESET``: the account was reset.
+
+Records hold new values rather than the operations that produced them, so
+recovery never re-runs matching: it loads the latest checkpoint (a NumPy
+``.npz`` of the account arrays and open orders), overwrites state with the
+logged records in order and rebuilds the order heaps.  Every
+``checkpoint_every`` records the whole account is checkpointed, so the tail
+replayed on a restart stays bounded however long the trader has run.
+
+Price-only updates are logged too, so a restarted account values its
+holdings at the last prices it saw.
+"""
+from __future__ import annotations
+
+import heapq
+import io
+import itertools
+import math
+import struct
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional, Set, Union
+
+import numpy as np
+
+from analytics.wal import SYNC_INTERVAL, WriteAheadLog
+
+from .paper_trader import CANCELLED, EXPIRED, FILLED, OPEN, Order, _Book
+
+if TYPE_CHECKING:
+    from .paper_trader import PaperTrader
+
+SYMBOL, POSITION, ORDER, RESET, PRICE, PRICES = 1, 2, 3, 4, 5, 6
+
+POSITION_RECORD = struct.Struct("<I6d")
+ORDER_RECORD = struct.Struct("<QIBBB7dq")
+RESET_RECORD = struct.Struct("<d")
+SYMBOL_RECORD = struct.Struct("<I")
+PRICE_RECORD = struct.Struct("<Id")
+
+STATUSES = (OPEN, FILLED, CANCELLED, EXPIRED)
+SIDES = ("buy", "sell")
+ORDER_DTYPE = np.dtype([
+    ("id", np.uint64), ("symbol", np.uint32), ("side", np.uint8),
+    ("status", np.uint8), ("triggered", np.uint8), ("quantity", np.float64),
+    ("price", np.float64), ("stop_price", np.float64),
+    ("filled", np.float64), ("notional", np.float64), ("fee", np.float64),
+    ("reserved", np.float64), ("seq", np.int64),
+])
+
+_STATUS_CODES = {status: k for k, status in enumerate(STATUSES)}
+
+
+def _nan_if_none(value: Optional[float]) -> float:
+    return math.nan if value is None else value
+
+
+def _none_if_nan(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def _order_values(order: Order, symbol: int) -> tuple:
+    return (order.id, symbol, order.side == "sell",
+            _STATUS_CODES[order.status], order.triggered, order.quantity,
+            _nan_if_none(order.price), _nan_if_none(order.stop_price),
+            order.filled, order.notional, order.fee, order.reserved,
+            order.seq)
+
+
+def _serialize(arrays: Dict[str, np.ndarray]) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _peek(trader: "PaperTrader", name: str) -> int:
+    """Return the next value of one of the trader's counters."""
+    value = next(getattr(trader, name))
+    setattr(trader, name, itertools.count(value))
+    return value
+
+
+class TraderJournal:
+    """Logs the changes of a :class:`PaperTrader` and recovers it.
+
+    Creating the journal recovers ``trader`` from ``path`` (if the log has
+    any state) and attaches itself as the trader's journal.
+
+    Parameters
+    ----------
+    trader: PaperTrader
+        Freshly created trader to recover into and log.
+    path: str or Path
+        Write-ahead log directory.
+    checkpoint_every: int
+        Records after which :meth:`commit` writes a checkpoint.
+    sync_interval: float
+        Group-commit interval of the log, see
+        :class:`~analytics.wal.WriteAheadLog`.
+    """
+
+    def __init__(self, trader: "PaperTrader", path: Union[str, Path],
+                 checkpoint_every: int = 100_000,
+                 sync_interval: float = SYNC_INTERVAL):
+        self.trader = trader
+        self.checkpoint_every = max(int(checkpoint_every), 1)
+        self.wal = WriteAheadLog(path, sync_interval=sync_interval)
+        self._symbols: Set[int] = set()
+        self._orders: Dict[int, Order] = {}
+        if self.wal.lsn == 0 and self.wal.checkpoint_state is None:
+            # A new log starts with the starting cash.
+            self.reset()
+        else:
+            self.recover()
+        trader._journal = self
+
+    # ------------------------------------------------------------------ logging
+    def symbol(self, i: int, name: str) -> None:
+        self.wal.append(SYMBOL, SYMBOL_RECORD.pack(i) + name.encode())
+
+    def touch(self, i: int, order: Optional[Order] = None) -> None:
+        self._symbols.add(i)
+        if order is not None:
+            self._orders[order.id] = order
+
+    def price(self, i: int, price: float) -> None:
+        """Log a price update of symbol ``i`` that changed nothing else."""
+        self.wal.append(PRICE, PRICE_RECORD.pack(i, price))
+        if self.wal.since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def prices(self, idx: np.ndarray, prices: np.ndarray) -> None:
+        """Log a batch of price updates, see :meth:`price`."""
+        self.wal.append(PRICES, idx.astype("<u4").tobytes()
+                        + prices.astype("<f8").tobytes())
+        if self.wal.since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def commit(self) -> None:
+        """Log the state of everything touched since the last commit and
+        checkpoint once ``checkpoint_every`` records have accumulated."""
+        self._write()
+        if self.wal.since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def _write(self) -> None:
+        t = self.trader
+        append = self.wal.append
+        if self._symbols:
+            pack = POSITION_RECORD.pack
+            for i in self._symbols:
+                append(POSITION, pack(i, t._quantity.item(i),
+                                      t._price.item(i),
+                                      t._reserved_qty.item(i), t.cash,
+                                      t.fees_paid, t._reserved_cash))
+            self._symbols.clear()
+        if self._orders:
+            index = t._index
+            pack = ORDER_RECORD.pack
+            for order in self._orders.values():
+                append(ORDER, pack(*_order_values(order,
+                                                  index[order.symbol])))
+            self._orders.clear()
+
+    def reset(self) -> None:
+        self._symbols.clear()
+        self._orders.clear()
+        self.wal.append(RESET, RESET_RECORD.pack(self.trader.starting_cash))
+
+    def checkpoint(self) -> None:
+        """Checkpoint the whole account.
+
+        Only copies of the account arrays are taken here; the flusher
+        serializes and writes them.
+        """
+        self._write()
+        arrays = self._arrays()
+        self.wal.checkpoint(lambda: _serialize(arrays))
+
+    def close(self) -> None:
+        """Log pending changes, sync and close the log."""
+        self._write()
+        self.wal.close()
+
+    # ------------------------------------------------------------------ state
+    def state(self) -> bytes:
+        """Serialize the account as an ``.npz`` blob."""
+        return _serialize(self._arrays())
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        """Copy the account into the arrays of a checkpoint."""
+        t = self.trader
+        n = len(t._index)
+        index = t._index
+        orders = np.array([_order_values(o, index[o.symbol])
+                           for o in t._orders.values()], dtype=ORDER_DTYPE)
+        next_id, next_seq = _peek(t, "_ids"), _peek(t, "_seq")
+        return {"symbols": np.array(list(index), dtype=str),
+                "quantity": t._quantity[:n].copy(),
+                "price": t._price[:n].copy(),
+                "reserved_qty": t._reserved_qty[:n].copy(),
+                "account": np.array([t.starting_cash, t.cash, t.fees_paid,
+                                     t._reserved_cash]),
+                "counters": np.array([next_id, next_seq], dtype=np.int64),
+                "orders": orders}
+
+    def _load(self, state: bytes) -> None:
+        t = self.trader
+        with np.load(io.BytesIO(state)) as data:
+            for name in data["symbols"].tolist():
+                t._add_symbol(name)
+            n = len(t._index)
+            t._quantity[:n] = data["quantity"]
+            t._price[:n] = data["price"]
+            t._reserved_qty[:n] = data["reserved_qty"]
+            (t.starting_cash, t.cash, t.fees_paid,
+             t._reserved_cash) = data["account"].tolist()
+            self._next_id, self._next_seq = data["counters"].tolist()
+            symbols = t.symbols
+            for row in data["orders"].tolist():
+                self._install(row, symbols)
+
+    def _install(self, row: tuple, symbols) -> None:
+        (order_id, symbol, side, status, triggered, quantity, price, stop,
+         filled, notional, fee, reserved, seq) = row
+        self._next_id = max(self._next_id, order_id + 1)
+        self._next_seq = max(self._next_seq, seq + 1)
+        orders = self.trader._orders
+        if STATUSES[status] != OPEN:
+            orders.pop(order_id, None)
+            return
+        orders[order_id] = Order(
+            order_id, symbols[symbol], SIDES[side], quantity,
+            _none_if_nan(price), _none_if_nan(stop), filled, notional, fee,
+            OPEN, bool(triggered), reserved, seq)
+
+    def recover(self) -> None:
+        """Load the checkpoint and replay the log tail into the trader."""
+        t = self.trader
+        self._next_id, self._next_seq = 1, 0
+        if self.wal.checkpoint_state is not None:
+            self._load(self.wal.checkpoint_state)
+        symbols = t.symbols
+        for _, kind, payload in self.wal.records():
+            if kind == POSITION:
+                (i, quantity, price, reserved, t.cash, t.fees_paid,
+                 t._reserved_cash) = POSITION_RECORD.unpack(payload)
+                t._quantity[i] = quantity
+                t._price[i] = price
+                t._reserved_qty[i] = reserved
+            elif kind == PRICE:
+                i, price = PRICE_RECORD.unpack(payload)
+                t._price[i] = price
+            elif kind == PRICES:
+                n = len(payload) // 12
+                idx = np.frombuffer(payload, dtype="<u4", count=n)
+                t._price[idx] = np.frombuffer(payload, dtype="<f8",
+                                              offset=4 * n)
+            elif kind == ORDER:
+                self._install(ORDER_RECORD.unpack(payload), symbols)
+            elif kind == SYMBOL:
+                name = payload[SYMBOL_RECORD.size:].decode()
+                if name not in t._index:
+                    t._add_symbol(name)
+                symbols = t.symbols
+            elif kind == RESET:
+                (t.starting_cash,) = RESET_RECORD.unpack(payload)
+                t.reset()
+                symbols = []
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        """Derive the trader's books and totals from the recovered state."""
+        t = self.trader
+        n = len(t._index)
+        t._holdings_value = float(t._quantity[:n] @ t._price[:n])
+        t._books.clear()
+        t._lower[:] = -np.inf
+        t._upper[:] = np.inf
+        for order in t._orders.values():
+            i = t._index[order.symbol]
+            book = t._books.get(i)
+            if book is None:
+                book = t._books[i] = _Book()
+            buy = order.side == "buy"
+            if order.stop_price is not None and not order.triggered:
+                if buy:
+                    book.stops_up.append((order.stop_price, order.seq, order))
+                else:
+                    book.stops_down.append((-order.stop_price, order.seq,
+                                            order))
+            elif buy:
+                book.bids.append((-order.price, order.seq, order))
+            else:
+                book.asks.append((order.price, order.seq, order))
+        for i, book in t._books.items():
+            for heap in (book.bids, book.asks, book.stops_up,
+                         book.stops_down):
+                heapq.heapify(heap)
+            t._settle(i)
+        t._ids = itertools.count(self._next_id)
+        t._seq = itertools.count(self._next_seq)
@@ -1,20 +1,60 @@
 from __future__ import annotations
 
-import random
-import time
-from datetime import datetime
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence
 
 from analytics.portfolio_tracker import PortfolioTracker
 
+from .pipeline import (HOLD, LiveExecutor, Policy, TradingPipeline,
+                       bar_closes, client_tickers)
 
-def run_live_trading(tracker: PortfolioTracker, iterations: int = 10) -> None:
-    """Simple live-trading loop with portfolio tracking."""
-    balance = 1000.0
-    pnl = 0.0
-    for _ in range(iterations):
-        change = random.uniform(-5, 5)
-        balance += change
-        pnl += change
-        tracker.log_snapshot(balance, pnl)
-        tracker.log_trade("BTC/USD", 0.1, balance, "buy" if change >= 0 else "sell")
-        time.sleep(0.01)
+if TYPE_CHECKING:
+    from exchange.binance_client import BinanceClient
+
+
+def run_live_trading(tracker: PortfolioTracker,
+                     iterations: Optional[int] = 10,
+                     client: Optional["BinanceClient"] = None,
+                     policy: Optional[Policy] = None,
+                     symbol: str = "BTCUSDT",
+                     cash: float = 1000.0,
+                     symbols: Optional[Sequence[str]] = None,
+                     bar_interval: Optional[str] = None
+                     ) -> Dict[str, Any]:
+    """Trade ``iterations`` live ticker updates with portfolio tracking.
+
+    Ticks from the client's combined ticker streams (a few connections
+    however many ``symbols``, see :func:`~trading.pipeline.client_tickers`)
+    go through the asyncio :class:`~trading.pipeline.TradingPipeline` and
+    orders are placed with :class:`~trading.pipeline.LiveExecutor`, which
+    mirrors fills into an
+    account starting with ``cash``.  Without ``client`` a testnet client is
+    created from the keys in :mod:`config`; without ``policy`` the bot only
+    observes and tracks.  ``symbols`` trades several symbols instead of
+    ``symbol``.  With ``iterations=None`` the bot runs until the stream ends,
+    e.g. when a :class:`~exchange.replay_exchange.ReplayExchange` runs out of
+    data.  With ``bar_interval`` (e.g. ``"1m"``) the policy decides once per
+    closed bar of that interval instead of on every tick, see
+    :func:`~trading.pipeline.bar_closes`.  Returns the pipeline report.
+    """
+    owned = client is None
+    if owned:
+        import config
+        from exchange.binance_client import BinanceClient
+
+        client = BinanceClient(config.BINANCE_API_KEY,
+                               config.BINANCE_API_SECRET, testnet=True)
+    symbols = list(symbols or [symbol])
+    source = client_tickers(client, symbols, max_ticks=iterations)
+    if bar_interval is not None:
+        from exchange.bars import BarAggregator
+
+        source = bar_closes(source, BarAggregator(symbols, (bar_interval,)),
+                            bar_interval, cumulative_volume=True)
+    pipeline = TradingPipeline(source, LiveExecutor(client, cash),
+                               policy or (lambda obs: HOLD), tracker=tracker)
+    try:
+        return asyncio.run(pipeline.run())
+    finally:
+        if owned:
+            client.close()
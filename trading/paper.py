@@ -1,20 +1,38 @@
 from __future__ import annotations
 
-import random
-import time
-from datetime import datetime
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
 
 from analytics.portfolio_tracker import PortfolioTracker
 
+from .paper_trader import PaperTrader
+from .pipeline import (PaperExecutor, Policy, TradingPipeline, random_policy,
+                       random_walk)
 
-def run_paper_trading(tracker: PortfolioTracker, iterations: int = 10) -> None:
-    """Simple paper-trading loop with portfolio tracking."""
-    balance = 500.0
-    pnl = 0.0
-    for _ in range(iterations):
-        change = random.uniform(-2, 2)
-        balance += change
-        pnl += change
-        tracker.log_snapshot(balance, pnl)
-        tracker.log_trade("BTC/USD", 0.05, balance, "buy" if change >= 0 else "sell")
-        time.sleep(0.01)
+
+def run_paper_trading(tracker: PortfolioTracker, iterations: int = 10,
+                      policy: Optional[Policy] = None,
+                      symbol: str = "BTC/USD", cash: float = 500.0,
+                      interval: float = 0.01,
+                      seed: Optional[int] = None,
+                      state_dir: Optional[Union[str, Path]] = None
+                      ) -> Dict[str, Any]:
+    """Paper-trade ``iterations`` simulated ticks with portfolio tracking.
+
+    Ticks come from a random walk every ``interval`` seconds and go through
+    the asyncio :class:`~trading.pipeline.TradingPipeline` into a
+    :class:`~trading.paper_trader.PaperTrader`.  Without ``policy`` the bot
+    trades at random.  With ``state_dir`` the paper account is kept in a
+    write-ahead log there and resumed by the next run.  Returns the pipeline
+    report.
+    """
+    wal_dir = Path(state_dir) / "trader" if state_dir is not None else None
+    trader = PaperTrader(cash, wal_dir=wal_dir)
+    source = random_walk(symbol, iterations, interval=interval, seed=seed)
+    pipeline = TradingPipeline(source, PaperExecutor(trader),
+                               policy or random_policy(seed), tracker=tracker)
+    try:
+        return asyncio.run(pipeline.run())
+    finally:
+        trader.close()
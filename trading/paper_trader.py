@@ -7,6 +7,32 @@ which makes it compatible with live price streams or any other data source.
 Orders can be executed through ``execute_order`` where the RL agent decides the
 symbol, side and quantity.
 
+Each symbol gets a fixed index into NumPy arrays of quantities and prices the
+first time it is seen, and the market value of all holdings is kept up to date
+on every price change and fill, so ``portfolio_value`` is O(1) however many
+symbols are tracked.  ``update_prices`` applies a whole batch of quotes at
+once; hot loops can resolve symbols to indices with ``symbol_index`` once and
+pass the index array instead of names.
+
+Besides immediate market orders, :meth:`place_order` accepts limit, stop and
+stop-limit orders that rest until the price crosses them.  Resting orders are
+kept per symbol in four heaps (buy and sell limits, buy and sell stops) with
+the order that crosses first on top, and the two prices at which any of them
+would cross are kept in per-symbol arrays.  A price update therefore costs
+two comparisons unless something crosses, and then only the crossed orders
+are touched: per-tick cost grows with the number of fills, not with the
+number of open orders.  Cancelled orders are dropped lazily when they reach
+the top of their heap, or all at once when they make up most of a book.
+
+Limit orders fill at their limit price as the maker; if a price update
+carries a traded ``volume`` the crossed orders fill in price-time priority
+up to that volume and the rest stay open, partially filled.  Orders that are
+marketable when placed, market orders and triggered stops fill at the last
+price, moved against the trader by ``slippage``, as the taker.  Fees are a
+fraction of the notional, paid in cash.  Resting buy limits reserve their
+cash and resting sells their quantity, so every fill is funded; a buy stop
+reserves nothing and, when triggered, fills what the available cash affords.
+
 Example
 -------
 >>> trader = PaperTrader(1000)
@@ -14,11 +40,36 @@ Example
 >>> trader.execute_order('BTC', 'buy', 0.01)
 >>> trader.summary()['positions']['BTC']['quantity']
 0.01
+>>> order = trader.place_order('BTC', 'sell', 0.01, price=26000)
+>>> trader.update_price('BTC', 26500)
+>>> order.status, order.avg_price
+('filled', 26000.0)
 """
 from __future__ import annotations
 
+import heapq
+import itertools
+import math
 from dataclasses import dataclass, field
-from typing import Dict
+from pathlib import Path
+from typing import (TYPE_CHECKING, Callable, Dict, Iterator, List, Mapping,
+                    NamedTuple, Optional, Sequence, Union)
+
+import numpy as np
+
+from analytics import metrics
+
+if TYPE_CHECKING:
+    from .journal import TraderJournal
+
+SymbolsLike = Union[Sequence[str], np.ndarray]
+
+#: Order states.  ``expired`` orders were triggered but could not be filled
+#: in full (a buy stop without enough cash).
+OPEN = "open"
+FILLED = "filled"
+CANCELLED = "cancelled"
+EXPIRED = "expired"
 
 
 @dataclass
@@ -34,32 +85,338 @@ class Position:
         return self.quantity * self.last_price
 
 
+@dataclass(eq=False)
+class Order:
+    """A limit, stop or stop-limit order and its fill state.
+
+    ``price`` is the limit price (``None`` for market and stop orders) and
+    ``stop_price`` the trigger price of stop orders.  The object returned by
+    :meth:`PaperTrader.place_order` is updated in place as the order fills.
+    """
+
+    id: int
+    symbol: str
+    side: str
+    quantity: float
+    price: Optional[float] = None
+    stop_price: Optional[float] = None
+    filled: float = 0.0
+    notional: float = 0.0
+    fee: float = 0.0
+    status: str = OPEN
+    triggered: bool = False
+    # Cash (buys) or units (sells) held back for this order.
+    reserved: float = field(default=0.0, repr=False)
+    # Queue position within the order's heap.
+    seq: int = field(default=0, repr=False)
+
+    @property
+    def kind(self) -> str:
+        """``"market"``, ``"limit"``, ``"stop"`` or ``"stop_limit"``."""
+        if self.stop_price is None:
+            return "market" if self.price is None else "limit"
+        return "stop" if self.price is None else "stop_limit"
+
+    @property
+    def remaining(self) -> float:
+        """Quantity still to be filled."""
+        return self.quantity - self.filled
+
+    @property
+    def avg_price(self) -> float:
+        """Average fill price (0 before the first fill)."""
+        return self.notional / self.filled if self.filled else 0.0
+
+
+class OrderFill(NamedTuple):
+    """One fill of an :class:`Order`, as passed to ``on_fill``."""
+
+    order_id: int
+    symbol: str
+    side: str
+    quantity: float
+    price: float
+    fee: float
+    maker: bool
+
+
+class _Book:
+    """Resting orders of one symbol.
+
+    Heap entries are ``(key, seq, order)`` with the key negated where the
+    heap must be max-ordered, so the first order to cross is always on top
+    and ties go to the older order.  Cancelled orders stay in their heap
+    (counted in ``stale``) until they reach the top or the book is
+    compacted.
+    """
+
+    __slots__ = ("bids", "asks", "stops_up", "stops_down", "stale")
+
+    def __init__(self) -> None:
+        self.bids: List[tuple] = []        # buy limits, key -price
+        self.asks: List[tuple] = []        # sell limits, key price
+        self.stops_up: List[tuple] = []    # buy stops, key stop
+        self.stops_down: List[tuple] = []  # sell stops, key -stop
+        self.stale = 0
+
+    def entries(self) -> int:
+        return (len(self.bids) + len(self.asks) + len(self.stops_up)
+                + len(self.stops_down))
+
+    def compact(self) -> None:
+        for name in self.__slots__[:4]:
+            heap = [e for e in getattr(self, name) if e[2].status == OPEN]
+            heapq.heapify(heap)
+            setattr(self, name, heap)
+        self.stale = 0
+
+
+class _PositionView(Mapping[str, Position]):
+    """Read-only ``symbol -> Position`` view of a trader's arrays."""
+
+    def __init__(self, trader: "PaperTrader"):
+        self._trader = trader
+
+    def __getitem__(self, symbol: str) -> Position:
+        trader = self._trader
+        i = trader._index[symbol]
+        return Position(trader._quantity.item(i), trader._price.item(i))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._trader._index)
+
+    def __len__(self) -> int:
+        return len(self._trader._index)
+
+
 @dataclass
 class PaperTrader:
-    """Simulates order fills and maintains a virtual trading account."""
+    """Simulates order fills and maintains a virtual trading account.
+
+    Parameters
+    ----------
+    starting_cash:
+        Initial cash balance.
+    maker_fee, taker_fee:
+        Fees as a fraction of the notional, for resting limit orders and for
+        everything that fills immediately respectively.
+    slippage:
+        Fraction by which taker fills are moved against the trader from the
+        last price.
+    on_fill:
+        Optional callback receiving an :class:`OrderFill` for every fill of
+        an order from :meth:`place_order`.
+    wal_dir:
+        Optional directory of a write-ahead log (see
+        :mod:`trading.journal`).  Every change of cash, positions, prices
+        and orders is logged there and the account is recovered from it when
+        the directory already holds one.
+    checkpoint_every:
+        Logged changes after which a checkpoint of the whole account is
+        written, which bounds the log replayed on recovery.
+    """
 
     starting_cash: float = 0.0
+    maker_fee: float = 0.0
+    taker_fee: float = 0.0
+    slippage: float = 0.0
+    on_fill: Optional[Callable[[OrderFill], None]] = field(
+        default=None, repr=False, compare=False)
+    wal_dir: Optional[Union[str, Path]] = field(default=None, repr=False,
+                                                compare=False)
+    checkpoint_every: int = field(default=100_000, repr=False, compare=False)
     cash: float = field(init=False)
-    positions: Dict[str, Position] = field(default_factory=dict, init=False)
+    fees_paid: float = field(default=0.0, init=False)
+    _index: Dict[str, int] = field(default_factory=dict, init=False,
+                                   repr=False, compare=False)
+    _quantity: np.ndarray = field(default_factory=lambda: np.zeros(16),
+                                  init=False, repr=False, compare=False)
+    _price: np.ndarray = field(default_factory=lambda: np.zeros(16),
+                               init=False, repr=False, compare=False)
+    _holdings_value: float = field(default=0.0, init=False, repr=False,
+                                   compare=False)
+    # Resting orders: reserved units per symbol, reserved cash, and the
+    # prices at or below / at or above which some order of a symbol crosses.
+    _reserved_qty: np.ndarray = field(default_factory=lambda: np.zeros(16),
+                                      init=False, repr=False, compare=False)
+    _reserved_cash: float = field(default=0.0, init=False, repr=False,
+                                  compare=False)
+    _lower: np.ndarray = field(default_factory=lambda: np.full(16, -np.inf),
+                               init=False, repr=False, compare=False)
+    _upper: np.ndarray = field(default_factory=lambda: np.full(16, np.inf),
+                               init=False, repr=False, compare=False)
+    _orders: Dict[int, Order] = field(default_factory=dict, init=False,
+                                      repr=False, compare=False)
+    _books: Dict[int, _Book] = field(default_factory=dict, init=False,
+                                     repr=False, compare=False)
+    _ids: Iterator[int] = field(default_factory=lambda: itertools.count(1),
+                                init=False, repr=False, compare=False)
+    _seq: Iterator[int] = field(default_factory=itertools.count, init=False,
+                                repr=False, compare=False)
+    _journal: Optional["TraderJournal"] = field(default=None, init=False,
+                                                repr=False, compare=False)
 
     def __post_init__(self) -> None:
         self.cash = float(self.starting_cash)
+        if self.wal_dir is not None:
+            from .journal import TraderJournal
+
+            TraderJournal(self, self.wal_dir, self.checkpoint_every)
+
+    # ------------------------------------------------------------------ symbols
+    def _add_symbol(self, symbol: str) -> int:
+        i = len(self._index)
+        if i == len(self._price):
+            self._quantity = np.concatenate([self._quantity,
+                                             np.zeros_like(self._quantity)])
+            self._price = np.concatenate([self._price,
+                                          np.zeros_like(self._price)])
+            self._reserved_qty = np.concatenate(
+                [self._reserved_qty, np.zeros_like(self._reserved_qty)])
+            self._lower = np.concatenate(
+                [self._lower, np.full_like(self._lower, -np.inf)])
+            self._upper = np.concatenate(
+                [self._upper, np.full_like(self._upper, np.inf)])
+        self._index[symbol] = i
+        if self._journal is not None:
+            self._journal.symbol(i, symbol)
+        return i
+
+    def symbol_index(self, symbols: Sequence[str]) -> np.ndarray:
+        """Return the array indices of ``symbols``, registering new ones.
+
+        Indices stay valid until :meth:`reset`.
+        """
+        index = self._index
+        return np.fromiter(
+            (index[s] if s in index else self._add_symbol(s) for s in symbols),
+            dtype=np.intp, count=len(symbols))
+
+    @property
+    def symbols(self) -> List[str]:
+        """Symbols in index order."""
+        return list(self._index)
+
+    @property
+    def quantities(self) -> np.ndarray:
+        """Read-only view of the held quantities in index order."""
+        view = self._quantity[:len(self._index)]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def prices(self) -> np.ndarray:
+        """Read-only view of the last prices in index order."""
+        view = self._price[:len(self._index)]
+        view.flags.writeable = False
+        return view
+
+    def quantity(self, symbol: str) -> float:
+        """Return the held quantity of ``symbol`` (0 if unknown)."""
+        i = self._index.get(symbol)
+        return 0.0 if i is None else self._quantity.item(i)
+
+    def last_price(self, symbol: str) -> float:
+        """Return the last seen price of ``symbol`` (0 if unknown)."""
+        i = self._index.get(symbol)
+        return 0.0 if i is None else self._price.item(i)
+
+    @property
+    def positions(self) -> Mapping[str, Position]:
+        """Read-only mapping of symbol to :class:`Position`."""
+        return _PositionView(self)
 
     # ------------------------------------------------------------------ prices
-    def update_price(self, symbol: str, price: float) -> None:
+    def update_price(self, symbol: str, price: float,
+                     volume: Optional[float] = None) -> None:
         """Update the last seen price for ``symbol``.
 
+        Resting orders crossed by the new price are matched.
+
         Parameters
         ----------
         symbol:
             Asset ticker symbol.
         price:
             Latest traded price.
+        volume:
+            Quantity traded at ``price``, which caps how much of the crossed
+            limit orders fills.  ``None`` fills them completely.
         """
-        position = self.positions.setdefault(symbol, Position())
-        position.last_price = float(price)
+        i = self._index.get(symbol)
+        if i is None:
+            i = self._add_symbol(symbol)
+        price = float(price)
+        self._holdings_value += self._quantity.item(i) * (
+            price - self._price.item(i))
+        self._price[i] = price
+        if price <= self._lower.item(i) or price >= self._upper.item(i):
+            self._match(i, price, volume)
+            self._touch(i)
+            self._commit()
+        elif self._journal is not None:
+            self._journal.price(i, price)
+
+    def update_prices(self, symbols: SymbolsLike, prices: Sequence[float],
+                      volumes: Optional[Sequence[float]] = None) -> None:
+        """Update the last seen prices of many symbols at once.
+
+        Parameters
+        ----------
+        symbols:
+            Ticker symbols, or an integer index array from
+            :meth:`symbol_index`.
+        prices:
+            Latest traded prices, aligned with ``symbols``.  If a symbol
+            appears more than once its last price wins.
+        volumes:
+            Optional traded quantities, aligned with ``symbols``; see
+            :meth:`update_price`.
+        """
+        if isinstance(symbols, np.ndarray) and symbols.dtype.kind in "iu":
+            idx = symbols
+        else:
+            idx = self.symbol_index(symbols)
+        prices = np.asarray(prices, dtype=np.float64)
+        if idx.shape != prices.shape:
+            raise ValueError("symbols and prices must have the same length")
+        if volumes is not None:
+            volumes = np.asarray(volumes, dtype=np.float64)
+            if volumes.shape != prices.shape:
+                raise ValueError("volumes and prices must have the same "
+                                 "length")
+        if idx.size > 1:
+            # Keep the last quote per symbol so the value delta counts each
+            # symbol once.
+            rev_unique, rev_first = np.unique(idx[::-1], return_index=True)
+            if rev_unique.size != idx.size:
+                idx = rev_unique
+                prices = prices[::-1][rev_first]
+                if volumes is not None:
+                    volumes = volumes[::-1][rev_first]
+        n = len(self._index)
+        if 2 * idx.size >= n:
+            # Touching most symbols anyway: recompute exactly, which also
+            # clears any rounding drift of the incremental updates.
+            self._price[idx] = prices
+            self._holdings_value = float(self._quantity[:n] @ self._price[:n])
+        else:
+            self._holdings_value += float(
+                self._quantity[idx] @ (prices - self._price[idx]))
+            self._price[idx] = prices
+        if self._orders:
+            crossed = np.flatnonzero((prices <= self._lower[idx])
+                                     | (prices >= self._upper[idx]))
+            for j in crossed.tolist():
+                self._match(int(idx[j]), prices.item(j),
+                            None if volumes is None else volumes.item(j))
+            if crossed.size:
+                self._commit()
+        if self._journal is not None and idx.size:
+            self._journal.prices(idx, prices)
 
     # ------------------------------------------------------------------ orders
+    @metrics.instrumented("paper_trader.execute_order")
     def execute_order(self, symbol: str, side: str, quantity: float) -> None:
         """Execute an order at the last seen price.
 
@@ -72,51 +429,448 @@ class PaperTrader:
         quantity:
             Number of units to transact.  For crypto this can be a fractional
             amount.  The trade is filled at the last price supplied via
-            :meth:`update_price`.
+            :meth:`update_price`, moved by ``slippage``, and pays the taker
+            fee.  Cash and quantity reserved by resting orders are not
+            available.
         """
         side = side.lower()
         if side not in {"buy", "sell"}:
             raise ValueError("side must be 'buy' or 'sell'")
 
-        if symbol not in self.positions or self.positions[symbol].last_price == 0:
+        i = self._index.get(symbol)
+        if i is None or self._price.item(i) == 0:
             raise ValueError(f"No price available for symbol '{symbol}'")
 
-        price = self.positions[symbol].last_price
-        cost = quantity * price
-
+        price = self._price.item(i)
         if side == "buy":
-            if cost > self.cash:
+            price *= 1 + self.slippage
+            cost = quantity * price * (1 + self.taker_fee)
+            if cost > self.cash - self._reserved_cash:
                 raise ValueError("Insufficient cash for purchase")
-            self.cash -= cost
-            self.positions[symbol].quantity += quantity
         else:  # sell
-            if quantity > self.positions[symbol].quantity:
+            price *= 1 - self.slippage
+            if quantity > (self._quantity.item(i)
+                           - self._reserved_qty.item(i)):
                 raise ValueError("Insufficient quantity to sell")
-            self.cash += cost
-            self.positions[symbol].quantity -= quantity
+        self._fill(i, side, quantity, price, quantity * price * self.taker_fee)
+        self._commit()
+
+    def apply_fill(self, symbol: str, side: str, quantity: float,
+                   price: float) -> None:
+        """Book a fill that happened elsewhere, e.g. on a live exchange.
+
+        Unlike :meth:`execute_order` the fill price may differ from the last
+        seen price and no cash or quantity checks are made; the account
+        mirrors whatever the exchange reported.
+        """
+        side = side.lower()
+        if side not in {"buy", "sell"}:
+            raise ValueError("side must be 'buy' or 'sell'")
+        i = self._index.get(symbol)
+        if i is None:
+            i = self._add_symbol(symbol)
+        if self._price.item(i) == 0:
+            self.update_price(symbol, price)
+        self._fill(i, side, quantity, float(price))
+        self._commit()
+
+    def _fill(self, i: int, side: str, quantity: float, price: float,
+              fee: float = 0.0) -> None:
+        # Cash moves at the fill price, holdings are valued at the last price.
+        if fee:
+            self.cash -= fee
+            self.fees_paid += fee
+        if self._journal is not None:
+            self._journal.touch(i)
+        value = quantity * self._price.item(i)
+        if side == "buy":
+            self.cash -= quantity * price
+            self._quantity[i] += quantity
+            self._holdings_value += value
+        else:
+            self.cash += quantity * price
+            self._quantity[i] -= quantity
+            self._holdings_value -= value
+
+    # ------------------------------------------------------------ resting orders
+    def place_order(self, symbol: str, side: str, quantity: float,
+                    price: Optional[float] = None,
+                    stop_price: Optional[float] = None) -> Order:
+        """Place a market, limit, stop or stop-limit order.
+
+        Parameters
+        ----------
+        symbol:
+            Asset ticker symbol.
+        side:
+            Either ``"buy"`` or ``"sell"`` (case insensitive).
+        quantity:
+            Number of units to transact.
+        price:
+            Limit price.  Without it the order fills at market, immediately
+            or when its stop triggers.  A limit order that is marketable
+            when placed fills at once at the last price.
+        stop_price:
+            Trigger price: a buy stop triggers when the price rises to it, a
+            sell stop when the price falls to it.
+
+        Returns
+        -------
+        Order
+            The order, updated in place as it fills.
+
+        Raises
+        ------
+        ValueError
+            On invalid arguments, a market order without a price, a stop
+            that would trigger immediately, or if the cash or quantity for
+            the order is not available.
+        """
+        side = side.lower()
+        if side not in {"buy", "sell"}:
+            raise ValueError("side must be 'buy' or 'sell'")
+        if not quantity > 0:
+            raise ValueError("quantity must be positive")
+        for value in (price, stop_price):
+            if value is not None and not (value > 0 and math.isfinite(value)):
+                raise ValueError("prices must be positive")
+        i = self._index.get(symbol)
+        if i is None:
+            i = self._add_symbol(symbol)
+        last = self._price.item(i)
+        order = Order(next(self._ids), symbol, side, float(quantity),
+                      None if price is None else float(price),
+                      None if stop_price is None else float(stop_price))
+        book = self._books.get(i)
+        if book is None:
+            book = self._books[i] = _Book()
+        if stop_price is None:
+            if price is None and last == 0:
+                raise ValueError(f"No price available for symbol '{symbol}'")
+            self._enter(i, order, last, clip=False)
+        else:
+            stop = order.stop_price
+            if last and (last >= stop if side == "buy" else last <= stop):
+                raise ValueError("Stop price would trigger immediately")
+            if side == "buy":
+                order.seq = next(self._seq)
+                heapq.heappush(book.stops_up, (stop, order.seq, order))
+            else:
+                self._reserve_units(i, order)
+                order.seq = next(self._seq)
+                heapq.heappush(book.stops_down, (-stop, order.seq, order))
+        if order.status == OPEN:
+            self._orders[order.id] = order
+            self._settle(i)
+        self._touch(i, order)
+        self._commit()
+        return order
+
+    def cancel_order(self, order_id: int) -> bool:
+        """Cancel an open order, returning ``False`` if it is not open."""
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return False
+        order.status = CANCELLED
+        i = self._index[order.symbol]
+        self._release(i, order)
+        self._books[i].stale += 1
+        self._settle(i)
+        self._touch(i, order)
+        self._commit()
+        return True
+
+    def replace_order(self, order_id: int, quantity: Optional[float] = None,
+                      price: Optional[float] = None,
+                      stop_price: Optional[float] = None) -> Order:
+        """Cancel an open order and place its replacement atomically.
+
+        Arguments left as ``None`` keep the old order's values; the quantity
+        defaults to its unfilled remainder.  The replacement is a new order
+        at the back of the queue.  If it cannot be placed the old order is
+        left untouched, keeping its priority, and the error is raised.
+        """
+        old = self._orders.get(order_id)
+        if old is None:
+            raise ValueError(f"No open order {order_id}")
+        if quantity is None:
+            quantity = old.remaining
+        if price is None:
+            price = old.price
+        if stop_price is None and not old.triggered:
+            stop_price = old.stop_price
+        # Take the old order out without touching its heap entry, so a
+        # failed placement can put it back where it was.
+        i = self._index[old.symbol]
+        reserved = old.reserved
+        self._release(i, old)
+        old.status = CANCELLED
+        del self._orders[order_id]
+        try:
+            new = self.place_order(old.symbol, old.side, quantity, price,
+                                   stop_price)
+        except ValueError:
+            old.status = OPEN
+            self._reserve(i, old, reserved)
+            self._orders[order_id] = old
+            self._commit()
+            raise
+        self._books[i].stale += 1
+        self._settle(i)
+        self._touch(i, old)
+        self._commit()
+        return new
+
+    def get_order(self, order_id: int) -> Optional[Order]:
+        """Return the open order ``order_id``, or ``None``."""
+        return self._orders.get(order_id)
+
+    def open_orders(self, symbol: Optional[str] = None) -> List[Order]:
+        """Return the open orders, optionally only those for ``symbol``."""
+        orders = self._orders.values()
+        if symbol is None:
+            return list(orders)
+        return [o for o in orders if o.symbol == symbol]
+
+    def available_cash(self) -> float:
+        """Cash not reserved by resting buy orders."""
+        return self.cash - self._reserved_cash
+
+    def _match(self, i: int, price: float, volume: Optional[float]) -> None:
+        """Trigger and fill the orders of symbol ``i`` crossed by ``price``."""
+        book = self._books[i]
+        heappop = heapq.heappop
+        for heap, rising in ((book.stops_up, True), (book.stops_down, False)):
+            while heap and (price >= heap[0][0] if rising
+                            else price <= -heap[0][0]):
+                order = heappop(heap)[2]
+                if order.status != OPEN:
+                    book.stale -= 1
+                    continue
+                order.triggered = True
+                self._touch(i, order)
+                self._enter(i, order, price, clip=True)
+                if order.status != OPEN:
+                    del self._orders[order.id]
+
+        budget = math.inf if volume is None else float(volume)
+        fee = self.maker_fee
+        for heap, buy in ((book.bids, True), (book.asks, False)):
+            while budget > 0 and heap and (price <= -heap[0][0] if buy
+                                           else price >= heap[0][0]):
+                order = heap[0][2]
+                if order.status != OPEN:
+                    heappop(heap)
+                    book.stale -= 1
+                    continue
+                quantity = min(order.quantity - order.filled, budget)
+                budget -= quantity
+                limit = order.price
+                self._release(i, order, quantity * limit * (1 + fee)
+                              if buy else quantity)
+                self._fill_order(i, order, quantity, limit, fee, True)
+                if order.status != OPEN:
+                    heappop(heap)
+                    del self._orders[order.id]
+        self._settle(i)
+
+    def _enter(self, i: int, order: Order, price: float, clip: bool) -> None:
+        """Fill ``order`` at ``price`` if it is marketable, else rest it.
+
+        ``clip`` is set for triggered stops, which fill what can be paid for
+        (or expire) instead of raising.
+        """
+        buy = order.side == "buy"
+        limit = order.price
+        if limit is None or (price > 0 and (price <= limit if buy
+                                            else price >= limit)):
+            self._take(i, order, price, clip)
+            return
+        remaining = order.quantity - order.filled
+        if buy:
+            need = remaining * limit * (1 + self.maker_fee)
+            if need > self.cash - self._reserved_cash:
+                if not clip:
+                    raise ValueError("Insufficient cash for purchase")
+                self._finish(i, order, EXPIRED)
+                return
+            self._reserve(i, order, need)
+            order.seq = next(self._seq)
+            heapq.heappush(self._books[i].bids, (-limit, order.seq, order))
+        else:
+            if order.reserved < remaining:
+                self._reserve_units(i, order)
+            order.seq = next(self._seq)
+            heapq.heappush(self._books[i].asks, (limit, order.seq, order))
+
+    def _take(self, i: int, order: Order, price: float, clip: bool) -> None:
+        """Fill the rest of ``order`` at ``price`` as the taker."""
+        quantity = order.quantity - order.filled
+        limit = order.price
+        # Units reserved for a sell become available to this fill.
+        self._release(i, order)
+        if order.side == "buy":
+            price *= 1 + self.slippage
+            if limit is not None:
+                price = min(price, limit)
+            affordable = ((self.cash - self._reserved_cash)
+                          / (price * (1 + self.taker_fee)))
+            if quantity > affordable:
+                if not clip:
+                    raise ValueError("Insufficient cash for purchase")
+                quantity = max(affordable, 0.0)
+        else:
+            price *= 1 - self.slippage
+            if limit is not None:
+                price = max(price, limit)
+            available = self._quantity.item(i) - self._reserved_qty.item(i)
+            if quantity > available:
+                if not clip:
+                    raise ValueError("Insufficient quantity to sell")
+                quantity = max(available, 0.0)
+        if quantity > 0:
+            self._fill_order(i, order, quantity, price, self.taker_fee, False)
+        if order.status == OPEN:
+            self._finish(i, order, EXPIRED)
+
+    def _fill_order(self, i: int, order: Order, quantity: float, price: float,
+                    fee_rate: float, maker: bool) -> None:
+        fee = quantity * price * fee_rate
+        self._fill(i, order.side, quantity, price, fee)
+        if quantity >= order.quantity - order.filled:
+            order.filled = order.quantity
+        else:
+            order.filled += quantity
+        order.notional += quantity * price
+        order.fee += fee
+        self._touch(i, order)
+        if order.filled >= order.quantity:
+            self._finish(i, order, FILLED)
+        if self.on_fill is not None:
+            self.on_fill(OrderFill(order.id, order.symbol, order.side,
+                                   quantity, price, fee, maker))
+
+    def _finish(self, i: int, order: Order, status: str) -> None:
+        self._release(i, order)
+        order.status = status
+        self._touch(i, order)
+
+    def _reserve(self, i: int, order: Order, amount: float) -> None:
+        self._touch(i, order)
+        order.reserved += amount
+        if order.side == "buy":
+            self._reserved_cash += amount
+        else:
+            self._reserved_qty[i] += amount
+
+    def _reserve_units(self, i: int, order: Order) -> None:
+        need = order.quantity - order.filled - order.reserved
+        if need > self._quantity.item(i) - self._reserved_qty.item(i):
+            raise ValueError("Insufficient quantity to sell")
+        self._reserve(i, order, need)
+
+    def _release(self, i: int, order: Order,
+                 amount: Optional[float] = None) -> None:
+        if amount is None or amount > order.reserved:
+            amount = order.reserved
+        if not amount:
+            return
+        self._touch(i, order)
+        order.reserved -= amount
+        if order.side == "buy":
+            self._reserved_cash -= amount
+        else:
+            self._reserved_qty[i] -= amount
+
+    def _settle(self, i: int) -> None:
+        """Drop cancelled orders from the heap tops of symbol ``i`` and
+        refresh its crossing prices."""
+        book = self._books[i]
+        if book.stale > 64 and 2 * book.stale > book.entries():
+            book.compact()
+        heappop = heapq.heappop
+        lower, upper = -math.inf, math.inf
+        for heap in (book.bids, book.stops_down):
+            while heap and heap[0][2].status != OPEN:
+                heappop(heap)
+                book.stale -= 1
+            if heap:
+                lower = max(lower, -heap[0][0])
+        for heap in (book.asks, book.stops_up):
+            while heap and heap[0][2].status != OPEN:
+                heappop(heap)
+                book.stale -= 1
+            if heap:
+                upper = min(upper, heap[0][0])
+        self._lower[i] = lower
+        self._upper[i] = upper
+
+    # ------------------------------------------------------------- persistence
+    def _touch(self, i: int, order: Optional[Order] = None) -> None:
+        if self._journal is not None:
+            self._journal.touch(i, order)
+
+    def _commit(self) -> None:
+        if self._journal is not None:
+            self._journal.commit()
+
+    def checkpoint(self) -> None:
+        """Write a checkpoint of the account to the write-ahead log now."""
+        if self._journal is not None:
+            self._journal.checkpoint()
+
+    def close(self) -> None:
+        """Sync and close the write-ahead log, if any."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
 
     # ------------------------------------------------------------------ account
     def portfolio_value(self) -> float:
         """Return current total account value (cash + market value)."""
-        return self.cash + sum(p.market_value for p in self.positions.values())
+        return self.cash + self._holdings_value
 
     def reset(self) -> None:
-        """Reset account to initial state."""
+        """Reset account to initial state.
+
+        This forgets all symbols and cancels all open orders, so indices from
+        :meth:`symbol_index` must be looked up again.
+        """
+        if self._journal is not None:
+            self._journal.reset()
         self.cash = float(self.starting_cash)
-        self.positions.clear()
+        self.fees_paid = 0.0
+        self._index.clear()
+        self._quantity[:] = 0.0
+        self._price[:] = 0.0
+        self._holdings_value = 0.0
+        for order in self._orders.values():
+            order.status = CANCELLED
+        self._orders.clear()
+        self._books.clear()
+        self._reserved_qty[:] = 0.0
+        self._reserved_cash = 0.0
+        self._lower[:] = -np.inf
+        self._upper[:] = np.inf
 
     def summary(self) -> Dict[str, object]:
         """Return a dictionary summarising the account state."""
+        n = len(self._index)
+        quantity = self._quantity[:n]
+        price = self._price[:n]
         return {
             "cash": self.cash,
             "positions": {
                 symbol: {
-                    "quantity": pos.quantity,
-                    "last_price": pos.last_price,
-                    "market_value": pos.market_value,
+                    "quantity": q,
+                    "last_price": p,
+                    "market_value": v,
                 }
-                for symbol, pos in self.positions.items()
+                for symbol, q, p, v in zip(self._index, quantity.tolist(),
+                                           price.tolist(),
+                                           (quantity * price).tolist())
             },
+            "fees": self.fees_paid,
+            "open_orders": len(self._orders),
             "portfolio_value": self.portfolio_value(),
         }
-
@@ -0,0 +1,710 @@
+"""Event-driven asyncio trading pipeline.
+
+A :class:`TradingPipeline` runs five stages as concurrent tasks::
+
+    source -> ingest -> features -> decision -> execution -> tracking
+
+* **ingest** pulls :class:`Tick` records from an async iterator (a replayed
+  price series, a random walk, a live ticker stream or the bars
+  :func:`bar_closes` builds from one) into a bounded queue.
+  When the queue is full the source is simply not advanced, so backpressure
+  reaches all the way back to the data.
+* **features** updates the executor's prices and a per-symbol
+  :class:`~rl.features.FeatureStream` for every tick.  Its output goes into a
+  :class:`CoalescingQueue` holding only the newest observation per symbol: if
+  the decision stage falls behind, stale ticks are dropped (and counted)
+  instead of piling up.
+* **decision** asks the policy for an action (0 hold, 1 buy with all cash,
+  2 sell everything, as in :class:`~rl.env.TradingEnv`) on an observation laid
+  out like the environment's.
+* **execution** turns actions into orders on a :class:`PaperExecutor` or a
+  :class:`LiveExecutor`.
+* **tracking** logs snapshots and fills to a
+  :class:`~analytics.portfolio_tracker.PortfolioTracker`.
+
+:meth:`TradingPipeline.report` returns queue depths, coalesced tick counts
+and per-stage latency percentiles.
+
+Example
+-------
+>>> trader = PaperTrader(1000)
+>>> pipeline = TradingPipeline(random_walk("BTCUSDT", 1000),
+...                            PaperExecutor(trader), random_policy(0))
+>>> asyncio.run(pipeline.run())
+>>> pipeline.report()["stages"]["decision"]["p99_us"]
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import (TYPE_CHECKING, Any, AsyncIterator, Callable, Deque, Dict,
+                    Hashable, Iterable, List, Optional, Sequence)
+
+import numpy as np
+
+from analytics import metrics
+
+from .paper_trader import PaperTrader
+
+if TYPE_CHECKING:
+    from analytics.portfolio_tracker import PortfolioTracker
+    from exchange.bars import Bar, BarAggregator
+    from exchange.binance_client import BinanceClient
+    from exchange.streams import TickRecord
+    from rl.features import FeaturePipeline, FeatureStream
+
+Policy = Callable[[np.ndarray], int]
+
+HOLD, BUY, SELL = 0, 1, 2
+
+_STOP = object()
+
+
+@dataclass
+class Tick:
+    """A price update for one symbol.
+
+    ``timestamp`` is the exchange event time and ``received`` the local
+    arrival time, both in epoch nanoseconds.
+    """
+
+    symbol: str
+    price: float
+    volume: float = 0.0
+    timestamp: int = 0
+    received: int = 0
+
+
+@dataclass
+class Fill:
+    """An executed order."""
+
+    symbol: str
+    side: str
+    quantity: float
+    price: float
+    fee: float = 0.0
+
+
+# ---------------------------------------------------------------------- sources
+async def replay(symbol: str, prices: Iterable[float],
+                 volumes: Optional[Iterable[float]] = None,
+                 interval: float = 0.0) -> AsyncIterator[Tick]:
+    """Yield ``prices`` as ticks, ``interval`` seconds apart.
+
+    With ``interval=0`` ticks are produced as fast as the pipeline accepts
+    them, which makes replays usable as throughput benchmarks.
+    """
+    volumes = iter(volumes) if volumes is not None else None
+    for price in prices:
+        volume = float(next(volumes)) if volumes is not None else 0.0
+        now = time.time_ns()
+        yield Tick(symbol, float(price), volume, now, now)
+        # Always yield to the loop so a fast replay cannot starve the stages.
+        await asyncio.sleep(interval)
+
+
+async def random_walk(symbol: str, ticks: int, start: float = 100.0,
+                      scale: float = 0.5, interval: float = 0.0,
+                      seed: Optional[int] = None) -> AsyncIterator[Tick]:
+    """Yield ``ticks`` random-walk prices, for demos and smoke tests."""
+    rng = random.Random(seed)
+    price = start
+    for _ in range(ticks):
+        price = max(price + rng.uniform(-scale, scale), scale)
+        now = time.time_ns()
+        yield Tick(symbol, price, 0.0, now, now)
+        await asyncio.sleep(interval)
+
+
+def client_tickers(client: Any, symbols: Sequence[str],
+                   max_ticks: Optional[int] = None) -> AsyncIterator[Tick]:
+    """Yield live ticker updates of ``symbols`` from ``client``.
+
+    A :class:`~exchange.binance_client.BinanceClient` streams them through
+    :meth:`~exchange.binance_client.BinanceClient.market_stream`, a few
+    combined-stream connections on the pipeline's event loop.  Clients
+    without it (:class:`~exchange.replay_exchange.ReplayExchange`) deliver
+    one callback stream per symbol through ``stream_live_prices``.
+    """
+    if getattr(client, "market_stream", None) is not None:
+        return _stream_ticks(client.market_stream, symbols, max_ticks)
+    return _callback_tickers(client, symbols, max_ticks)
+
+
+async def _callback_tickers(client: Any, symbols: Sequence[str],
+                            max_ticks: Optional[int] = None
+                            ) -> AsyncIterator[Tick]:
+    """Yield ticker updates from per-symbol ``stream_live_prices``.
+
+    The callbacks run on the client's thread; they are handed to the event
+    loop through a :class:`CoalescingQueue`, so a slow consumer never blocks
+    the stream and only sees the newest price per symbol.
+    """
+    loop = asyncio.get_running_loop()
+    queue = CoalescingQueue()
+
+    def on_message(msg: Dict[str, Any]) -> None:
+        if msg.get("e") == "error":
+            # End of a replay (exchange.replay_exchange.REPLAY_FINISHED).
+            if msg.get("type") == "ReplayFinished":
+                loop.call_soon_threadsafe(queue.close)
+            return
+        if "c" not in msg:
+            return
+        tick = Tick(msg["s"], float(msg["c"]), float(msg.get("v", 0.0)),
+                    int(msg.get("E", 0)) * 1_000_000, time.time_ns())
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, tick.symbol, tick)
+        except RuntimeError:
+            pass  # the loop closed before the stream stopped
+
+    for symbol in symbols:
+        client.stream_live_prices(symbol, on_message)
+    try:
+        count = 0
+        while max_ticks is None or count < max_ticks:
+            tick = await queue.get()
+            if tick is None:
+                break
+            count += 1
+            yield tick
+    finally:
+        client.stop_stream()
+
+
+def market_tickers(symbols: Sequence[str], url: Optional[str] = None,
+                   max_ticks: Optional[int] = None,
+                   batch_size: Optional[int] = None) -> AsyncIterator[Tick]:
+    """Yield ticker updates for many symbols from combined streams.
+
+    Runs an :class:`~exchange.streams.MarketStream` of ``url`` (default
+    :data:`~exchange.streams.STREAM_URL`) on the pipeline's own event loop,
+    without a client.
+    """
+    from exchange import streams
+
+    def make_stream(names: Sequence[str], on_tick: Callable
+                    ) -> "streams.MarketStream":
+        return streams.MarketStream(
+            names, on_tick, url=url or streams.STREAM_URL,
+            batch_size=batch_size or streams.BATCH_SIZE)
+
+    return _stream_ticks(make_stream, symbols, max_ticks)
+
+
+async def _stream_ticks(make_stream: Callable, symbols: Sequence[str],
+                        max_ticks: Optional[int] = None
+                        ) -> AsyncIterator[Tick]:
+    """Run the stream ``make_stream(names, on_tick)`` and yield its ticks.
+
+    No thread hand-off is involved; ticks still pass through a
+    :class:`CoalescingQueue`.
+    """
+    queue = CoalescingQueue()
+    names = [s.upper() for s in symbols]
+
+    def on_tick(record: "TickRecord") -> None:
+        symbol = names[record.symbol]
+        queue.put_nowait(symbol, Tick(symbol, record.last, record.volume,
+                                      record.ts, time.time_ns()))
+
+    task = asyncio.create_task(make_stream(names, on_tick).run())
+    try:
+        count = 0
+        while max_ticks is None or count < max_ticks:
+            tick = await queue.get()
+            if tick is None:
+                break
+            count += 1
+            yield tick
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def bar_closes(ticks: AsyncIterator[Tick], aggregator: "BarAggregator",
+                     interval: str, cumulative_volume: bool = False
+                     ) -> AsyncIterator[Tick]:
+    """Aggregate ``ticks`` into bars and yield one tick per closed bar.
+
+    Every tick of a symbol known to ``aggregator`` is added to it, and each
+    bar of ``interval`` it closes comes out as a :class:`Tick` with the bar's
+    close, volume and end time.  A pipeline fed from this decides once per
+    bar, on the same kind of data the model was trained on, while the other
+    intervals stay available in ``aggregator``.  Set ``cumulative_volume``
+    for ticker sources, whose volume is a running 24h total: the traded
+    quantity is then the increase since the symbol's previous tick.
+    """
+    step = aggregator.intervals[interval]
+    index = aggregator.index
+    closed: Deque[Tick] = deque()
+    totals: Dict[int, float] = {}
+
+    def on_bar(bar: "Bar") -> None:
+        closed.append(Tick(bar.symbol, bar.close, bar.volume,
+                           bar.start + step, time.time_ns()))
+
+    aggregator.subscribe(on_bar, interval)
+    try:
+        async for tick in ticks:
+            sid = index.get(tick.symbol)
+            if sid is None:
+                continue
+            qty = tick.volume
+            if cumulative_volume:
+                previous = totals.get(sid, qty)
+                totals[sid] = qty
+                qty = qty - previous if qty > previous else 0.0
+            aggregator.update(sid, tick.timestamp, tick.price, qty)
+            while closed:
+                yield closed.popleft()
+    finally:
+        aggregator.unsubscribe(on_bar)
+
+
+# ---------------------------------------------------------------------- queues
+class CoalescingQueue:
+    """Queue keeping only the newest item per key.
+
+    :meth:`put_nowait` never blocks: an item replacing one that was not
+    consumed yet keeps its place in line and increments :attr:`coalesced`.
+    :meth:`get` returns ``None`` once the queue is closed and drained.
+    """
+
+    def __init__(self) -> None:
+        self._items: Dict[Hashable, Any] = {}
+        self._ready = asyncio.Event()
+        self._closed = False
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def put_nowait(self, key: Hashable, item: Any) -> None:
+        if key in self._items:
+            self.coalesced += 1
+        self._items[key] = item
+        self.max_depth = max(self.max_depth, len(self._items))
+        self._ready.set()
+
+    async def get(self) -> Any:
+        while not self._items:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        key = next(iter(self._items))
+        return self._items.pop(key)
+
+    def drain(self, limit: int) -> List[Any]:
+        """Pop up to ``limit`` queued items without waiting."""
+        items = []
+        while self._items and len(items) < limit:
+            items.append(self._items.pop(next(iter(self._items))))
+        return items
+
+    def close(self) -> None:
+        self._closed = True
+        self._ready.set()
+
+
+class _Queue(asyncio.Queue):
+    """Bounded queue remembering its largest depth."""
+
+    max_depth = 0
+
+    async def put(self, item: Any) -> None:
+        await super().put(item)
+        self.max_depth = max(self.max_depth, self.qsize())
+
+
+# ---------------------------------------------------------------------- stats
+class StageStats:
+    """Counts and latencies (nanoseconds) of one pipeline stage.
+
+    Only the latest ``keep`` latencies are retained for percentiles.
+    """
+
+    def __init__(self, keep: int = 8192) -> None:
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self._recent: Deque[int] = deque(maxlen=keep)
+
+    def record(self, ns: int) -> None:
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        self._recent.append(ns)
+
+    def summary(self) -> Dict[str, float]:
+        recent = np.fromiter(self._recent, dtype=np.int64,
+                             count=len(self._recent))
+        p50, p99 = (np.percentile(recent, [50, 99]) / 1e3
+                    if recent.size else (math.nan, math.nan))
+        return {
+            "count": self.count,
+            "mean_us": self.total_ns / self.count / 1e3 if self.count
+            else math.nan,
+            "p50_us": float(p50),
+            "p99_us": float(p99),
+            "max_us": self.max_ns / 1e3,
+        }
+
+
+# ---------------------------------------------------------------------- executors
+class PaperExecutor:
+    """Executes orders against a :class:`~trading.paper_trader.PaperTrader`."""
+
+    def __init__(self, trader: PaperTrader):
+        self.trader = trader
+
+    def update_price(self, symbol: str, price: float) -> None:
+        self.trader.update_price(symbol, price)
+
+    def cash(self) -> float:
+        return self.trader.cash
+
+    def holdings(self, symbol: str) -> float:
+        return self.trader.quantity(symbol)
+
+    def price(self, symbol: str) -> float:
+        return self.trader.last_price(symbol)
+
+    def value(self) -> float:
+        return self.trader.portfolio_value()
+
+    async def execute(self, symbol: str, side: str,
+                      quantity: float) -> Optional[Fill]:
+        fees = self.trader.fees_paid
+        try:
+            self.trader.execute_order(symbol, side, quantity)
+        except ValueError:
+            return None
+        return Fill(symbol, side, quantity, self.price(symbol),
+                    self.trader.fees_paid - fees)
+
+
+class LiveExecutor(PaperExecutor):
+    """Places market orders through a :class:`BinanceClient`.
+
+    Fills reported by the exchange are mirrored into a local
+    :class:`PaperTrader` starting with ``cash``, which provides the balance
+    and holdings for observations without an account request per tick.
+    Quantities are rounded down to the symbol's step size and orders failing
+    the minimum quantity or notional filters are skipped, as are orders the
+    exchange rejects (counted in :attr:`rejected`).  Blocking REST calls run
+    in a worker thread so the event loop keeps ingesting ticks.
+    """
+
+    def __init__(self, client: "BinanceClient", cash: float):
+        super().__init__(PaperTrader(cash))
+        self.client = client
+        self.rejected = 0
+
+    async def execute(self, symbol: str, side: str,
+                      quantity: float) -> Optional[Fill]:
+        # The rules come from the client's exchange info cache; the thread
+        # only blocks on the very first download.
+        checked = await asyncio.to_thread(self.client.quantize_orders, symbol,
+                                          self.price(symbol), quantity)
+        if not checked.ok:
+            return None
+        quantity = checked.quantity.item()
+        order = (self.client.client.order_market_buy if side == "buy"
+                 else self.client.client.order_market_sell)
+        try:
+            response = await asyncio.to_thread(order, symbol=symbol,
+                                               quantity=f"{quantity:.8f}")
+        except self.client.order_errors:
+            self.rejected += 1
+            return None
+        filled = float(response.get("executedQty", 0.0))
+        if filled <= 0:
+            return None
+        fill_price = float(response.get("cummulativeQuoteQty", 0.0)) / filled
+        self.trader.apply_fill(symbol, side, filled, fill_price)
+        return Fill(symbol, side, filled, fill_price)
+
+
+# ---------------------------------------------------------------------- policies
+def model_policy(model: Any, deterministic: bool = True) -> Policy:
+    """Wrap a Stable-Baselines3 style model as a pipeline policy.
+
+    The policy can also decide a batch of observations at once; a
+    :class:`~rl.policy_engine.PolicyEngine` is called through its
+    allocation-free ``act`` and ``act_batch`` methods.
+    """
+    if hasattr(model, "act_batch"):
+        def policy(obs: np.ndarray) -> int:
+            with metrics.timer("policy.predict"):
+                return model.act(obs, deterministic)
+
+        def batch(obs: np.ndarray) -> np.ndarray:
+            with metrics.timer("policy.predict"):
+                return model.act_batch(obs, deterministic)
+    else:
+        def policy(obs: np.ndarray) -> int:
+            with metrics.timer("policy.predict"):
+                action, _ = model.predict(obs, deterministic=deterministic)
+            return int(action)
+
+        def batch(obs: np.ndarray) -> np.ndarray:
+            with metrics.timer("policy.predict"):
+                actions, _ = model.predict(obs, deterministic=deterministic)
+            return np.reshape(actions, -1)
+
+    policy.batch = batch  # type: ignore[attr-defined]
+    return policy
+
+
+def random_policy(seed: Optional[int] = None,
+                  trade_probability: float = 0.2) -> Policy:
+    """Policy trading at random, for demos and smoke tests."""
+    rng = random.Random(seed)
+
+    def policy(obs: np.ndarray) -> int:
+        if rng.random() >= trade_probability:
+            return HOLD
+        return rng.choice((BUY, SELL))
+
+    return policy
+
+
+# ---------------------------------------------------------------------- pipeline
+class TradingPipeline:
+    """Asyncio pipeline from market data to portfolio tracking.
+
+    Parameters
+    ----------
+    source:
+        Async iterator of :class:`Tick` records.
+    executor:
+        :class:`PaperExecutor` or :class:`LiveExecutor`.
+    policy:
+        Callable mapping an observation to an action.  If it has a
+        ``batch`` attribute mapping a 2-d array of observations to actions
+        (see :func:`model_policy`), all observations waiting in the queue are
+        decided in one call.
+    tracker:
+        Optional portfolio tracker receiving a snapshot per decision and
+        every fill.
+    features, window:
+        Feature pipeline and lookback window the policy was trained with.
+        Without features the observation is ``[price, cash, holdings]``.
+    queue_size:
+        Capacity of the bounded queues between stages.
+    offload_policy:
+        Run the policy in a worker thread (useful for torch models, which
+        release the GIL) so ticks keep being ingested meanwhile.
+    max_batch:
+        Most observations per batched policy call.
+    """
+
+    def __init__(self, source: AsyncIterator[Tick], executor: PaperExecutor,
+                 policy: Policy,
+                 tracker: Optional["PortfolioTracker"] = None,
+                 features: Optional["FeaturePipeline"] = None,
+                 window: int = 1, queue_size: int = 1024,
+                 offload_policy: bool = False, max_batch: int = 256):
+        self.source = source
+        self.executor = executor
+        self.policy = policy
+        self.tracker = tracker
+        self.features = features
+        self.window = window
+        self.queue_size = queue_size
+        self.offload_policy = offload_policy
+        self.max_batch = max_batch
+        self._streams: Dict[str, "FeatureStream"] = {}
+        self.stages = {name: StageStats() for name in
+                       ("ingest", "features", "decision", "execution",
+                        "tracking", "end_to_end")}
+        self.fills = 0
+        self.start_value = executor.value()
+        self._queues: Dict[str, Any] = {}
+
+    # ------------------------------------------------------------------ stages
+    async def _ingest(self, out: _Queue) -> None:
+        stats = self.stages["ingest"]
+        async for tick in self.source:
+            began = time.perf_counter_ns()
+            if not tick.received:
+                tick.received = time.time_ns()
+            await out.put(tick)
+            stats.record(time.perf_counter_ns() - began)
+        await out.put(_STOP)
+
+    def _feature_row(self, tick: Tick) -> np.ndarray:
+        stream = self._streams.get(tick.symbol)
+        if stream is None:
+            stream = self._streams[tick.symbol] = self.features.stream(
+                self.window)
+        stream.update({"price": tick.price, "volume": tick.volume})
+        return stream.window().ravel().copy()
+
+    async def _features(self, inbox: _Queue, out: CoalescingQueue) -> None:
+        stats = self.stages["features"]
+        while True:
+            tick = await inbox.get()
+            if tick is _STOP:
+                out.close()
+                return
+            began = time.perf_counter_ns()
+            self.executor.update_price(tick.symbol, tick.price)
+            if self.features is None:
+                row = np.array([tick.price], dtype=np.float32)
+            else:
+                row = self._feature_row(tick)
+            out.put_nowait(tick.symbol, (tick, row))
+            stats.record(time.perf_counter_ns() - began)
+
+    async def _decision(self, inbox: CoalescingQueue, out: _Queue) -> None:
+        stats = self.stages["decision"]
+        batch_policy = getattr(self.policy, "batch", None)
+        while True:
+            item = await inbox.get()
+            if item is None:
+                await out.put(_STOP)
+                return
+            began = time.perf_counter_ns()
+            items = [item]
+            if batch_policy is not None:
+                items += inbox.drain(self.max_batch - 1)
+            obs = np.empty((len(items), item[1].size + 2), dtype=np.float32)
+            cash = self.executor.cash()
+            for i, (tick, row) in enumerate(items):
+                obs[i, :-2] = row
+                obs[i, -2] = cash
+                obs[i, -1] = self.executor.holdings(tick.symbol)
+            policy = batch_policy or (lambda o: [self.policy(o[0])])
+            if self.offload_policy:
+                actions = await asyncio.to_thread(policy, obs)
+            else:
+                actions = policy(obs)
+            elapsed = time.perf_counter_ns() - began
+            for (tick, _), action in zip(items, actions):
+                stats.record(elapsed)
+                await out.put((tick, int(action)))
+
+    async def _execution(self, inbox: _Queue, out: _Queue) -> None:
+        stats = self.stages["execution"]
+        executor = self.executor
+        while True:
+            item = await inbox.get()
+            if item is _STOP:
+                await out.put(_STOP)
+                return
+            began = time.perf_counter_ns()
+            tick, action = item
+            fill = None
+            # Size orders at the newest price: ticks that arrived while the
+            # decision was made have already updated the executor.
+            if action == BUY:
+                price = executor.price(tick.symbol)
+                quantity = executor.cash() / price
+                if quantity * price > executor.cash():
+                    quantity = float(np.nextafter(quantity, 0.0))
+                if quantity > 0:
+                    fill = await executor.execute(tick.symbol, "buy",
+                                                  quantity)
+            elif action == SELL:
+                quantity = executor.holdings(tick.symbol)
+                if quantity > 0:
+                    fill = await executor.execute(tick.symbol, "sell",
+                                                  quantity)
+            stats.record(time.perf_counter_ns() - began)
+            await out.put((tick, fill))
+
+    async def _tracking(self, inbox: _Queue) -> None:
+        stats = self.stages["tracking"]
+        end_to_end = self.stages["end_to_end"]
+        while True:
+            item = await inbox.get()
+            if item is _STOP:
+                return
+            began = time.perf_counter_ns()
+            tick, fill = item
+            if fill is not None:
+                self.fills += 1
+            if self.tracker is not None:
+                value = self.executor.value()
+                self.tracker.log_snapshot(value, value - self.start_value,
+                                          tick.timestamp)
+                if fill is not None:
+                    self.tracker.log_trade(fill.symbol, fill.quantity,
+                                           fill.price, fill.side,
+                                           tick.timestamp, fill.fee)
+            now = time.perf_counter_ns()
+            stats.record(now - began)
+            end_to_end.record(time.time_ns() - tick.received)
+
+    # ------------------------------------------------------------------ running
+    async def run(self) -> Dict[str, Any]:
+        """Run until the source is exhausted and return :meth:`report`.
+
+        If any stage fails, the others are cancelled and the error is
+        raised.
+        """
+        ticks = _Queue(self.queue_size)
+        observations = CoalescingQueue()
+        orders = _Queue(self.queue_size)
+        results = _Queue(self.queue_size)
+        self._queues = {"ticks": ticks, "observations": observations,
+                        "orders": orders, "results": results}
+        tasks = [
+            asyncio.create_task(self._ingest(ticks)),
+            asyncio.create_task(self._features(ticks, observations)),
+            asyncio.create_task(self._decision(observations, orders)),
+            asyncio.create_task(self._execution(orders, results)),
+            asyncio.create_task(self._tracking(results)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        """Return queue depths, coalescing and per-stage latency."""
+        queues = {}
+        for name, queue in self._queues.items():
+            entry = {"depth": queue.qsize(), "max_depth": queue.max_depth}
+            if isinstance(queue, CoalescingQueue):
+                entry["coalesced"] = queue.coalesced
+            else:
+                entry["capacity"] = queue.maxsize
+            queues[name] = entry
+        return {
+            "ticks": self.stages["features"].count,
+            "decisions": self.stages["decision"].count,
+            "fills": self.fills,
+            "queues": queues,
+            "stages": {name: stats.summary()
+                       for name, stats in self.stages.items()},
+        }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Render :meth:`TradingPipeline.report` as a small text table."""
+    lines = [f"ticks {report['ticks']}  decisions {report['decisions']}  "
+             f"fills {report['fills']}"]
+    for name, queue in report["queues"].items():
+        extra = (f"coalesced {queue['coalesced']}" if "coalesced" in queue
+                 else f"capacity {queue['capacity']}")
+        lines.append(f"queue {name:13} depth {queue['depth']:5d}  "
+                     f"max {queue['max_depth']:5d}  {extra}")
+    for name, stage in report["stages"].items():
+        lines.append(f"stage {name:13} n {stage['count']:7d}  "
+                     f"p50 {stage['p50_us']:9.1f} us  "
+                     f"p99 {stage['p99_us']:9.1f} us  "
+                     f"max {stage['max_us']:9.1f} us")
+    return "\n".join(lines)